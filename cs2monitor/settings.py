@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "monitor.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -82,6 +83,24 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Entries are keyed by the latest snapshot version (see monitor/cache.py), so
+# they never expire on a timer. Use a shared backend such as Redis or
+# Memcached when running several workers.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "cs2monitor",
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": 1000,
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -122,3 +141,96 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Snapshot data
+# Directory the scrapers write their JSON snapshots into.
+
+CS_DATA_DIR = BASE_DIR / "cs_data"
+
+# Poll CS_DATA_DIR on cached requests to detect new snapshots, at most once
+# every MONITOR_SNAPSHOT_POLL_INTERVAL seconds per worker. Polling is how
+# each worker process learns about new files: the snapshot_ingested signal
+# only reaches receivers in the process that sends it, and the default
+# LocMemCache keeps the ingest generation per process. Only disable it for
+# a single-process deployment that ingests in-process.
+MONITOR_SNAPSHOT_WATCH = True
+MONITOR_SNAPSHOT_POLL_INTERVAL = 2.0
+
+
+# Async view execution (see monitor/executor.py)
+# Blocking file I/O runs in a thread pool; pandas work runs in a bounded
+# compute pool ("thread" or "process") with a per-request timeout in seconds.
+
+MONITOR_IO_WORKERS = 8
+MONITOR_COMPUTE_POOL = "thread"
+MONITOR_COMPUTE_WORKERS = 4
+MONITOR_COMPUTE_TIMEOUT = 30
+
+
+# Cross-platform arbitrage (see monitor/arbitrage.py)
+# Seller fee rates deducted when selling on each platform, and the default
+# number of opportunities returned by /arbitrage/.
+
+ARBITRAGE_FEES = {"buff": 0.025, "uu": 0.01}
+ARBITRAGE_TOP_K = 50
+
+
+# Price alerts (see monitor/alerts.py)
+# Rules are stored in monitor.AlertRule and evaluated once per ingest by
+# `manage.py ingest_snapshots`; web workers never deliver alerts. Trigger
+# and cooldown state is kept in ALERT_STATE_PATH between runs.
+# Each sink is a dotted path to a class with a send(alerts) method.
+
+ALERTS_ENABLED = True
+ALERT_SINKS = [
+    {"BACKEND": "monitor.alerts.LogSink"},
+    # {"BACKEND": "monitor.alerts.FileSink", "OPTIONS": {"path": BASE_DIR / "alerts.jsonl"}},
+    # {"BACKEND": "monitor.alerts.WebhookSink", "OPTIONS": {"url": "http://127.0.0.1:9000/alerts"}},
+]
+ALERT_STATE_PATH = BASE_DIR / "var" / "alert_state.json"
+
+
+# Startup-time budget in seconds for a fresh worker: django.setup() plus
+# importing the URL configuration, and each first request. Enforced by
+# monitor.tests.StartupBudgetTests and `manage.py startup_benchmark`.
+
+MONITOR_STARTUP_BUDGET = {
+    "import": 1.0,
+    "first_request": 0.5,
+}
+
+
+# Per-request profiling (see monitor/profiling.py)
+# When enabled, responses carry a Server-Timing header with per-phase
+# durations, requests slower than the threshold (seconds) are kept for
+# /profiling/slow/ (staff only), and a fraction of requests is captured
+# with cProfile. When disabled the middleware is not loaded at all.
+
+MONITOR_PROFILING = False
+MONITOR_SLOW_REQUEST_THRESHOLD = 0.5
+MONITOR_SLOW_REQUEST_LOG_SIZE = 100
+MONITOR_CPROFILE_SAMPLE_RATE = 0.0
+
+
+# Latest market state shared by all workers through a read-only mmap
+# (see monitor/market_state.py). Rebuilt once per ingest.
+
+MONITOR_STATE_PATH = BASE_DIR / "var" / "market_state.bin"
+
+
+# Portfolio valuation (see monitor/portfolio.py). Holdings are valued in one
+# pass; the holdings table on /portfolio/ is paginated.
+
+PORTFOLIO_PAGE_SIZE = 200
+
+
+# Category and market indices (see monitor/returns.py). The price matrix of
+# all snapshots is materialized on every ingest; MARKET_MATRIX_PATH is its
+# JSON manifest, and the prices live in .npy files next to it that web
+# workers memory-map. Indices start at MARKET_INDEX_BASE, and correlation
+# queries default to the last MARKET_INDEX_WINDOW periods.
+
+MARKET_MATRIX_PATH = BASE_DIR / "var" / "price_matrix.json"
+MARKET_INDEX_BASE = 1000
+MARKET_INDEX_WINDOW = 30
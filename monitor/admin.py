@@ -1,3 +1,32 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AlertRule, Holding, MarketIndex, Snapshot
+
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'name', 'hysteresis', 'cooldown', 'enabled')
+    list_filter = ('field', 'operator', 'enabled')
+    search_fields = ('item', 'name')
+
+
+@admin.register(Snapshot)
+class SnapshotAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'source', 'item_type', 'timestamp', 'row_count', 'ingested_at')
+    list_filter = ('source', 'item_type')
+    search_fields = ('filename',)
+
+
+@admin.register(Holding)
+class HoldingAdmin(admin.ModelAdmin):
+    list_display = ('item', 'platform', 'quantity', 'purchase_price', 'purchased_at')
+    list_filter = ('platform',)
+    search_fields = ('item',)
+    date_hierarchy = 'purchased_at'
+
+
+@admin.register(MarketIndex)
+class MarketIndexAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'value_weighted', 'equal_weighted', 'constituents')
+    list_filter = ('category',)
+    date_hierarchy = 'timestamp'
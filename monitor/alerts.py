@@ -0,0 +1,358 @@
+"""
+价格提醒规则引擎
+
+规则按 (饰品, 指标, 条件) 分组，每组内阈值有序排列：
+- 低于：触发的是阈值大于当前值的规则，二分查找后取右侧
+- 高于：触发的是阈值小于当前值的规则，二分查找后取左侧
+每条价格更新只访问它可能触发的规则，不需要 规则数 × 饰品数 的全量扫描。
+
+已触发的规则在值回到阈值另一侧超过回差之前不会再次触发，冷却时间内也不会重复通知。
+
+规则只由 manage.py ingest_snapshots 在入库后评估，Web worker 不评估也不发送通知，
+因此每条提醒只发送一次。触发状态和冷却时间保存在 settings.ALERT_STATE_PATH，跨次导入保留。
+"""
+import bisect
+import json
+import logging
+import os
+import tempfile
+import threading
+import urllib.request
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .arbitrage import fee_adjusted_spread
+from .models import AlertRule
+from .snapshots import parse_change, read_snapshot, snapshot_timestamp
+
+logger = logging.getLogger(__name__)
+
+ALL_ITEMS = ''
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: int
+    item: str
+    field: str
+    operator: str
+    threshold: float
+    hysteresis: float = 0.0
+    cooldown: int = 0
+    name: str = ''
+
+
+@dataclass
+class Alert:
+    rule: Rule
+    item: str
+    value: float
+    timestamp: str
+
+    def as_dict(self):
+        return {
+            'rule_id': self.rule.id,
+            'rule_name': self.rule.name,
+            'item': self.item,
+            'field': self.rule.field,
+            'operator': self.rule.operator,
+            'threshold': self.rule.threshold,
+            'value': self.value,
+            'timestamp': self.timestamp,
+        }
+
+
+class LogSink:
+    """写入日志"""
+
+    def send(self, alerts):
+        for alert in alerts:
+            logger.warning('价格提醒 %s', json.dumps(alert.as_dict(), ensure_ascii=False))
+
+
+class FileSink:
+    """追加写入 JSON Lines 文件"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alerts):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for alert in alerts:
+                f.write(json.dumps(alert.as_dict(), ensure_ascii=False) + '\n')
+
+
+class WebhookSink:
+    """把一批提醒以 JSON POST 到指定地址，失败只记录日志"""
+
+    def __init__(self, url, timeout=3):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts):
+        body = json.dumps({'alerts': [alert.as_dict() for alert in alerts]}, ensure_ascii=False).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError as e:
+            logger.error('推送价格提醒到 %s 失败：%s', self.url, e)
+
+
+def load_sinks():
+    """按 settings.ALERT_SINKS 创建通知渠道"""
+    return [import_string(conf['BACKEND'])(**conf.get('OPTIONS', {})) for conf in settings.ALERT_SINKS]
+
+
+def field_value(record, field, fees=None):
+    """
+    计算一条快照记录的某项指标
+    :return: 数值，无法计算时返回 None
+    """
+    if field == 'buff_price' or field == 'uu_price':
+        return record[field]
+    if field == 'today_change_pct':
+        return parse_change(record.get('today_change'))[1]
+    if field == 'week_change_pct':
+        return parse_change(record.get('week_change'))[1]
+    if field == 'spread_pct' and record['uu_price'] and record['buff_price'] > 0 and record['uu_price'] > 0:
+        return fee_adjusted_spread(record['buff_price'], record['uu_price'], fees)[3]
+    return None
+
+
+class RuleGroup:
+    """同一 (饰品, 指标, 条件) 下按阈值排序的规则"""
+    __slots__ = ('field', 'operator', 'thresholds', 'rules')
+
+    def __init__(self, field, operator, rules):
+        rules = sorted(rules, key=lambda rule: rule.threshold)
+        self.field = field
+        self.operator = operator
+        self.thresholds = [rule.threshold for rule in rules]
+        self.rules = rules
+
+    def triggered(self, value):
+        if self.operator == 'below':
+            return self.rules[bisect.bisect_right(self.thresholds, value):]
+        return self.rules[:bisect.bisect_left(self.thresholds, value)]
+
+
+def rearmed(rule, value):
+    """已触发的规则是否已回到阈值另一侧超过回差"""
+    if rule.operator == 'below':
+        return value >= rule.threshold + rule.hysteresis
+    return value <= rule.threshold - rule.hysteresis
+
+
+class AlertEngine:
+    def __init__(self, rules=(), sinks=None, fees=None):
+        self.sinks = sinks if sinks is not None else []
+        self.fees = fees or settings.ARBITRAGE_FEES
+        self._active = {}           # 饰品 -> {规则 id: 规则}，已触发、尚未回到阈值另一侧
+        self._last_fired = {}       # (规则 id, 饰品) -> 上次通知时间
+        self._rules = {}
+        self._lock = threading.Lock()
+        self.load(rules)
+
+    def load(self, rules):
+        """重建规则索引，已触发状态中失效的规则会被清除"""
+        grouped = {}
+        for rule in rules:
+            grouped.setdefault((rule.item, rule.field, rule.operator), []).append(rule)
+        index = {}
+        for (item, field, operator), group_rules in grouped.items():
+            index.setdefault(item, []).append(RuleGroup(field, operator, group_rules))
+        with self._lock:
+            self._index = index
+            self._global = index.get(ALL_ITEMS, [])
+            self.rule_count = sum(len(rules) for rules in grouped.values())
+            self._rules = {rule.id: rule for rule in rules}
+            rule_ids = set(self._rules)
+            for item in list(self._active):
+                active = {rule_id: rule for rule_id, rule in self._active[item].items() if rule_id in rule_ids}
+                if active:
+                    self._active[item] = active
+                else:
+                    del self._active[item]
+
+    def evaluate(self, records, timestamp, deliver=True):
+        """
+        用一个快照的数据评估规则
+        :param records: parse_snapshot() 的结果
+        :param timestamp: 快照时间戳
+        :param deliver: 为 False 时只更新触发状态，不发送通知
+        :return: 本次触发的 [Alert]
+        """
+        fired_at = datetime.strptime(timestamp, '%Y%m%d_%H%M%S')
+        alerts = []
+        with self._lock:
+            index, global_groups = self._index, self._global
+            if not index:
+                return alerts
+            for record in records:
+                item = record['item']
+                groups = index.get(item)
+                active = self._active.get(item)
+                if groups is None and not global_groups and not active:
+                    continue
+                # 指标按需计算，同一条记录内复用
+                values = {}
+
+                # 先处理已触发规则的回差
+                if active:
+                    for rule_id, rule in list(active.items()):
+                        if rule.field not in values:
+                            values[rule.field] = field_value(record, rule.field, self.fees)
+                        value = values[rule.field]
+                        if value is not None and rearmed(rule, value):
+                            del active[rule_id]
+                    if not active:
+                        del self._active[item]
+                        active = None
+
+                for group in (groups + global_groups if groups else global_groups):
+                    if group.field not in values:
+                        values[group.field] = field_value(record, group.field, self.fees)
+                    value = values[group.field]
+                    if value is None:
+                        continue
+                    for rule in group.triggered(value):
+                        if active is not None and rule.id in active:
+                            continue
+                        key = (rule.id, item)
+                        last = self._last_fired.get(key)
+                        if rule.cooldown and last is not None and (fired_at - last).total_seconds() < rule.cooldown:
+                            continue
+                        if active is None:
+                            active = self._active[item] = {}
+                        active[rule.id] = rule
+                        self._last_fired[key] = fired_at
+                        alerts.append(Alert(rule, item, value, timestamp))
+
+        if deliver and alerts:
+            self.deliver(alerts)
+        return alerts
+
+    def dump_state(self):
+        """触发状态和上次通知时间，可以 JSON 序列化"""
+        with self._lock:
+            return {
+                'active': {item: sorted(active) for item, active in self._active.items()},
+                'last_fired': [
+                    [rule_id, item, fired_at.strftime('%Y%m%d_%H%M%S')]
+                    for (rule_id, item), fired_at in self._last_fired.items()
+                ],
+            }
+
+    def restore_state(self, state):
+        """恢复 dump_state() 的结果，已删除或停用的规则被忽略"""
+        with self._lock:
+            self._active = {}
+            for item, rule_ids in state.get('active', {}).items():
+                active = {rule_id: self._rules[rule_id] for rule_id in rule_ids if rule_id in self._rules}
+                if active:
+                    self._active[item] = active
+            self._last_fired = {
+                (rule_id, item): datetime.strptime(fired_at, '%Y%m%d_%H%M%S')
+                for rule_id, item, fired_at in state.get('last_fired', [])
+                if rule_id in self._rules
+            }
+
+    def deliver(self, alerts):
+        if not alerts:
+            return
+        for sink in self.sinks:
+            try:
+                sink.send(alerts)
+            except Exception as e:
+                logger.error('发送价格提醒失败（%s）：%s', type(sink).__name__, e)
+
+
+def load_rules():
+    """从数据库读取启用的规则，数据表未创建时返回空列表"""
+    try:
+        return [
+            Rule(rule.id, rule.item, rule.field, rule.operator, rule.threshold,
+                 rule.hysteresis, rule.cooldown, rule.name)
+            for rule in AlertRule.objects.filter(enabled=True)
+        ]
+    except DatabaseError as e:
+        logger.warning('无法读取价格提醒规则：%s', e)
+        return []
+
+
+_engine = None
+_rules_dirty = True
+
+
+def get_alert_engine():
+    """获取进程内的规则引擎，规则变更后在下次使用时重新加载"""
+    global _engine, _rules_dirty
+    if _engine is None:
+        _engine = AlertEngine(sinks=load_sinks())
+    if _rules_dirty:
+        _rules_dirty = False
+        _engine.load(load_rules())
+    return _engine
+
+
+@receiver([post_save, post_delete], sender=AlertRule)
+def mark_rules_dirty(sender, **kwargs):
+    global _rules_dirty
+    _rules_dirty = True
+
+
+def load_state(path):
+    """读取保存的触发状态，文件不存在或已损坏时返回 None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning('无法读取价格提醒状态 %s：%s', path, e)
+        return None
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.alert_state.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def evaluate_new_snapshots(files, folder=None):
+    """
+    入库后评估提醒规则，只在 manage.py ingest_snapshots 中调用
+    还没有保存过触发状态时（第一次导入）只建立触发状态，不会把历史数据通知一遍
+    :param files: 本次入库的快照文件名
+    :return: 本次触发的 [Alert]
+    """
+    if not settings.ALERTS_ENABLED:
+        return []
+    engine = get_alert_engine()
+    if not engine.rule_count:
+        return []
+    path = str(settings.ALERT_STATE_PATH)
+    state = load_state(path)
+    if state is not None:
+        engine.restore_state(state)
+    alerts = []
+    for filename in sorted(files, key=lambda name: (snapshot_timestamp(name), name)):
+        try:
+            records = read_snapshot(filename, folder)
+        except (OSError, ValueError):
+            continue
+        alerts.extend(engine.evaluate(records, snapshot_timestamp(filename), deliver=state is not None))
+    save_state(path, engine.dump_state())
+    return alerts
@@ -0,0 +1,100 @@
+"""
+基于 pandas 的价格数据分析
+
+pandas 加载较慢，本模块只在需要的视图中延迟导入，首页和 JSON 接口不会加载它。
+"""
+import os
+
+import pandas as pd
+from django.conf import settings
+
+from .executor import check_deadline
+from .profiling import count, phase
+from .snapshots import parse_snapshot
+
+COLUMNS = ['item', 'buff_price', 'uu_price', 'today_change', 'week_change']
+
+def parse_price_data(content):
+    """
+    解析快照文件内容
+    :param content: 快照文件的 bytes 或 str
+    :return: 价格数据 DataFrame，列为 item / buff_price / uu_price / today_change / week_change
+    """
+    with phase('json_decode'):
+        records = parse_snapshot(content)
+    count('rows_parsed', len(records))
+    with phase('dataframe'):
+        return pd.DataFrame(records, columns=COLUMNS)
+
+def load_price_data(filename, folder=None):
+    folder = folder or settings.CS_DATA_DIR
+    with phase('file_read'):
+        with open(os.path.join(folder, filename), 'rb') as f:
+            content = f.read()
+    count('files_read')
+    count('bytes_loaded', len(content))
+    return parse_price_data(content)
+
+def build_overview_data(items, contents):
+    """
+    组织选中时间点所有类型的数据
+    :param items: 该时间点的文件列表
+    :param contents: {文件名: 文件内容}
+    """
+    all_items_data = {}
+    for item in items:
+        df = parse_price_data(contents[item['filename']])
+        for _, row in df.iterrows():
+            item_type = item['item_type']
+            if item_type not in all_items_data:
+                all_items_data[item_type] = []
+            all_items_data[item_type].append({
+                "name": row["item"],
+                "buff_price": row["buff_price"],
+                "uu_price": row["uu_price"],
+                "today_change": row["today_change"],
+                "week_change": row["week_change"]
+            })
+    return all_items_data
+
+def build_price_history(files, item_name, folder=None, deadline=None):
+    """
+    获取某个饰品在所有时间点的价格
+    文件在计算 worker 中逐个读取和解析，同一时刻只有一个文件的内容在内存中，也不需要把内容传给进程池
+    :param files: get_json_files() 的结果
+    :param item_name: 完整的饰品名称
+    :param folder: 快照目录，默认取 settings.CS_DATA_DIR
+    :param deadline: 截止时间，超过后在读取下一个文件前抛出 ComputeCancelled
+    :return: 按时间排序的价格列表
+    """
+    all_data = []
+    for entry in files:
+        # 同一时间点可能同时有 qaq（BUFF + 悠悠）和 cs_（仅 BUFF）快照，优先使用 qaq 的记录，
+        # 缺失的价格再从其它来源补齐
+        items = sorted(entry['items'], key=lambda item: item['source'] != 'qaq')
+        record = None
+        for item in items:
+            check_deadline(deadline)
+            df = load_price_data(item['filename'], folder)
+            if df.empty:
+                continue
+            df_item = df[df["item"] == item_name]
+            if df_item.empty:
+                continue
+            if record is None:
+                record = {
+                    "time": entry['timestamp'],
+                    "buff_price": df_item["buff_price"].iloc[0],
+                    "uu_price": df_item["uu_price"].iloc[0]
+                }
+            for key in ("buff_price", "uu_price"):
+                if record[key] is None or pd.isna(record[key]):
+                    record[key] = df_item[key].iloc[0]
+            if not (pd.isna(record["buff_price"]) or pd.isna(record["uu_price"])):
+                break
+        if record is not None:
+            all_data.append(record)
+    
+    # 按时间排序
+    all_data.sort(key=lambda x: x["time"])
+    return all_data
@@ -8,3 +8,9 @@ class MonitorConfig(AppConfig):
     def ready(self):
         # 导入模板标签库以确保它们被注册
         import monitor.templatetags.monitor_extras
+        # 注册快照入库信号的接收器
+        import monitor.cache
+        import monitor.search
+        import monitor.arbitrage
+        import monitor.market_state
+        import monitor.portfolio
@@ -0,0 +1,284 @@
+"""
+BUFF / 悠悠 跨平台套利扫描
+
+每次快照入库时增量计算每个饰品扣除手续费后的价差，维护：
+- 最新机会：饰品 -> Opportunity
+- 按价差百分比排序的堆（惰性删除，过期条目在弹出时丢弃）
+- 每个饰品的历史价差统计（Welford 在线均值 / 方差、最小值、最大值）
+
+页面查询只弹出堆顶的 K 个有效条目，默认查询结果在两次入库之间直接复用。
+
+每批文件导入后清理过期机会：饰品不在其类型最新一个时间点的快照中（已下架或没有悠悠报价）时，
+它的最后一个价差不再是当前机会。快照文件被删除时，来自这些文件的机会一并删除。
+"""
+import heapq
+import math
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .signals import snapshot_ingested
+from .snapshots import list_snapshot_files, parse_snapshot_filename, read_snapshot, snapshot_timestamp
+
+PLATFORM_NAMES = {'buff': 'BUFF', 'uu': '悠悠'}
+
+
+def fee_adjusted_spread(buff_price, uu_price, fees=None):
+    """
+    计算扣除卖出手续费后的跨平台价差
+    在低价平台买入、到另一平台卖出，取利润更高的方向
+    :param fees: 各平台卖出手续费率，默认取 settings.ARBITRAGE_FEES
+    :return: (买入平台, 卖出平台, 价差, 价差百分比)
+    """
+    fees = fees or settings.ARBITRAGE_FEES
+    # 悠悠买入，BUFF 卖出
+    buff_profit = buff_price * (1 - fees['buff']) - uu_price
+    # BUFF 买入，悠悠卖出
+    uu_profit = uu_price * (1 - fees['uu']) - buff_price
+    if buff_profit >= uu_profit:
+        return 'uu', 'buff', buff_profit, buff_profit / uu_price * 100
+    return 'buff', 'uu', uu_profit, uu_profit / buff_price * 100
+
+
+@dataclass
+class Opportunity:
+    item: str
+    timestamp: str
+    buy_platform: str
+    sell_platform: str
+    buy_price: float
+    sell_price: float
+    spread: float
+    spread_pct: float
+    category: str = ''
+    source: str = None
+
+
+class SpreadStats:
+    """单个饰品价差百分比的在线统计"""
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max', 'last_timestamp')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.last_timestamp = None
+
+    def update(self, value, timestamp):
+        # 同一时间点的文件会被增量保存多次，只统计一次
+        if timestamp == self.last_timestamp:
+            return
+        self.last_timestamp = timestamp
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+
+class ArbitrageBook:
+    def __init__(self, fees=None):
+        self.fees = fees
+        self.latest = {}            # 饰品 -> (序号, Opportunity)
+        self.stats = {}             # 饰品 -> SpreadStats
+        self.newest = {}            # 类型 -> 最新快照时间戳
+        self._heap = []             # (-价差百分比, 序号, 饰品)
+        self._seq = 0
+        self._default_top = None    # 默认查询的结果，两次入库之间复用
+        self._lock = threading.Lock()
+
+    def update(self, records, timestamp, category='', source=None):
+        """
+        用一个快照的数据增量更新
+        :param records: parse_snapshot() 的结果
+        :param timestamp: 快照时间戳
+        :param category: 快照的类型，prune() 按类型的最新时间点清理过期机会
+        :param source: 快照文件名，remove() 按文件删除机会
+        :return: 更新的饰品数量
+        """
+        updated = 0
+        with self._lock:
+            self.newest[category] = max(self.newest.get(category, ''), timestamp)
+            for record in records:
+                buff_price, uu_price = record['buff_price'], record['uu_price']
+                if uu_price is None or buff_price <= 0 or uu_price <= 0:
+                    continue
+                item = record['item']
+                buy, sell, spread, spread_pct = fee_adjusted_spread(buff_price, uu_price, self.fees)
+                prices = {'buff': buff_price, 'uu': uu_price}
+
+                stats = self.stats.get(item)
+                if stats is None:
+                    stats = self.stats[item] = SpreadStats()
+                stats.update(spread_pct, timestamp)
+
+                # 旧快照晚到时不覆盖最新机会
+                current = self.latest.get(item)
+                if current is not None and current[1].timestamp > timestamp:
+                    continue
+                self._seq += 1
+                self.latest[item] = (self._seq, Opportunity(
+                    item, timestamp, buy, sell, prices[buy], prices[sell], spread, spread_pct, category, source,
+                ))
+                heapq.heappush(self._heap, (-spread_pct, self._seq, item))
+                updated += 1
+
+            if updated:
+                self._default_top = None
+                self._compact()
+        return updated
+
+    def _compact(self):
+        # 过期条目过多时重建堆
+        if len(self._heap) > 2 * len(self.latest) + 64:
+            self._heap = [(-opp.spread_pct, seq, item) for item, (seq, opp) in self.latest.items()]
+            heapq.heapify(self._heap)
+
+    def _drop(self, items):
+        for item in items:
+            del self.latest[item]
+            del self.stats[item]
+        if items:
+            self._default_top = None
+            self._compact()
+        return len(items)
+
+    def prune(self):
+        """
+        删除早于所属类型最新时间点的机会，堆中对应的条目在弹出时丢弃
+        :return: 删除的饰品数量
+        """
+        with self._lock:
+            return self._drop([item for item, (_, opp) in self.latest.items()
+                               if opp.timestamp < self.newest.get(opp.category, '')])
+
+    def remove(self, filenames):
+        """
+        删除来自这些快照文件的机会，并按剩余的机会重新确定各类型的最新时间点
+        :return: 删除的饰品数量
+        """
+        filenames = set(filenames)
+        with self._lock:
+            dropped = self._drop([item for item, (_, opp) in self.latest.items() if opp.source in filenames])
+            newest = {}
+            for _, opp in self.latest.values():
+                newest[opp.category] = max(newest.get(opp.category, ''), opp.timestamp)
+            self.newest = newest
+            return dropped
+
+    def _matches(self, item, opp, min_observations, min_price, max_price):
+        if min_observations and self.stats[item].count < min_observations:
+            return False
+        if min_price is not None and opp.buy_price < min_price:
+            return False
+        if max_price is not None and opp.buy_price > max_price:
+            return False
+        return True
+
+    def top(self, k=None, min_observations=0, min_price=None, max_price=None):
+        """
+        价差百分比最高的 K 个机会
+        :param min_observations: 最少出现次数（快照中没有成交量，用双平台同时有报价的次数衡量流动性）
+        :param min_price: 买入价下限
+        :param max_price: 买入价上限
+        :return: [Opportunity]
+        """
+        k = k or settings.ARBITRAGE_TOP_K
+        # 只缓存默认查询，带过滤条件的查询每次从堆顶弹出，避免按客户端参数无限增长
+        default = (k == settings.ARBITRAGE_TOP_K and not min_observations
+                   and min_price is None and max_price is None)
+        with self._lock:
+            if default and self._default_top is not None:
+                return self._default_top
+
+            result, popped = [], []
+            while self._heap and len(result) < k:
+                entry = heapq.heappop(self._heap)
+                _, seq, item = entry
+                current = self.latest.get(item)
+                if current is None or current[0] != seq:
+                    continue  # 过期条目直接丢弃
+                popped.append(entry)
+                if self._matches(item, current[1], min_observations, min_price, max_price):
+                    result.append(current[1])
+            for entry in popped:
+                heapq.heappush(self._heap, entry)
+
+            if default:
+                self._default_top = result
+            return result
+
+    def describe(self, opp):
+        return {
+            'item': opp.item,
+            'timestamp': opp.timestamp,
+            'buy_platform': PLATFORM_NAMES[opp.buy_platform],
+            'sell_platform': PLATFORM_NAMES[opp.sell_platform],
+            'buy_price': opp.buy_price,
+            'sell_price': opp.sell_price,
+            'spread': round(opp.spread, 2),
+            'spread_pct': round(opp.spread_pct, 2),
+            'history': self.stats[opp.item].as_dict(),
+        }
+
+
+_book = ArbitrageBook()
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+
+def ingest_files(book, filenames):
+    """按时间顺序把快照文件送入套利簿，全部送入后清理过期机会"""
+    for filename in sorted(filenames, key=lambda name: (snapshot_timestamp(name), name)):
+        meta = parse_snapshot_filename(filename)
+        if meta is None:
+            continue
+        try:
+            records = read_snapshot(filename)
+        except (OSError, ValueError):
+            continue
+        book.update(records, meta['timestamp'], meta['item_type'], filename)
+    book.prune()
+
+
+def get_arbitrage_book():
+    """获取进程内的套利簿，首次调用时导入快照目录中的全部文件"""
+    global _bootstrapped
+    if not _bootstrapped:
+        with _bootstrap_lock:
+            if not _bootstrapped:
+                ingest_files(_book, list_snapshot_files())
+                # 全部文件导入完成后才对其他线程可见，避免返回只导入了一部分的结果
+                _bootstrapped = True
+    return _book
+
+
+@receiver(snapshot_ingested)
+def scan_new_snapshots(sender, files=(), removed=(), **kwargs):
+    """新快照入库时增量更新价差，文件删除时删除来自它们的机会；套利簿尚未建立时跳过，第一次查询时再完整导入"""
+    if not _bootstrapped:
+        # 首次导入正在进行时等它完成，再补上它可能漏掉的新文件
+        with _bootstrap_lock:
+            if not _bootstrapped:
+                return
+    if removed:
+        _book.remove(removed)
+    ingest_files(_book, files)
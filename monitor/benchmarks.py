@@ -0,0 +1,206 @@
+"""
+端到端性能基准
+
+在指定的快照目录上计时：
+- get_json_files、load_price_data
+- 每个视图经 Django 测试客户端的冷请求（清空缓存）和热请求
+- calculate_technical_indicators、generate_trading_signals
+- 价格矩阵物化、合成持仓的估值和持仓页排序分页
+
+结果追加写入 JSON Lines 文件，每条带版本标签，与上一个版本的结果比较即可发现性能回退。
+
+物化指数会重写 MarketIndex 表，调用方需要保证使用的是临时数据库（run_benchmarks 命令
+通过 isolated_database() 建立，测试中由测试数据库保证）。
+"""
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, override_settings
+
+VIEW_PATHS = {
+    'home': '/',
+    'price_overview': '/price-overview/',
+    'price_chart': '/price-chart/',
+    'trading_strategy': '/strategy/',
+    'item_search': '/api/items/search/',
+    'arbitrage': '/api/arbitrage/',
+    'index_correlations': '/api/indices/correlations/',
+}
+
+
+@contextmanager
+def isolated_database():
+    """在临时的测试数据库中运行（与测试运行器相同的建库方式），退出时销毁，不改动正式数据"""
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def current_version():
+    """当前代码版本：git 提交号，不在 git 仓库中时为 unknown"""
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def timed(func, repeat):
+    """
+    多次执行并计时
+    :return: ({'median', 'min', 'max'} 秒, 最后一次的返回值)
+    """
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - started)
+    return {'median': statistics.median(durations), 'min': min(durations), 'max': max(durations)}, result
+
+
+def run_benchmarks(folder, repeat=3, item=None):
+    """
+    在快照目录上运行全部基准
+    :param folder: 快照目录
+    :param repeat: 每项重复次数
+    :param item: 图表和策略视图使用的饰品名称，默认取第一个文件中的第一个饰品
+    :return: {基准名: {'median', 'min', 'max'}}
+    """
+    # 延迟导入 pandas
+    from .analytics import build_price_history, load_price_data
+    from .strategy import calculate_technical_indicators, generate_trading_signals
+    from .views import get_json_files
+
+    import pandas as pd
+
+    results = {}
+    # 行情表和价格矩阵写到临时目录，不改动快照目录（可能是用户指定的真实数据）
+    with tempfile.TemporaryDirectory() as state_dir, override_settings(
+        CS_DATA_DIR=folder,
+        MONITOR_STATE_PATH=os.path.join(state_dir, 'market_state.bin'),
+        MARKET_MATRIX_PATH=os.path.join(state_dir, 'price_matrix.json'),
+        MONITOR_COMPUTE_TIMEOUT=3600,
+        ALLOWED_HOSTS=['testserver'],
+    ):
+        results['get_json_files'], files = timed(get_json_files, repeat)
+        if not files:
+            return results
+        first_file = files[-1]['items'][0]['filename']
+        results['load_price_data'], df = timed(lambda: load_price_data(first_file), repeat)
+        item = item or df['item'].iloc[0]
+
+        # 指数接口只读取导入时物化的矩阵
+        from .returns import materialize
+        materialize()
+
+        client = Client()
+        for name, path in VIEW_PATHS.items():
+            query = {'item': item} if name in ('price_chart', 'trading_strategy') else {}
+            if name == 'item_search':
+                query = {'q': item[:2]}
+            url = f'{path}?{urlencode(query)}' if query else path
+
+            def request():
+                response = client.get(url)
+                assert response.status_code == 200, f'{url} 返回 {response.status_code}'
+
+            def cold_request():
+                cache.clear()
+                request()
+
+            results[f'view:{name}:cold'], _ = timed(cold_request, repeat)
+            results[f'view:{name}:warm'], _ = timed(request, repeat)
+
+        history = pd.DataFrame(build_price_history(files, item, folder))
+        history['time'] = pd.to_datetime(history['time'], format='%Y%m%d_%H%M%S')
+        results['calculate_technical_indicators'], indicators = timed(
+            lambda: calculate_technical_indicators(history.copy(), item), repeat)
+        results['generate_trading_signals'], _ = timed(lambda: generate_trading_signals(indicators), repeat)
+
+        results['materialize_indices'], _ = timed(lambda: materialize(force=True), repeat)
+
+        results.update(benchmark_valuation(repeat))
+    return results
+
+
+def benchmark_valuation(repeat, holdings=5000):
+    """
+    合成持仓的估值和持仓页（按浮动盈亏排序取第一页）计时，不读写数据库
+    :param holdings: 持仓笔数，饰品从行情表中随机抽取
+    """
+    import random
+    from datetime import date, timedelta
+
+    from .market_state import get_market_state
+    from .valuation import Positions
+
+    state = get_market_state()
+    if state is None or not len(state):
+        return {}
+    rng = random.Random(0)
+    today = date.today()
+    positions = Positions(
+        (i, state.name(rng.randrange(len(state))), rng.choice(['buff', 'uu']), rng.randint(1, 3),
+         rng.uniform(10, 5000), today - timedelta(days=rng.randrange(365)))
+        for i in range(holdings)
+    )
+    results = {}
+    results['portfolio_valuation'], valuation = timed(lambda: positions.value(state, today), repeat)
+    results['portfolio_page'], _ = timed(
+        lambda: list(valuation.rows('-pnl', limit=settings.PORTFOLIO_PAGE_SIZE)), repeat)
+    return results
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_result(path, version, results, meta=None):
+    """把一次基准结果追加写入 JSON Lines 文件"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    entry = {
+        'version': version,
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'meta': meta or {},
+        'results': results,
+    }
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    return entry
+
+
+def compare(previous, current, threshold=0.2):
+    """
+    比较两次基准的中位数
+    :param threshold: 变慢超过该比例视为回退
+    :return: [(基准名, 之前秒数, 现在秒数, 变化比例)]，只包含回退项
+    """
+    regressions = []
+    for name, timing in current.items():
+        before = previous.get(name)
+        if not before or not before['median']:
+            continue
+        change = timing['median'] / before['median'] - 1
+        if change > threshold:
+            regressions.append((name, before['median'], timing['median'], change))
+    return regressions
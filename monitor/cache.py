@@ -0,0 +1,219 @@
+"""
+基于快照版本的视图缓存
+
+视图的输出只会在 cs_data/ 有新数据落地时发生变化，因此缓存键中带上最新的快照版本，
+数据变化后版本随之改变，旧的缓存条目不再被命中，无需依赖 TTL 猜测失效时间。
+
+快照版本由两部分组成：
+- 目录指纹：SnapshotWatcher 对 cs_data/ 中各文件的 (mtime, size) 取哈希，爬虫写入新文件
+  或增量保存已有文件时指纹都会改变，各个 worker 进程据此得到一致的版本；目录最多每
+  MONITOR_SNAPSHOT_POLL_INTERVAL 秒扫描一次，其余请求直接使用上次的指纹
+- 入库代数：显式发送 snapshot_ingested 信号时自增，用于不经过目录的入库方式；
+  代数存放在 Django 缓存中，默认的 LocMemCache 下只对发送信号的进程有效，其他 worker 依靠目录指纹
+- 价格矩阵签名：矩阵和指数由 ingest_snapshots 在快照落地之后物化，矩阵文件被替换时版本也随之改变
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from functools import partial, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+
+from .executor import run_io
+from .profiling import count, phase
+from .signals import snapshot_ingested
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'monitor:snapshot_generation'
+
+
+class SnapshotWatcher:
+    """
+    轮询快照目录，发现文件新增、修改或删除时发送 snapshot_ingested 信号
+    每次轮询只做一次 scandir 和 stat，不读取文件内容；距上次扫描不足 interval 秒时直接返回上次的指纹
+
+    background 为 True 时信号在后台线程中处理，发现变化的请求不用等待索引、行情表等更新；
+    全部接收器处理完之前仍返回旧指纹，新版本的缓存条目不会由尚未更新的进程内数据生成
+    """
+
+    def __init__(self, folder=None, interval=0.0, background=False):
+        self.folder = folder
+        self.interval = interval
+        self.background = background
+        self.fingerprint = ''
+        self._stats = None
+        self._folder = None
+        self._last_scan = None
+        self._dispatching = False
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """
+        检查目录变化
+        :return: 当前目录指纹
+        """
+        interval = self.interval if self.interval is not None else settings.MONITOR_SNAPSHOT_POLL_INTERVAL
+        folder = str(self.folder or settings.CS_DATA_DIR)
+        now = time.monotonic()
+        with self._lock:
+            if self._dispatching or (folder == self._folder and self._last_scan is not None
+                                     and now - self._last_scan < interval):
+                return self.fingerprint
+            self._last_scan = now
+
+        current = {}
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json') and entry.is_file():
+                        stat = entry.stat()
+                        current[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            if folder != self._folder:
+                # 快照目录换了（例如测试中覆盖 CS_DATA_DIR），按首次扫描处理
+                self._folder, self._stats = folder, None
+            if current == self._stats or self._dispatching:
+                return self.fingerprint
+            initial = self._stats is None
+            previous = self._stats or {}
+            changed = sorted(name for name, sig in current.items() if previous.get(name) != sig)
+            removed = sorted(previous.keys() - current.keys())
+            digest = hashlib.md5()
+            for name in sorted(current):
+                digest.update(f'{name}:{current[name][0]}:{current[name][1]};'.encode('utf-8'))
+            self._stats = current
+            fingerprint = digest.hexdigest()[:12]
+            if not (changed or removed):
+                self.fingerprint = fingerprint
+                return fingerprint
+            self._dispatching = True
+
+        if self.background and not initial:
+            threading.Thread(target=self._dispatch, args=(changed, removed, initial, fingerprint),
+                             name='snapshot-watcher', daemon=True).start()
+            return self.fingerprint
+        # 进程启动后的首次扫描在当前请求中完成，保证第一个响应基于完整的进程内数据
+        self._dispatch(changed, removed, initial, fingerprint)
+        return fingerprint
+
+    def _dispatch(self, changed, removed, initial, fingerprint):
+        try:
+            # 单个接收器出错不影响其他接收器，也不让触发轮询的请求失败
+            responses = snapshot_ingested.send_robust(
+                sender=SnapshotWatcher, files=changed, removed=removed, initial=initial)
+            for receiver_func, response in responses:
+                if isinstance(response, Exception):
+                    logger.error('处理快照变化失败（%s）：%r', getattr(receiver_func, '__qualname__', receiver_func),
+                                 response, exc_info=response)
+        finally:
+            with self._lock:
+                self.fingerprint = fingerprint
+                self._dispatching = False
+
+
+# 未指定目录时每次轮询读取 settings.CS_DATA_DIR，扫描间隔取 settings.MONITOR_SNAPSHOT_POLL_INTERVAL
+watcher = SnapshotWatcher(interval=None, background=True)
+
+
+@receiver(snapshot_ingested)
+def bump_snapshot_generation(sender, **kwargs):
+    """显式入库时自增代数；目录轮询发现的变化已经体现在指纹中"""
+    if sender is SnapshotWatcher:
+        return
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+
+def snapshot_version():
+    """
+    获取当前快照版本
+    :return: 形如 "<代数>.<目录指纹>.<价格矩阵签名>" 的字符串
+    """
+    fingerprint = watcher.poll() if settings.MONITOR_SNAPSHOT_WATCH else ''
+    generation = cache.get(GENERATION_KEY, 0)
+    try:
+        matrix = os.stat(settings.MARKET_MATRIX_PATH).st_mtime_ns
+    except OSError:
+        matrix = 0
+    return f'{generation}.{fingerprint}.{matrix}'
+
+
+def snapshot_cache_key(view_name, request, version=None):
+    """
+    生成视图缓存键，包含视图名、快照版本和排序后的查询参数
+    """
+    if version is None:
+        version = snapshot_version()
+    query = sorted((key, value) for key in request.GET for value in request.GET.getlist(key))
+    query_hash = hashlib.md5(repr(query).encode('utf-8')).hexdigest()
+    return f'monitor:view:{view_name}:{version}:{query_hash}'
+
+
+def cache_per_snapshot(view_func=None, *, vary_on=None):
+    """
+    视图缓存装饰器：GET/HEAD 请求的 200 响应按快照版本缓存，新数据入库后自动失效
+    同时支持同步和异步视图
+
+    vary_on 为无参函数，返回快照之外影响输出的版本（例如持仓版本），并入缓存键；
+    异步视图中它在 Django 的线程敏感执行器中调用，可以查询数据库
+    """
+    if view_func is None:
+        return partial(cache_per_snapshot, vary_on=vary_on)
+
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view_func(request, *args, **kwargs)
+
+            with phase('snapshot_version'):
+                version = await run_io(snapshot_version)
+                if vary_on is not None:
+                    version = f'{version}.{await sync_to_async(vary_on)()}'
+            key = snapshot_cache_key(view_func.__name__, request, version)
+            with phase('cache'):
+                response = await cache.aget(key)
+            if response is not None:
+                count('cache_hit')
+                return response
+
+            response = await view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                await cache.aset(key, response, timeout=None)
+            return response
+
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_func(request, *args, **kwargs)
+
+        with phase('snapshot_version'):
+            version = snapshot_version()
+            if vary_on is not None:
+                version = f'{version}.{vary_on()}'
+        key = snapshot_cache_key(view_func.__name__, request, version)
+        with phase('cache'):
+            response = cache.get(key)
+        if response is not None:
+            count('cache_hit')
+            return response
+
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, response, timeout=None)
+        return response
+
+    return wrapper
@@ -0,0 +1,118 @@
+"""
+异步视图使用的后台执行池
+
+- IO 池：读取快照文件、列目录等阻塞 IO，线程池
+- 计算池：pandas 相关的 CPU 密集计算，有界线程池或进程池，每个请求带超时
+
+事件循环本身只负责调度，慢请求只会占用池中的一个 worker，不会阻塞其他请求。
+
+超时只会让请求立即返回，已经在 worker 中运行的函数无法从外部中断，会继续占用该 worker 直到结束。
+逐个处理文件的长任务以 cancellable=True 提交，在处理每个文件前调用 check_deadline()，超时后提前结束。
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+from .profiling import count, phase
+
+_lock = threading.Lock()
+_io_executor = None
+_compute_executor = None
+
+
+class ComputeCancelled(Exception):
+    """计算任务超过截止时间，在处理下一个文件前主动结束"""
+
+
+def check_deadline(deadline):
+    """
+    :param deadline: run_compute 传入的截止时间（time.time()），None 表示不限
+    :raises ComputeCancelled: 已超过截止时间
+    """
+    if deadline is not None and time.time() > deadline:
+        raise ComputeCancelled()
+
+
+def _init_compute_worker():
+    """进程池 worker 初始化：以 spawn 方式启动时需要重新加载 Django 配置"""
+    import django
+    django.setup()
+
+
+def get_io_executor():
+    global _io_executor
+    with _lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=settings.MONITOR_IO_WORKERS,
+                thread_name_prefix='monitor-io',
+            )
+        return _io_executor
+
+
+def get_compute_executor():
+    global _compute_executor
+    with _lock:
+        if _compute_executor is None:
+            if settings.MONITOR_COMPUTE_POOL == 'process':
+                _compute_executor = ProcessPoolExecutor(
+                    max_workers=settings.MONITOR_COMPUTE_WORKERS,
+                    initializer=_init_compute_worker,
+                )
+            else:
+                _compute_executor = ThreadPoolExecutor(
+                    max_workers=settings.MONITOR_COMPUTE_WORKERS,
+                    thread_name_prefix='monitor-compute',
+                )
+        return _compute_executor
+
+
+async def run_io(func, *args, **kwargs):
+    """在 IO 线程池中执行阻塞调用"""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_io_executor(), call)
+
+
+async def run_compute(func, *args, timeout=None, cancellable=False):
+    """
+    在计算池中执行 CPU 密集的函数
+    :param func: 模块级函数（进程池模式下需要可 pickle）
+    :param timeout: 超时秒数，默认取 settings.MONITOR_COMPUTE_TIMEOUT
+    :param cancellable: 为 True 时以关键字参数 deadline 传入截止时间，func 需要定期调用 check_deadline()，
+        超时后尽快释放 worker；否则已开始运行的任务会一直执行到结束
+    :raises asyncio.TimeoutError: 超时未完成（排队中的任务会被取消）
+    """
+    if timeout is None:
+        timeout = settings.MONITOR_COMPUTE_TIMEOUT
+    kwargs = {'deadline': time.time() + timeout} if cancellable else {}
+    executor = get_compute_executor()
+    if isinstance(executor, ThreadPoolExecutor):
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    else:
+        call = functools.partial(func, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    with phase('compute'):
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, call), timeout)
+        except ComputeCancelled:
+            raise asyncio.TimeoutError() from None
+
+
+def read_file(path):
+    with phase('file_read'):
+        with open(path, 'rb') as f:
+            content = f.read()
+    count('files_read')
+    count('bytes_loaded', len(content))
+    return content
+
+
+async def read_files(paths):
+    """并发读取多个文件，返回与 paths 顺序一致的 bytes 列表"""
+    return await asyncio.gather(*(run_io(read_file, path) for path in paths))
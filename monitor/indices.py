@@ -0,0 +1,128 @@
+"""
+类型指数与相关性查询
+
+价格矩阵和指数只由 manage.py ingest_snapshots 物化（见 monitor.returns），Web worker 只加载
+物化好的矩阵文件，文件被替换后重新加载，请求中不会从快照积压重新构建。进程内缓存已加载的
+矩阵和最近用到的收益率窗口，查询结果再由视图按快照版本缓存。
+
+本模块不导入 numpy，第一次查询相关性时才加载。
+"""
+import os
+import threading
+
+from django.conf import settings
+
+from .models import MarketIndex
+from .profiling import phase
+
+MARKET_LABEL = '全市场'
+
+_matrix = None
+_matrix_signature = None
+_windows = {}
+_lock = threading.Lock()
+
+
+def get_price_matrix():
+    """
+    获取最近一次物化的价格矩阵，矩阵文件被替换后重新加载
+    :return: PriceMatrix，尚未物化时为空矩阵
+    """
+    global _matrix, _matrix_signature
+    from .returns import PriceMatrix, load_matrix  # 延迟导入 numpy
+
+    path = str(settings.MARKET_MATRIX_PATH)
+    try:
+        stat = os.stat(path)
+        signature = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        signature = None
+    with _lock:
+        if _matrix is not None and signature == _matrix_signature:
+            return _matrix
+        with phase('load_matrix'):
+            matrix = load_matrix(path) if signature is not None else None
+        _matrix = matrix if matrix is not None else PriceMatrix()
+        _matrix_signature = signature
+        _windows.clear()
+        return _matrix
+
+
+def get_returns_window(window):
+    from .returns import ReturnsWindow
+
+    matrix = get_price_matrix()
+    with _lock:
+        returns = _windows.get(window)
+        if returns is None or returns.matrix is not matrix:
+            # window 来自查询参数，只保留最近用到的几个
+            if len(_windows) >= 8:
+                _windows.clear()
+            with phase('returns'):
+                returns = _windows[window] = ReturnsWindow(matrix, window)
+        return returns
+
+
+def index_series(category=None, limit=None):
+    """
+    物化的指数序列
+    :param category: 类型名称，空字符串表示全市场，None 表示全部指数
+    :return: {指数名称: [{timestamp, value_weighted, equal_weighted, constituents}]}
+    """
+    queryset = MarketIndex.objects.order_by('category', 'timestamp')
+    if category is not None:
+        queryset = queryset.filter(category=category)
+    series = {}
+    for name, timestamp, value_weighted, equal_weighted, constituents in queryset.values_list(
+        'category', 'timestamp', 'value_weighted', 'equal_weighted', 'constituents'
+    ):
+        series.setdefault(name or MARKET_LABEL, []).append({
+            'timestamp': timestamp.strftime('%Y%m%d_%H%M%S'),
+            'value_weighted': round(value_weighted, 4),
+            'equal_weighted': round(equal_weighted, 4),
+            'constituents': constituents,
+        })
+    if limit:
+        series = {name: points[-limit:] for name, points in series.items()}
+    return series
+
+
+def query_correlations(index=None, item=None, window=None, min_periods=None, category=None,
+                       limit=50, order='correlation'):
+    """
+    与指数（默认全市场）或某个饰品同涨同跌的饰品
+    :param index: 类型名称，空字符串或 None 表示全市场
+    :param item: 以该饰品的收益率为目标，优先于 index
+    :return: 结果字典；指数或饰品不存在、或价格矩阵尚未物化时返回 None
+    """
+    window = window or settings.MARKET_INDEX_WINDOW
+    min_periods = min_periods or max(2, window // 2)
+    returns = get_returns_window(window)
+    matrix = returns.matrix
+    if not matrix.timestamps:
+        return None
+    if item:
+        if item not in matrix.positions:
+            return None
+        target = returns.item_returns(item)
+    else:
+        index = index or ''
+        if index and index not in matrix.categories:
+            return None
+        target = returns.index_returns(index)
+    if category is not None and category not in matrix.categories:
+        return None
+
+    from .returns import rank_correlations
+    with phase('correlate'):
+        results = rank_correlations(returns, target, min_periods, category=category, exclude=item,
+                                    limit=limit, order=order)
+    return {
+        'target': item or index or MARKET_LABEL,
+        'window': window,
+        'min_periods': min_periods,
+        'periods': len(returns.timestamps),
+        'start': returns.timestamps[0] if returns.timestamps else None,
+        'end': returns.timestamps[-1] if returns.timestamps else None,
+        'results': results,
+    }
@@ -0,0 +1,174 @@
+"""
+快照批量入库
+
+文件在进程池中读取和解析，主进程按大事务批量写入 Snapshot / PriceRecord。
+每个文件记录内容哈希：内容未变化的文件直接跳过，爬虫增量保存导致内容变化的文件会替换原有记录。
+"""
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PriceRecord, Snapshot
+from .snapshots import list_snapshot_files, parse_change, parse_snapshot, parse_snapshot_filename
+
+
+def parse_snapshot_file(path, known_hash=None):
+    """
+    读取并解析一个快照文件（在进程池中执行）
+    :param known_hash: 已入库的内容哈希，相同则跳过解析
+    :return: (文件名, 内容哈希, 行列表或 None, 文件字节数, 错误信息或 None)
+    """
+    filename = os.path.basename(path)
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+    except OSError as e:
+        return filename, None, None, 0, str(e)
+    content_hash = hashlib.sha256(content).hexdigest()
+    if content_hash == known_hash:
+        return filename, content_hash, None, len(content), None
+
+    rows = []
+    try:
+        for record in parse_snapshot(content):
+            today_change, today_change_pct = parse_change(record['today_change'])
+            week_change, week_change_pct = parse_change(record['week_change'])
+            rows.append((record['item'], record['buff_price'], record['uu_price'],
+                         today_change, today_change_pct, week_change, week_change_pct))
+    except ValueError as e:
+        # 爬虫可能正在改写该文件，本次跳过，下次运行时内容哈希不同会重新导入
+        return filename, content_hash, None, len(content), str(e)
+    return filename, content_hash, rows, len(content), None
+
+
+@dataclass
+class IngestStats:
+    total_files: int = 0
+    files: int = 0
+    skipped: int = 0
+    rows: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    ingested: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mb_per_second(self):
+        return self.bytes / 1024 / 1024 / self.elapsed if self.elapsed else 0.0
+
+
+def snapshot_datetime(timestamp):
+    value = datetime.strptime(timestamp, '%Y%m%d_%H%M%S')
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def write_snapshots(parsed, existing, batch_size):
+    """
+    在一个事务中写入一批已解析的快照
+    :param parsed: [(文件名, 内容哈希, 行列表)]
+    :param existing: {文件名: Snapshot id}，内容变化的旧快照会被替换
+    """
+    records = []
+    with transaction.atomic():
+        for filename, content_hash, rows in parsed:
+            meta = parse_snapshot_filename(filename)
+            snapshot_id = existing.get(filename)
+            if snapshot_id is None:
+                snapshot = Snapshot.objects.create(
+                    filename=filename,
+                    source=meta['source'],
+                    item_type=meta['item_type'],
+                    timestamp=snapshot_datetime(meta['timestamp']),
+                    content_hash=content_hash,
+                    row_count=len(rows),
+                )
+                snapshot_id = existing[filename] = snapshot.id
+            else:
+                PriceRecord.objects.filter(snapshot_id=snapshot_id).delete()
+                Snapshot.objects.filter(id=snapshot_id).update(
+                    content_hash=content_hash, row_count=len(rows), ingested_at=timezone.now(),
+                )
+            records.extend(
+                PriceRecord(
+                    snapshot_id=snapshot_id, item=item, buff_price=buff_price, uu_price=uu_price,
+                    today_change=today_change, today_change_pct=today_change_pct,
+                    week_change=week_change, week_change_pct=week_change_pct,
+                )
+                for item, buff_price, uu_price, today_change, today_change_pct, week_change, week_change_pct in rows
+            )
+        PriceRecord.objects.bulk_create(records, batch_size=batch_size)
+
+
+def ingest_snapshots(folder=None, workers=None, transaction_rows=200000, batch_size=5000, force=False, progress=None):
+    """
+    把快照目录中的文件批量入库
+    :param workers: 解析进程数，默认为 CPU 核数；为 1 时在当前进程中解析
+    :param transaction_rows: 每个事务写入的最大行数
+    :param batch_size: 每条 INSERT 语句的行数
+    :param force: 忽略内容哈希，重新导入所有文件
+    :param progress: 每处理完一个文件调用 progress(stats)
+    :return: IngestStats
+    """
+    folder = folder or settings.CS_DATA_DIR
+    workers = workers or os.cpu_count() or 1
+    filenames = list_snapshot_files(folder)
+    known = {} if force else dict(Snapshot.objects.values_list('filename', 'content_hash'))
+    existing = dict(Snapshot.objects.values_list('filename', 'id'))
+    stats = IngestStats(total_files=len(filenames))
+
+    pending, pending_rows = [], 0
+
+    def consume(result):
+        nonlocal pending, pending_rows
+        filename, content_hash, rows, size, error = result
+        stats.files += 1
+        stats.bytes += size
+        if error is not None:
+            stats.failed.append((filename, error))
+        elif rows is None:
+            stats.skipped += 1
+        else:
+            pending.append((filename, content_hash, rows))
+            pending_rows += len(rows)
+            stats.rows += len(rows)
+            stats.ingested.append(filename)
+            if pending_rows >= transaction_rows:
+                write_snapshots(pending, existing, batch_size)
+                pending, pending_rows = [], 0
+        if progress:
+            progress(stats)
+
+    tasks = ((os.path.join(folder, name), known.get(name)) for name in filenames)
+    if workers == 1:
+        for path, known_hash in tasks:
+            consume(parse_snapshot_file(path, known_hash))
+    else:
+        # 限制在途任务数量，避免解析结果堆积在内存中
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            for path, known_hash in tasks:
+                in_flight.append(pool.submit(parse_snapshot_file, path, known_hash))
+                if len(in_flight) >= workers * 4:
+                    consume(in_flight.popleft().result())
+            while in_flight:
+                consume(in_flight.popleft().result())
+
+    if pending:
+        write_snapshots(pending, existing, batch_size)
+    return stats
@@ -0,0 +1,21 @@
+"""
+跨进程文件锁
+
+行情表、价格矩阵等共享文件由多个 worker 或导入命令同时更新时，用同目录下的 .lock 文件
+串行化构建。Windows 没有 fcntl，此时不加锁（依赖原子替换保证读到的文件完整）。
+"""
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    """持有 path + '.lock' 的排他锁，退出时释放"""
+    with open(str(path) + '.lock', 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
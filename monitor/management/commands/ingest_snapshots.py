@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitor.alerts import evaluate_new_snapshots
+from monitor.ingest import ingest_snapshots
+from monitor.market_state import publish_state
+from monitor.signals import snapshot_ingested
+
+
+class Command(BaseCommand):
+    help = '把 cs_data/ 中的快照文件（qaq_*.json 和 cs_*.json）批量导入数据库，已导入且未变化的文件会被跳过'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folder', default=None, help='快照目录，默认为 settings.CS_DATA_DIR')
+        parser.add_argument('--workers', type=int, default=None, help='解析进程数，默认为 CPU 核数')
+        parser.add_argument('--transaction-rows', type=int, default=200000, help='每个事务写入的最大行数')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每条 INSERT 语句的行数')
+        parser.add_argument('--force', action='store_true', help='忽略内容哈希，重新导入所有文件')
+        parser.add_argument('--notify', action='store_true', help='导入完成后发送 snapshot_ingested 信号')
+
+    def handle(self, *args, **options):
+        last_report = 0.0
+
+        def progress(stats):
+            nonlocal last_report
+            now = time.perf_counter()
+            if stats.files < stats.total_files and now - last_report < 1:
+                return
+            last_report = now
+            self.stdout.write(
+                f'[{stats.files}/{stats.total_files}] 写入 {stats.rows} 行，跳过 {stats.skipped} 个文件，'
+                f'{stats.rows_per_second:,.0f} 行/秒，{stats.mb_per_second:.1f} MB/秒'
+            )
+
+        stats = ingest_snapshots(
+            folder=options['folder'] or settings.CS_DATA_DIR,
+            workers=options['workers'],
+            transaction_rows=options['transaction_rows'],
+            batch_size=options['batch_size'],
+            force=options['force'],
+            progress=progress,
+        )
+
+        for filename, error in stats.failed:
+            self.stderr.write(self.style.WARNING(f'无法解析 {filename}，已跳过：{error}'))
+
+        # 发布各 worker 共享的最新行情表，来源文件未变化时跳过
+        if stats.ingested and publish_state(folder=options['folder'] or settings.CS_DATA_DIR):
+            self.stdout.write('已发布最新行情表')
+
+        # 物化价格矩阵和类型指数，只追加新的时间点
+        if stats.ingested:
+            from monitor.returns import materialize  # 延迟导入 numpy
+            matrix = materialize(folder=options['folder'] or settings.CS_DATA_DIR)
+            self.stdout.write(f'已物化价格矩阵：{len(matrix.items)} 个饰品 × {len(matrix.timestamps)} 个时间点')
+
+        # 价格提醒只在这里评估和发送，Web worker 不参与
+        if stats.ingested:
+            alerts = evaluate_new_snapshots(stats.ingested, folder=options['folder'] or settings.CS_DATA_DIR)
+            if alerts:
+                self.stdout.write(f'触发 {len(alerts)} 条价格提醒')
+
+        if options['notify'] and stats.ingested:
+            snapshot_ingested.send(sender=self.__class__, files=stats.ingested, removed=[])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'导入 {len(stats.ingested)} 个文件、{stats.rows} 行，跳过 {stats.skipped} 个未变化的文件，'
+            f'{len(stats.failed)} 个文件解析失败，耗时 {stats.elapsed:.1f} 秒（{stats.rows_per_second:,.0f} 行/秒）'
+        ))
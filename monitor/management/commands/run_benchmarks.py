@@ -0,0 +1,61 @@
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor.benchmarks import (
+    compare, current_version, isolated_database, load_history, run_benchmarks, save_result,
+)
+from monitor.synthetic import generate_market
+
+
+class Command(BaseCommand):
+    help = '在合成或已有的快照目录上运行端到端性能基准，并与上一个版本的结果比较'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', default=None, help='快照目录，不指定时生成合成数据')
+        parser.add_argument('--items', type=int, default=1000, help='合成数据的饰品数量')
+        parser.add_argument('--timestamps', type=int, default=100, help='合成数据的时间点数量')
+        parser.add_argument('--repeat', type=int, default=3, help='每项重复次数')
+        parser.add_argument('--item', default=None, help='图表和策略视图使用的饰品名称')
+        parser.add_argument('--label', default=None, help='版本标签，默认为 git describe 的结果')
+        parser.add_argument('--output', default=str(settings.BASE_DIR / 'benchmarks' / 'results.jsonl'),
+                            help='结果文件（JSON Lines）')
+        parser.add_argument('--threshold', type=float, default=0.2, help='变慢超过该比例视为回退')
+        parser.add_argument('--fail-on-regression', action='store_true', help='出现回退时以非零状态退出')
+
+    def handle(self, *args, **options):
+        version = options['label'] or current_version()
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = options['data']
+            meta = {'data': folder}
+            if folder is None:
+                folder = tmp
+                meta = {'items': options['items'], 'timestamps': options['timestamps']}
+                self.stdout.write(f"生成合成数据：{options['items']} 个饰品 × {options['timestamps']} 个时间点")
+                generate_market(folder, items=options['items'], timestamps=options['timestamps'])
+            # 基准会物化指数、写入数据库，在临时数据库中运行
+            with isolated_database():
+                results = run_benchmarks(folder, repeat=options['repeat'], item=options['item'])
+
+        for name, timing in results.items():
+            self.stdout.write(f"{name:<40} {timing['median'] * 1000:>10.2f} ms"
+                              f"（{timing['min'] * 1000:.2f} ~ {timing['max'] * 1000:.2f}）")
+
+        # 与同样规模的上一个版本比较
+        previous = [entry for entry in load_history(options['output'])
+                    if entry['version'] != version and entry['meta'] == meta]
+        save_result(options['output'], version, results, meta)
+        self.stdout.write(f"结果已写入 {options['output']}（版本 {version}）")
+
+        if not previous:
+            return
+        regressions = compare(previous[-1]['results'], results, options['threshold'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"与版本 {previous[-1]['version']} 相比没有性能回退"))
+            return
+        for name, before, after, change in regressions:
+            self.stdout.write(self.style.WARNING(
+                f'{name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms（+{change:.0%}）'))
+        if options['fail_on_regression']:
+            raise CommandError(f"与版本 {previous[-1]['version']} 相比有 {len(regressions)} 项性能回退")
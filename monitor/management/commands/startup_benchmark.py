@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor.startup import DEFAULT_PATHS, measure
+
+
+class Command(BaseCommand):
+    help = '测量 Django 启动、URL 导入和首个请求的耗时，并与 MONITOR_STARTUP_BUDGET 比较'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=list(DEFAULT_PATHS), help='首次请求的路径')
+        parser.add_argument('--items', type=int, default=500, help='合成快照积压中的饰品数量')
+        parser.add_argument('--timestamps', type=int, default=48, help='合成快照积压中的时间点数量')
+
+    def handle(self, *args, **options):
+        budget = settings.MONITOR_STARTUP_BUDGET
+        result = measure(options['paths'], items=options['items'], timestamps=options['timestamps'])
+
+        self.stdout.write(f"django.setup(): {result['setup'] * 1000:.1f} ms")
+        self.stdout.write(f"导入 URL 配置: {result['urls'] * 1000:.1f} ms")
+        self.stdout.write(f"启动合计: {result['import'] * 1000:.1f} ms（预算 {budget['import'] * 1000:.0f} ms）")
+        for path, timing in result['requests'].items():
+            self.stdout.write(f"首次请求 {path}: {timing['seconds'] * 1000:.1f} ms [{timing['status']}]"
+                              f"（预算 {budget['first_request'] * 1000:.0f} ms）")
+        if result['heavy_modules']:
+            self.stdout.write(f"已加载的重量级依赖: {', '.join(result['heavy_modules'])}")
+
+        over = result['import'] > budget['import'] or any(
+            timing['seconds'] > budget['first_request'] for timing in result['requests'].values()
+        )
+        if over:
+            raise CommandError('启动耗时超出预算')
+        self.stdout.write(self.style.SUCCESS('启动耗时在预算内'))
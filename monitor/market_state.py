@@ -0,0 +1,289 @@
+"""
+紧凑的最新行情表，所有 worker 进程通过 mmap 只读共享
+
+每次入库后由一个进程把最新行情写成二进制文件（先写临时文件再原子替换），各 worker 以只读方式
+mmap 同一个文件，数据只在操作系统页缓存中保留一份。worker 每次访问前 stat 一次文件，发现被
+替换后重新映射，因此新数据对所有 worker 同时可见。
+
+文件布局（小端）：
+    头部        magic、格式版本、代数、饰品数、元数据长度、名称区长度
+    元数据      JSON：类型列表、来源文件签名、各类型的时间戳
+    名称偏移    uint32[饰品数 + 1]
+    名称区      按名称排序的 UTF-8 字节，饰品 ID 即排序后的下标
+    类型编码    uint16[饰品数]
+    价格列      float32[饰品数] × 6：buff、uu、今日涨跌、今日涨跌 %、本周涨跌、本周涨跌 %（缺失为 NaN）
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .locks import file_lock
+from .signals import snapshot_ingested
+from .snapshots import list_snapshot_files, parse_change, parse_snapshot_filename, read_snapshot
+
+MAGIC = b'CS2STATE'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIQIIQ')
+COLUMNS = ('buff_price', 'uu_price', 'today_change', 'today_change_pct', 'week_change', 'week_change_pct')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def latest_sources(folder=None):
+    """
+    每个 (来源, 类型) 最新的快照文件及其签名
+    :return: {文件名: [mtime_ns, size]}
+    """
+    folder = folder or settings.CS_DATA_DIR
+    latest = {}
+    for filename in list_snapshot_files(folder):
+        meta = parse_snapshot_filename(filename)
+        latest[(meta['source'], meta['item_type'])] = filename
+    sources = {}
+    for filename in sorted(latest.values()):
+        try:
+            stat = os.stat(os.path.join(folder, filename))
+        except FileNotFoundError:
+            continue
+        sources[filename] = [stat.st_mtime_ns, stat.st_size]
+    return sources
+
+
+def read_readable_snapshot(filename, folder):
+    """
+    读取快照；爬虫可能正在原地改写文件，读到不完整的 JSON 时退回同一来源和类型的上一个文件
+    文件写完后签名变化，行情表会重新构建
+    :return: (实际读取的文件名, 记录列表)，没有可读的文件时返回 (None, None)
+    """
+    try:
+        return filename, read_snapshot(filename, folder)
+    except (OSError, ValueError):
+        pass
+    meta = parse_snapshot_filename(filename)
+    # 同一来源和类型的文件名只差时间戳，按文件名倒序即从新到旧
+    older = sorted((
+        name for name in list_snapshot_files(folder)
+        if name < filename and parse_snapshot_filename(name)['source'] == meta['source']
+        and parse_snapshot_filename(name)['item_type'] == meta['item_type']
+    ), reverse=True)
+    for name in older:
+        try:
+            return name, read_snapshot(name, folder)
+        except (OSError, ValueError):
+            continue
+    return None, None
+
+
+def build_state_bytes(sources, folder=None):
+    """
+    把最新快照编码为二进制行情表
+    同一饰品出现在多个文件中时，时间较新的记录覆盖旧记录；同一时间点 qaq 的记录（带悠悠价格）优先。
+    较新的 cs_ 文件只有 BUFF 价格，悠悠价格和涨跌沿用之前的 qaq 记录，类型也保留 qaq 的分类，
+    不会因为 BUFF 单独更新而变成 NaN 或换成 BUFF 的分类名
+    """
+    folder = folder or settings.CS_DATA_DIR
+    rows = {}
+    categories = []
+    category_codes = {}
+    timestamps = {}
+    ordered = sorted(sources, key=lambda name: (parse_snapshot_filename(name)['timestamp'],
+                                                parse_snapshot_filename(name)['source'] == 'qaq'))
+    for filename in ordered:
+        filename, records = read_readable_snapshot(filename, folder)
+        if records is None:
+            continue
+        meta = parse_snapshot_filename(filename)
+        item_type = meta['item_type']
+        if item_type not in category_codes:
+            category_codes[item_type] = len(categories)
+            categories.append(item_type)
+        timestamps[item_type] = max(timestamps.get(item_type, ''), meta['timestamp'])
+        is_qaq = meta['source'] == 'qaq'
+        for record in records:
+            today = parse_change(record['today_change'])
+            week = parse_change(record['week_change'])
+            row = (category_codes[item_type], (
+                record['buff_price'], record['uu_price'], today[0], today[1], week[0], week[1],
+            ), is_qaq)
+            previous = rows.get(record['item'])
+            if previous is not None and previous[2] and not is_qaq:
+                # 只更新 BUFF 价格，其余字段和分类沿用 qaq 记录
+                row = (previous[0], tuple(old if value is None else value
+                                          for value, old in zip(row[1], previous[1])), True)
+            rows[record['item']] = row
+
+    names = sorted(rows)
+    encoded = [name.encode('utf-8') for name in names]
+    offsets = array('I', [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    blob = b''.join(encoded)
+    codes = array('H', (rows[name][0] for name in names))
+    nan = float('nan')
+    columns = [
+        array('f', (nan if rows[name][1][i] is None else rows[name][1][i] for name in names))
+        for i in range(len(COLUMNS))
+    ]
+    metadata = json.dumps({
+        'categories': categories,
+        'timestamps': timestamps,
+        'sources': sources,
+    }, ensure_ascii=False).encode('utf-8')
+
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, time.time_ns(), len(names), len(metadata), len(blob)), metadata]
+    for section in (offsets.tobytes(), blob, codes.tobytes(), *(column.tobytes() for column in columns)):
+        size = sum(len(part) for part in parts)
+        parts.append(b'\0' * (_align(size) - size))
+        parts.append(section)
+    return b''.join(parts)
+
+
+def publish_state(path=None, folder=None, force=False):
+    """
+    发布最新行情表
+    来源文件与已发布的行情表一致时跳过；多个进程同时发布时由文件锁保证只构建一次
+    :return: 是否写入了新的行情表
+    """
+    path = str(path or settings.MONITOR_STATE_PATH)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sources = latest_sources(folder)
+    if not force and _published_sources(path) == sources:
+        return False
+
+    with file_lock(path):
+        # 等锁期间其他进程可能已经发布
+        if not force and _published_sources(path) == sources:
+            return False
+        data = build_state_bytes(sources, folder)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.market_state.')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return True
+
+
+def _published_sources(path):
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return None
+            magic, version, _, _, meta_len, _ = HEADER.unpack(header)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                return None
+            return json.loads(f.read(meta_len))['sources']
+    except (OSError, ValueError):
+        return None
+
+
+class MarketState:
+    """映射到内存的只读行情表"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, self.generation, count, meta_len, blob_len = HEADER.unpack_from(view)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path} 不是有效的行情表文件')
+        self.count = count
+        offset = HEADER.size
+        metadata = json.loads(bytes(view[offset:offset + meta_len]))
+        self.categories = metadata['categories']
+        self.timestamps = metadata['timestamps']
+        offset += meta_len
+
+        def section(size):
+            nonlocal offset
+            offset = _align(offset)
+            start, offset = offset, offset + size
+            return view[start:offset]
+
+        self._offsets = section(4 * (count + 1)).cast('I')
+        self._blob = section(blob_len)
+        self.category_codes = section(2 * count).cast('H')
+        for column in COLUMNS:
+            setattr(self, column, section(4 * count).cast('f'))
+
+    def __len__(self):
+        return self.count
+
+    def is_current(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) == (self._stat.st_ino, self._stat.st_mtime_ns)
+
+    def name(self, item_id):
+        return bytes(self._blob[self._offsets[item_id]:self._offsets[item_id + 1]]).decode('utf-8')
+
+    def lookup(self, name):
+        """按名称二分查找饰品 ID，不存在时返回 None"""
+        key = name.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self._blob[self._offsets[mid]:self._offsets[mid + 1]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.count and self.name(lo) == name else None
+
+    def category(self, item_id):
+        return self.categories[self.category_codes[item_id]]
+
+    def row(self, item_id):
+        row = {'item': self.name(item_id), 'item_type': self.category(item_id)}
+        for column in COLUMNS:
+            value = getattr(self, column)[item_id]
+            row[column] = None if math.isnan(value) else value
+        return row
+
+    def rows(self):
+        for item_id in range(self.count):
+            yield self.row(item_id)
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_market_state():
+    """
+    获取最新行情表；文件被替换后重新映射，尚未发布时先发布一次
+    :return: MarketState，没有任何快照时返回 None
+    """
+    global _state
+    path = str(settings.MONITOR_STATE_PATH)
+    state = _state
+    if state is not None and state.is_current(path):
+        return state
+    with _state_lock:
+        if _state is not None and _state.is_current(path):
+            return _state
+        if not os.path.exists(path):
+            publish_state(path)
+        try:
+            _state = MarketState(path)
+        except (OSError, ValueError):
+            _state = None
+        return _state
+
+
+@receiver(snapshot_ingested)
+def publish_on_ingest(sender, **kwargs):
+    """新快照入库后发布最新行情表，来源未变化时不会重复构建"""
+    publish_state()
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100, verbose_name='名称')),
+                ('item', models.CharField(blank=True, db_index=True, help_text='留空表示所有饰品', max_length=200, verbose_name='饰品')),
+                ('field', models.CharField(choices=[('buff_price', 'BUFF 价格'), ('uu_price', '悠悠价格'), ('today_change_pct', '今日涨跌 %'), ('week_change_pct', '本周涨跌 %'), ('spread_pct', '跨平台价差 %')], max_length=20, verbose_name='指标')),
+                ('operator', models.CharField(choices=[('below', '低于'), ('above', '高于')], max_length=10, verbose_name='条件')),
+                ('threshold', models.FloatField(verbose_name='阈值')),
+                ('hysteresis', models.FloatField(default=0, help_text='触发后需回到阈值另一侧超过该幅度才会再次触发', verbose_name='回差')),
+                ('cooldown', models.PositiveIntegerField(default=0, help_text='两次通知之间的最短间隔', verbose_name='冷却时间（秒）')),
+                ('enabled', models.BooleanField(default=True, verbose_name='启用')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '价格提醒',
+                'verbose_name_plural': '价格提醒',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Snapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255, unique=True, verbose_name='文件名')),
+                ('source', models.CharField(choices=[('qaq', 'csqaq'), ('buff', 'BUFF')], max_length=10, verbose_name='来源')),
+                ('item_type', models.CharField(db_index=True, max_length=100, verbose_name='类型')),
+                ('timestamp', models.DateTimeField(db_index=True, verbose_name='抓取时间')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='内容哈希')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='记录数')),
+                ('ingested_at', models.DateTimeField(auto_now=True, verbose_name='入库时间')),
+            ],
+            options={
+                'verbose_name': '快照',
+                'verbose_name_plural': '快照',
+                'ordering': ['timestamp', 'filename'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.CharField(max_length=200, verbose_name='饰品')),
+                ('buff_price', models.FloatField(verbose_name='BUFF 价格')),
+                ('uu_price', models.FloatField(null=True, verbose_name='悠悠价格')),
+                ('today_change', models.FloatField(null=True, verbose_name='今日涨跌')),
+                ('today_change_pct', models.FloatField(null=True, verbose_name='今日涨跌 %')),
+                ('week_change', models.FloatField(null=True, verbose_name='本周涨跌')),
+                ('week_change_pct', models.FloatField(null=True, verbose_name='本周涨跌 %')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='records', to='monitor.snapshot')),
+            ],
+            options={
+                'verbose_name': '价格记录',
+                'verbose_name_plural': '价格记录',
+                'indexes': [models.Index(fields=['item', 'snapshot'], name='monitor_pri_item_264ede_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0002_snapshot_pricerecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.CharField(db_index=True, max_length=200, verbose_name='饰品')),
+                ('platform', models.CharField(choices=[('buff', 'BUFF'), ('uu', '悠悠有品')], default='buff', max_length=10, verbose_name='平台')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='数量')),
+                ('purchase_price', models.FloatField(verbose_name='买入单价')),
+                ('purchased_at', models.DateField(verbose_name='买入日期')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '持仓',
+                'verbose_name_plural': '持仓',
+                'ordering': ['purchased_at', 'id'],
+            },
+        ),
+    ]
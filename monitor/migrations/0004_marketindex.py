@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0003_holding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, help_text='留空表示全市场', max_length=100, verbose_name='类型')),
+                ('timestamp', models.DateTimeField(db_index=True, verbose_name='时间')),
+                ('value_weighted', models.FloatField(verbose_name='市值加权')),
+                ('equal_weighted', models.FloatField(verbose_name='等权')),
+                ('constituents', models.PositiveIntegerField(verbose_name='成分数')),
+            ],
+            options={
+                'verbose_name': '市场指数',
+                'verbose_name_plural': '市场指数',
+                'ordering': ['category', 'timestamp'],
+                'constraints': [models.UniqueConstraint(fields=('category', 'timestamp'), name='unique_index_point')],
+            },
+        ),
+    ]
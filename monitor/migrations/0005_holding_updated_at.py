@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0004_marketindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='holding',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='修改时间'),
+            preserve_default=False,
+        ),
+    ]
@@ -1,3 +1,124 @@
 from django.db import models
 
-# Create your models here.
+
+class AlertRule(models.Model):
+    """价格提醒规则，每次快照入库时由 monitor.alerts 评估"""
+    FIELD_CHOICES = [
+        ('buff_price', 'BUFF 价格'),
+        ('uu_price', '悠悠价格'),
+        ('today_change_pct', '今日涨跌 %'),
+        ('week_change_pct', '本周涨跌 %'),
+        ('spread_pct', '跨平台价差 %'),
+    ]
+    OPERATOR_CHOICES = [
+        ('below', '低于'),
+        ('above', '高于'),
+    ]
+
+    name = models.CharField('名称', max_length=100, blank=True)
+    item = models.CharField('饰品', max_length=200, blank=True, db_index=True, help_text='留空表示所有饰品')
+    field = models.CharField('指标', max_length=20, choices=FIELD_CHOICES)
+    operator = models.CharField('条件', max_length=10, choices=OPERATOR_CHOICES)
+    threshold = models.FloatField('阈值')
+    hysteresis = models.FloatField('回差', default=0, help_text='触发后需回到阈值另一侧超过该幅度才会再次触发')
+    cooldown = models.PositiveIntegerField('冷却时间（秒）', default=0, help_text='两次通知之间的最短间隔')
+    enabled = models.BooleanField('启用', default=True)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+
+    class Meta:
+        verbose_name = '价格提醒'
+        verbose_name_plural = '价格提醒'
+
+    def __str__(self):
+        target = self.item or '所有饰品'
+        return f'{target} {self.get_field_display()} {self.get_operator_display()} {self.threshold}'
+
+
+class Snapshot(models.Model):
+    """一个已入库的快照文件，按内容哈希保证重复导入时幂等"""
+    SOURCE_CHOICES = [
+        ('qaq', 'csqaq'),
+        ('buff', 'BUFF'),
+    ]
+
+    filename = models.CharField('文件名', max_length=255, unique=True)
+    source = models.CharField('来源', max_length=10, choices=SOURCE_CHOICES)
+    item_type = models.CharField('类型', max_length=100, db_index=True)
+    timestamp = models.DateTimeField('抓取时间', db_index=True)
+    content_hash = models.CharField('内容哈希', max_length=64)
+    row_count = models.PositiveIntegerField('记录数', default=0)
+    ingested_at = models.DateTimeField('入库时间', auto_now=True)
+
+    class Meta:
+        verbose_name = '快照'
+        verbose_name_plural = '快照'
+        ordering = ['timestamp', 'filename']
+
+    def __str__(self):
+        return self.filename
+
+
+class PriceRecord(models.Model):
+    """快照中的一条饰品价格"""
+    snapshot = models.ForeignKey(Snapshot, on_delete=models.CASCADE, related_name='records')
+    item = models.CharField('饰品', max_length=200)
+    buff_price = models.FloatField('BUFF 价格')
+    uu_price = models.FloatField('悠悠价格', null=True)
+    today_change = models.FloatField('今日涨跌', null=True)
+    today_change_pct = models.FloatField('今日涨跌 %', null=True)
+    week_change = models.FloatField('本周涨跌', null=True)
+    week_change_pct = models.FloatField('本周涨跌 %', null=True)
+
+    class Meta:
+        verbose_name = '价格记录'
+        verbose_name_plural = '价格记录'
+        indexes = [
+            models.Index(fields=['item', 'snapshot']),
+        ]
+
+    def __str__(self):
+        return f'{self.item} @ {self.snapshot_id}'
+
+
+class Holding(models.Model):
+    """一笔持仓，由 monitor.portfolio 按最新行情估值"""
+    PLATFORM_CHOICES = [
+        ('buff', 'BUFF'),
+        ('uu', '悠悠有品'),
+    ]
+
+    item = models.CharField('饰品', max_length=200, db_index=True)
+    platform = models.CharField('平台', max_length=10, choices=PLATFORM_CHOICES, default='buff')
+    quantity = models.PositiveIntegerField('数量', default=1)
+    purchase_price = models.FloatField('买入单价')
+    purchased_at = models.DateField('买入日期')
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    updated_at = models.DateTimeField('修改时间', auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = '持仓'
+        verbose_name_plural = '持仓'
+        ordering = ['purchased_at', 'id']
+
+    def __str__(self):
+        return f'{self.item} × {self.quantity} @ {self.purchase_price}'
+
+
+class MarketIndex(models.Model):
+    """类型指数和全市场指数（category 为空），每次入库后由 monitor.indices 物化"""
+    category = models.CharField('类型', max_length=100, blank=True, help_text='留空表示全市场')
+    timestamp = models.DateTimeField('时间', db_index=True)
+    value_weighted = models.FloatField('市值加权')
+    equal_weighted = models.FloatField('等权')
+    constituents = models.PositiveIntegerField('成分数')
+
+    class Meta:
+        verbose_name = '市场指数'
+        verbose_name_plural = '市场指数'
+        ordering = ['category', 'timestamp']
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'timestamp'], name='unique_index_point'),
+        ]
+
+    def __str__(self):
+        return f'{self.category or "全市场"} @ {self.timestamp}'
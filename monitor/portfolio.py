@@ -0,0 +1,78 @@
+"""
+持仓估值缓存
+
+进程内缓存一份按列存放的持仓和最近一次估值：
+- 每次估值前查询一次持仓版本（记录数、最大 id 和最近修改时间），任何进程增删改持仓后版本都会变化，
+  下次使用时从数据库重新加载
+- 行情表重新发布（新快照入库）或日期变化后重新估值；已经加载过持仓的进程在入库时立即重新估值，
+  之后的持仓页请求直接使用结果
+
+本模块不导入 numpy，估值引擎 monitor.valuation 只在第一次估值时加载。
+"""
+import threading
+from datetime import date
+
+from django.db.models import Count, Max
+from django.dispatch import receiver
+
+from .market_state import get_market_state
+from .models import Holding
+from .profiling import count, phase
+from .signals import snapshot_ingested
+
+_positions = None
+_valuation = None
+_holdings_version = None
+_lock = threading.Lock()
+
+
+def load_holdings():
+    return Holding.objects.values_list(
+        'id', 'item', 'platform', 'quantity', 'purchase_price', 'purchased_at'
+    ).order_by('id')
+
+
+def holdings_version():
+    """
+    持仓版本，由数据库得出，不依赖进程内的信号，其他进程（管理后台、脚本）修改持仓后同样会变化
+    QuerySet.update() 不会更新 updated_at，修改持仓需要逐条 save()
+    :return: 形如 "<记录数>-<最大 id>-<最近修改时间>" 的字符串
+    """
+    result = Holding.objects.aggregate(count=Count('id'), last_id=Max('id'), updated=Max('updated_at'))
+    updated = result['updated'].timestamp() if result['updated'] else 0
+    return f"{result['count']}-{result['last_id'] or 0}-{updated}"
+
+
+def get_valuation(today=None):
+    """
+    获取全部持仓的最新估值，持仓和行情都未变化时直接返回缓存结果
+    :return: monitor.valuation.Valuation
+    """
+    global _positions, _valuation, _holdings_version
+    from .valuation import Positions  # 延迟导入 numpy
+
+    today = today or date.today()
+    state = get_market_state()
+    generation = state.generation if state is not None else None
+    with phase('holdings_version'):
+        version = holdings_version()
+    with _lock:
+        if version != _holdings_version or _positions is None:
+            _holdings_version = version
+            with phase('holdings'):
+                _positions = Positions(load_holdings())
+            _valuation = None
+        valuation = _valuation
+        if valuation is not None and valuation.generation == generation and valuation.today == today:
+            count('valuation_hit')
+            return valuation
+        with phase('valuation'):
+            _valuation = _positions.value(state, today)
+        return _valuation
+
+
+@receiver(snapshot_ingested)
+def revalue_on_ingest(sender, **kwargs):
+    """已经加载过持仓的进程在新快照入库后立即重新估值"""
+    if _positions is not None:
+        get_valuation()
@@ -0,0 +1,182 @@
+"""
+按请求的分阶段耗时统计
+
+视图和数据处理代码中用 phase() / count() 记录各阶段耗时和计数（读取文件数、解析行数、字节数等），
+ProfilingMiddleware 把结果写入 Server-Timing 响应头，慢请求保存在进程内的环形队列中，
+可通过管理员接口查看，并可按比例抽样记录 cProfile。
+
+未开启 MONITOR_PROFILING 时中间件不会被加载，phase() 只做一次 ContextVar 查询并返回空操作对象。
+"""
+import contextvars
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+_current = contextvars.ContextVar('monitor_request_profile', default=None)
+_profiler_lock = threading.Lock()
+
+# 最近的慢请求（每个进程独立）
+slow_requests = deque(maxlen=settings.MONITOR_SLOW_REQUEST_LOG_SIZE)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.phases = {}            # 阶段 -> [总耗时, 次数]
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_phase(self, name, seconds):
+        # IO 池中的并发读取会同时写入
+        with self._lock:
+            entry = self.phases.get(name)
+            if entry is None:
+                self.phases[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ('profile', 'name', 'started')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add_phase(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def phase(name):
+    """
+    记录一个阶段的耗时，用法：with phase('json_decode'): ...
+    当前请求未开启统计时返回空操作对象
+    """
+    profile = _current.get()
+    if profile is None:
+        return NULL_PHASE
+    return _Phase(profile, name)
+
+
+def count(name, value=1):
+    """累加当前请求的计数"""
+    profile = _current.get()
+    if profile is not None:
+        profile.count(name, value)
+
+
+def server_timing(profile, total):
+    """生成 Server-Timing 响应头"""
+    metrics = [f'total;dur={total * 1000:.2f}']
+    for name, (seconds, calls) in profile.phases.items():
+        metrics.append(f'{name};dur={seconds * 1000:.2f};desc="{calls}x"')
+    for name, value in profile.counters.items():
+        metrics.append(f'{name};desc="{value}"')
+    return ', '.join(metrics)
+
+
+def profile_text(profiler, limit=30):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    开启 MONITOR_PROFILING 后为每个请求统计分阶段耗时
+    - 所有响应带 Server-Timing 头
+    - 超过 MONITOR_SLOW_REQUEST_THRESHOLD 秒的请求记录到 slow_requests
+    - 按 MONITOR_CPROFILE_SAMPLE_RATE 的比例抽样记录 cProfile（同一时间只有一个请求被采样）
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.MONITOR_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(state[1])
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(state[1])
+        return self.finish(request, response, state)
+
+    def start(self):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profiler = None
+        rate = settings.MONITOR_CPROFILE_SAMPLE_RATE
+        if rate and random.random() < rate and _profiler_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profile, token, profiler, time.perf_counter()
+
+    def finish(self, request, response, state):
+        profile, _, profiler, started = state
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+        total = time.perf_counter() - started
+        response['Server-Timing'] = server_timing(profile, total)
+
+        if total >= settings.MONITOR_SLOW_REQUEST_THRESHOLD or profiler is not None:
+            slow_requests.append({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'duration_ms': round(total * 1000, 2),
+                'recorded_at': datetime.now().isoformat(timespec='seconds'),
+                'phases': {
+                    name: {'duration_ms': round(seconds * 1000, 2), 'calls': calls}
+                    for name, (seconds, calls) in profile.phases.items()
+                },
+                'counters': dict(profile.counters),
+                'profile': profile_text(profiler) if profiler is not None else None,
+            })
+        return response
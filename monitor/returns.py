@@ -0,0 +1,445 @@
+"""
+价格矩阵、类型指数与收益率相关性
+
+全部快照的 BUFF 价格物化成一个矩阵（饰品 × 时间点，float32，缺失为 NaN）。
+新快照只追加列并计算新时间点的指数；已有文件被修改、删除或补入更早的时间点时，从受影响的
+最早时间点起截断后重新追加（例如爬虫仍在增量写入的最新文件只会重算最后一列）。
+
+存储分两部分：MARKET_MATRIX_PATH 是 JSON 清单（饰品、类型、时间点、来源签名和数据文件名），
+价格按时间点为行存放在同目录的 .npy 数据文件中，行数和饰品数都预留了余量。
+- Web worker 以 mmap_mode='r' 映射数据文件，只有用到的页（相关性只用最后 window 行）会读入内存
+- 追加的时间点直接写入数据文件的空余行；截断重算或余量用完时才写一个新的数据文件
+- 清单最后原子替换，读者只使用清单中记录的行数和饰品数，看不到正在写入的行；
+  旧的数据文件保留一代，已映射它的进程不受影响
+
+指数（category 为空表示全市场）：
+- 等权：成分在相邻两个时间点都有价格时，单期收益率的算术平均
+- 市值加权：没有存世量数据，每个饰品按一件计，即成分在两个时间点的价格之和的比值
+两者都从 MARKET_INDEX_BASE 起按期链式计算。
+
+相关性和贝塔只取矩阵最后 window 期的对数收益率，一次向量化计算得到所有饰品的结果。
+
+依赖 numpy，只在指数接口和入库后的物化中延迟导入。
+"""
+import bisect
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .ingest import snapshot_datetime
+from .locks import file_lock
+from .models import MarketIndex
+from .snapshots import list_snapshot_files, parse_snapshot_filename, read_snapshot
+
+logger = logging.getLogger(__name__)
+
+MARKET = ''
+COLUMN_CHUNK = 256
+
+
+def snapshot_sources(folder=None):
+    """
+    全部快照文件及其签名
+    :return: {文件名: [mtime_ns, size]}
+    """
+    folder = folder or settings.CS_DATA_DIR
+    sources = {}
+    for filename in list_snapshot_files(folder):
+        try:
+            stat = os.stat(os.path.join(folder, filename))
+        except FileNotFoundError:
+            continue
+        sources[filename] = [stat.st_mtime_ns, stat.st_size]
+    return sources
+
+
+def grow(needed):
+    """预留 1/4 的余量，追加时按几何级数扩容"""
+    return needed + needed // 4 + 16
+
+
+class PriceMatrix:
+    """
+    prices[饰品, 时间点]；饰品的类型取其最近一次出现的快照文件
+    数据按时间点为行存放在 data 中（可能是只读的内存映射），prices 是其中有效部分的转置视图，不复制
+    """
+
+    def __init__(self, items=(), category_codes=(), categories=(), timestamps=(), data=None, sources=None,
+                 data_file=None):
+        self.items = list(items)
+        self.category_codes = np.asarray(category_codes, dtype=np.int32)
+        self.categories = list(categories)
+        self.timestamps = list(timestamps)
+        self.data = data if data is not None else np.full((grow(0), grow(0)), np.nan, dtype=np.float32)
+        self.sources = sources or {}
+        self.data_file = data_file
+        self.positions = {item: i for i, item in enumerate(self.items)}
+
+    @property
+    def prices(self):
+        return self.data[:len(self.timestamps), :len(self.items)].T
+
+    @classmethod
+    def load(cls, path, writable=False):
+        """
+        :param writable: 导入进程以读写方式映射数据文件，之后的时间点直接写入空余行
+        """
+        with open(path, encoding='utf-8') as f:
+            meta = json.load(f)
+        data = np.load(os.path.join(os.path.dirname(path), meta['data']),
+                       mmap_mode='r+' if writable else 'r', allow_pickle=False)
+        if data.ndim != 2 or data.shape[0] < len(meta['timestamps']) or data.shape[1] < len(meta['items']):
+            raise ValueError(f'价格矩阵数据文件 {meta["data"]} 与清单不一致')
+        return cls(meta['items'], meta['category_codes'], meta['categories'], meta['timestamps'],
+                   data, meta['sources'], meta['data'])
+
+    def save(self, path):
+        """
+        数据有改动且不能原地写入时先写新的数据文件，再原子替换清单
+        """
+        directory = os.path.dirname(path)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if self.data_file is None:
+            previous = manifest_data_file(path)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{stem}.', suffix='.npy')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, self.data)
+            self.data_file = f'{stem}.{time.time_ns()}.npy'
+            os.replace(tmp_path, os.path.join(directory, self.data_file))
+            self.data = np.load(os.path.join(directory, self.data_file), mmap_mode='r+', allow_pickle=False)
+        else:
+            previous = None
+            self.data.flush()
+
+        meta = json.dumps({
+            'data': self.data_file,
+            'items': self.items,
+            'category_codes': self.category_codes.tolist(),
+            'categories': self.categories,
+            'timestamps': self.timestamps,
+            'sources': self.sources,
+        }, ensure_ascii=False)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{stem}.', suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(meta)
+        os.replace(tmp_path, path)
+
+        if previous is not None:
+            # 只保留当前和上一代数据文件：刚读到旧清单的进程仍能打开上一代
+            for name in os.listdir(directory):
+                if (name.startswith(f'{stem}.') and name.endswith('.npy')
+                        and name not in (self.data_file, previous)):
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:  # Windows 上仍被映射的文件不能删除，下次再清理
+                        pass
+
+    def reserve(self, timestamps, items):
+        """
+        保证 data 能容纳 timestamps 行、items 列，不够时复制到更大的数组，之后需要写新的数据文件
+        """
+        capacity = self.data.shape
+        if timestamps <= capacity[0] and items <= capacity[1]:
+            return
+        data = np.full((max(capacity[0], grow(timestamps)), max(capacity[1], grow(items))), np.nan, dtype=np.float32)
+        visible = len(self.timestamps)
+        data[:visible, :capacity[1]] = self.data[:visible]
+        self.data = data
+        self.data_file = None
+
+    def append(self, filenames, folder=None):
+        """
+        追加新快照，同一时间点的文件合并为一列，同一时间点 qaq 的记录优先
+        调用方保证新文件的时间戳都晚于已有的最后一列（必要时先 truncate）
+        """
+        columns = {}
+        latest_category = {}
+        codes = {category: code for code, category in enumerate(self.categories)}
+        ordered = sorted(filenames, key=lambda name: (parse_snapshot_filename(name)['timestamp'],
+                                                      parse_snapshot_filename(name)['source'] == 'qaq'))
+        for filename in ordered:
+            meta = parse_snapshot_filename(filename)
+            try:
+                records = read_snapshot(filename, folder)
+            except (OSError, ValueError) as e:
+                # 爬虫写到一半的文件：签名已记入 sources，写完后签名变化会从该时间点起重算
+                logger.warning('跳过无法解析的快照 %s：%s', filename, e)
+                continue
+            if meta['item_type'] not in codes:
+                codes[meta['item_type']] = len(self.categories)
+                self.categories.append(meta['item_type'])
+            code = codes[meta['item_type']]
+            column = columns.setdefault(meta['timestamp'], {})
+            for record in records:
+                column[record['item']] = record['buff_price']
+                latest_category[record['item']] = code
+        if not columns:
+            return
+
+        category_codes = self.category_codes.tolist()
+        for item, code in latest_category.items():
+            position = self.positions.get(item)
+            if position is None:
+                self.positions[item] = len(self.items)
+                self.items.append(item)
+                category_codes.append(code)
+            else:
+                category_codes[position] = code
+        self.category_codes = np.asarray(category_codes, dtype=np.int32)
+
+        start = len(self.timestamps)
+        self.reserve(start + len(columns), len(self.items))
+        for offset, timestamp in enumerate(sorted(columns)):
+            column = columns[timestamp]
+            positions = np.fromiter((self.positions[item] for item in column), dtype=np.int64, count=len(column))
+            # 空余行可能残留中断的导入写入的数据，先整行清空
+            row = self.data[start + offset]
+            row[:] = np.nan
+            row[positions] = np.fromiter(column.values(), dtype=np.float32, count=len(column))
+            self.timestamps.append(timestamp)
+
+    def truncate(self, timestamp):
+        """去掉 timestamp 及之后的列，饰品行保留"""
+        keep = bisect.bisect_left(self.timestamps, timestamp)
+        if keep < len(self.timestamps):
+            # 已发布的行可能正被其他进程映射，不能原地改写，保留的部分复制出来另写数据文件
+            data = np.full(self.data.shape, np.nan, dtype=np.float32)
+            data[:keep] = self.data[:keep]
+            self.data = data
+            self.data_file = None
+        self.timestamps = self.timestamps[:keep]
+
+    def index_names(self):
+        """全市场在最前，其余按类型编码排列"""
+        return [MARKET, *self.categories]
+
+
+def period_sums(prev, cur):
+    """
+    相邻两期都有正价格的成分：上期价格、本期价格、单期收益率（缺失处为 0）及有效掩码
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        valid = (prev > 0) & (cur > 0)
+        p0 = np.where(valid, prev, 0.0)
+        p1 = np.where(valid, cur, 0.0)
+        ret = np.where(valid, cur / np.where(valid, prev, 1.0) - 1.0, 0.0)
+    return p0, p1, ret, valid
+
+
+def index_points(matrix, start, levels):
+    """
+    计算 start 列起的各期指数
+    :param levels: {指数名称: (市值加权, 等权)}，即 start 前一期的指数值；没有的指数从基点开始
+    :return: MarketIndex 列表（未保存）
+    """
+    base = float(settings.MARKET_INDEX_BASE)
+    names = matrix.index_names()
+    # 成分矩阵：第 0 列为全市场，其余按类型编码
+    membership = np.zeros((len(matrix.items), len(names)), dtype=np.float64)
+    membership[:, 0] = 1.0
+    if len(matrix.items):
+        membership[np.arange(len(matrix.items)), matrix.category_codes + 1] = 1.0
+
+    points = []
+    levels = dict(levels)
+    for chunk_start in range(start, len(matrix.timestamps), COLUMN_CHUNK):
+        chunk_end = min(chunk_start + COLUMN_CHUNK, len(matrix.timestamps))
+        cur = matrix.prices[:, chunk_start:chunk_end].astype(np.float64)
+        if chunk_start > 0:
+            prev = matrix.prices[:, chunk_start - 1:chunk_end - 1].astype(np.float64)
+        else:
+            prev = np.concatenate([np.full((len(matrix.items), 1), np.nan), cur[:, :-1]], axis=1)
+        p0, p1, ret, valid = period_sums(prev, cur)
+        # 每个指数每期的价格之和、收益率之和和成分数：一次矩阵乘法按分组求和
+        s0 = membership.T @ p0
+        s1 = membership.T @ p1
+        sr = membership.T @ ret
+        pairs = membership.T @ valid.astype(np.float64)
+        present = membership.T @ (cur > 0).astype(np.float64)
+
+        for offset in range(chunk_end - chunk_start):
+            timestamp = snapshot_datetime(matrix.timestamps[chunk_start + offset])
+            for g, name in enumerate(names):
+                if not present[g, offset]:
+                    continue
+                previous = levels.get(name)
+                if previous is None or not pairs[g, offset]:
+                    # 新出现的指数从基点开始，没有可比成分的一期沿用上期
+                    value_weighted, equal_weighted = previous or (base, base)
+                else:
+                    value_weighted = previous[0] * s1[g, offset] / s0[g, offset]
+                    equal_weighted = previous[1] * (1.0 + sr[g, offset] / pairs[g, offset])
+                levels[name] = (value_weighted, equal_weighted)
+                points.append(MarketIndex(
+                    category=name,
+                    timestamp=timestamp,
+                    value_weighted=value_weighted,
+                    equal_weighted=equal_weighted,
+                    constituents=int(present[g, offset]),
+                ))
+    return points
+
+
+def write_indices(matrix, start, since=None):
+    """
+    把 start 列起的指数写入数据库
+    :param since: 先删除该时间点及之后的旧指数；None 表示整体重建，清空全部旧数据
+    """
+    with transaction.atomic():
+        levels = {}
+        if since is None:
+            MarketIndex.objects.all().delete()
+        else:
+            since = snapshot_datetime(since)
+            MarketIndex.objects.filter(timestamp__gte=since).delete()
+            # 各指数在截断点之前的最后一期
+            for category, value_weighted, equal_weighted in MarketIndex.objects.order_by(
+                'category', 'timestamp'
+            ).values_list('category', 'value_weighted', 'equal_weighted'):
+                levels[category] = (value_weighted, equal_weighted)
+        points = index_points(matrix, start, levels)
+        MarketIndex.objects.bulk_create(
+            points, batch_size=1000, update_conflicts=True,
+            unique_fields=['category', 'timestamp'],
+            update_fields=['value_weighted', 'equal_weighted', 'constituents'],
+        )
+    return len(points)
+
+
+def manifest_data_file(path):
+    """清单当前引用的数据文件名，没有清单时返回 None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)['data']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_matrix(path, writable=False):
+    try:
+        return PriceMatrix.load(path, writable)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def materialize(path=None, folder=None, force=False):
+    """
+    按快照目录更新价格矩阵和指数
+    多个进程同时调用时由文件锁保证只构建一次
+    :return: 最新的 PriceMatrix
+    """
+    path = str(path or settings.MARKET_MATRIX_PATH)
+    folder = folder or settings.CS_DATA_DIR
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sources = snapshot_sources(folder)
+
+    with file_lock(path):
+        matrix = None if force else load_matrix(path, writable=True)
+        if matrix is not None and matrix.sources == sources:
+            return matrix
+
+        since = None
+        if matrix is None:
+            matrix = PriceMatrix()
+            files = list(sources)
+        else:
+            # 修改、删除和新增的文件中最早的时间点，之后的列全部重算
+            affected = [name for name, signature in matrix.sources.items() if sources.get(name) != signature]
+            affected += [name for name in sources if name not in matrix.sources]
+            since = min(parse_snapshot_filename(name)['timestamp'] for name in affected)
+            matrix.truncate(since)
+            files = [name for name in sources if parse_snapshot_filename(name)['timestamp'] >= since]
+
+        start = len(matrix.timestamps)
+        matrix.append(files, folder)
+        matrix.sources = sources
+        write_indices(matrix, start, since)
+        matrix.save(path)
+    return matrix
+
+
+class ReturnsWindow:
+    """矩阵最后 window 期的对数收益率，以及各指数同期的对数收益率"""
+
+    def __init__(self, matrix, window):
+        self.matrix = matrix
+        prices = matrix.prices[:, -(window + 1):].astype(np.float64)
+        self.timestamps = matrix.timestamps[-(window + 1):][1:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            valid = (prices[:, :-1] > 0) & (prices[:, 1:] > 0)
+            self.returns = np.where(valid, np.log(prices[:, 1:] / np.where(valid, prices[:, :-1], 1.0)), np.nan)
+        self._prices = prices
+        self._index_returns = {}
+
+    def index_returns(self, category=MARKET):
+        """指数的对数收益率（市值加权），与 index_points 的口径一致"""
+        if category not in self._index_returns:
+            mask = None if category == MARKET else self.matrix.category_codes == self.matrix.categories.index(category)
+            prices = self._prices if mask is None else self._prices[mask]
+            p0, p1, _, valid = period_sums(prices[:, :-1], prices[:, 1:])
+            s0, s1 = p0.sum(axis=0), p1.sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self._index_returns[category] = np.where(valid.any(axis=0), np.log(s1 / s0), np.nan)
+        return self._index_returns[category]
+
+    def item_returns(self, item):
+        return self.returns[self.matrix.positions[item]]
+
+
+def correlate(returns, target, min_periods):
+    """
+    每一行与目标序列的相关系数和贝塔，只使用两者都有数据的期
+    :param returns: 饰品 × 期 的收益率矩阵
+    :param target: 长度为期数的收益率序列
+    :return: (相关系数, 贝塔, 有效期数)，有效期数不足或方差为 0 时为 NaN
+    """
+    mask = ~np.isnan(returns) & ~np.isnan(target)[None, :]
+    n = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = np.where(mask, returns, 0.0)
+        y = np.where(mask, target[None, :], 0.0)
+        dx = np.where(mask, x - (x.sum(axis=1) / n)[:, None], 0.0)
+        dy = np.where(mask, y - (y.sum(axis=1) / n)[:, None], 0.0)
+        cov = (dx * dy).sum(axis=1)
+        var_x = (dx * dx).sum(axis=1)
+        var_y = (dy * dy).sum(axis=1)
+        corr = cov / np.sqrt(var_x * var_y)
+        beta = cov / var_y
+    invalid = (n < max(min_periods, 2)) | (var_x == 0) | (var_y == 0)
+    corr[invalid] = np.nan
+    beta[invalid] = np.nan
+    return corr, beta, n
+
+
+def rank_correlations(window, target, min_periods, category=None, exclude=None, limit=50, order='correlation'):
+    """
+    按相关系数（或贝塔）从高到低排列的饰品
+    :param category: 只返回该类型的饰品
+    :param exclude: 不返回的饰品（例如以饰品为目标时的饰品本身）
+    """
+    matrix = window.matrix
+    corr, beta, n = correlate(window.returns, target, min_periods)
+    key = beta if order == 'beta' else corr
+    candidates = ~np.isnan(key)
+    if category is not None:
+        candidates &= matrix.category_codes == matrix.categories.index(category)
+    if exclude is not None and exclude in matrix.positions:
+        candidates[matrix.positions[exclude]] = False
+    rows = np.flatnonzero(candidates)
+    rows = rows[np.argsort(-key[rows], kind='stable')][:limit]
+    return [
+        {
+            'item': matrix.items[row],
+            'category': matrix.categories[matrix.category_codes[row]],
+            'correlation': round(float(corr[row]), 4),
+            'beta': round(float(beta[row]), 4),
+            'observations': int(n[row]),
+        }
+        for row in rows.tolist()
+    ]
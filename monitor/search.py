@@ -0,0 +1,243 @@
+"""
+饰品名称搜索索引
+
+名称格式为 "名称（★） | 皮肤 (磨损)"，例如 "蝴蝶刀（★） | 蓝钢 (战痕累累)"。
+索引包含：
+- 按规范化名称排序的列表，用于前缀补全（二分查找）
+- 单字和双字 n-gram 倒排表，适合没有分词的中文名称做子串搜索
+- 从名称中解析出的武器 / 皮肤 / 磨损分面
+
+新快照入库时只把新出现的名称增量加入索引。
+"""
+import bisect
+import heapq
+import json
+import os
+import re
+import threading
+import unicodedata
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .signals import snapshot_ingested
+
+NAME_PATTERN = re.compile(r'^(?P<weapon>[^|]+?)\s*(?:\|\s*(?P<skin>.+?)\s*(?:\((?P<wear>[^()]+)\))?)?$')
+STAR_PATTERN = re.compile(r'\(★\)|★')
+
+
+def normalize(text):
+    """全角转半角、转小写并去掉空白"""
+    return ''.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def parse_item_name(name):
+    """
+    解析饰品名称中的分面
+    :return: {'weapon': 武器, 'skin': 皮肤, 'wear': 磨损, 'star': 是否为★饰品}
+    """
+    text = unicodedata.normalize('NFKC', name).strip()
+    match = NAME_PATTERN.match(text)
+    weapon = match.group('weapon') if match else text
+    return {
+        'weapon': STAR_PATTERN.sub('', weapon).strip(),
+        'skin': (match.group('skin') or '') if match else '',
+        'wear': (match.group('wear') or '') if match else '',
+        'star': '★' in weapon,
+    }
+
+
+def ngrams(text):
+    """单字和相邻双字"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class ItemSearchIndex:
+    def __init__(self):
+        self.names = []
+        self.facets = []
+        self._ids = {}
+        self._normalized = []
+        self._sorted = []           # [(规范化名称, id)]，用于前缀查找
+        self._postings = {}         # n-gram -> [id]
+        self._facet_values = {'weapon': {}, 'skin': {}, 'wear': {}}
+        self._indexed_files = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def add_names(self, names):
+        """
+        增量加入新的饰品名称，已存在的名称会被忽略
+        :return: 新加入的名称数量
+        """
+        with self._lock:
+            added = []
+            for name in names:
+                if name in self._ids:
+                    continue
+                item_id = len(self.names)
+                key = normalize(name)
+                facets = parse_item_name(name)
+                self._ids[name] = item_id
+                self.names.append(name)
+                self.facets.append(facets)
+                self._normalized.append(key)
+                for gram in ngrams(key):
+                    self._postings.setdefault(gram, []).append(item_id)
+                for facet, values in self._facet_values.items():
+                    if facets[facet]:
+                        values.setdefault(facets[facet], []).append(item_id)
+                added.append((key, item_id))
+            if added:
+                # 新名称排序后与原列表合并，替换引用，读操作无需加锁
+                self._sorted = sorted(self._sorted + added)
+            return len(added)
+
+    def add_files(self, filenames, folder=None):
+        """从快照文件中读取名称加入索引，已索引且未修改的文件会被跳过"""
+        folder = folder or settings.CS_DATA_DIR
+        added = 0
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            try:
+                stat = os.stat(path)
+                signature = (filename, stat.st_mtime_ns, stat.st_size)
+                if signature in self._indexed_files:
+                    continue
+                with open(path, 'rb') as f:
+                    raw_data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            added += self.add_names(raw_data.keys())
+            self._indexed_files.add(signature)
+        return added
+
+    def _prefix_ids(self, key):
+        entries = self._sorted
+        start = bisect.bisect_left(entries, (key,))
+        for i in range(start, len(entries)):
+            if not entries[i][0].startswith(key):
+                break
+            yield entries[i][1]
+
+    def _substring_ids(self, term):
+        """用 n-gram 倒排表求候选集，再校验子串"""
+        grams = [term[i:i + 2] for i in range(len(term) - 1)] or [term]
+        postings = []
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if not ids:
+                return set()
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return candidates
+        if len(grams) > 1:
+            normalized = self._normalized
+            candidates = {i for i in candidates if term in normalized[i]}
+        return candidates
+
+    def search(self, query, limit=10, **facets):
+        """
+        搜索饰品名称
+        :param query: 查询字符串，空白分隔的多个词需同时匹配
+        :param limit: 最多返回的结果数量
+        :param facets: 分面过滤，如 weapon='蝴蝶刀', wear='崭新出厂'
+        :return: 按 完全匹配 > 前缀匹配 > 子串匹配、名称长度 排序的 id 列表
+        """
+        terms = [normalize(term) for term in query.split()]
+        terms = [term for term in terms if term]
+        key = normalize(query)
+
+        candidates = None
+        for facet, value in facets.items():
+            if value:
+                ids = set(self._facet_values.get(facet, {}).get(unicodedata.normalize('NFKC', value), ()))
+                candidates = ids if candidates is None else candidates & ids
+        for term in terms:
+            ids = self._substring_ids(term)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        if candidates is None:
+            # 没有任何条件时按名称顺序返回
+            return [item_id for _, item_id in self._sorted[:limit]]
+
+        normalized = self._normalized
+        prefix = set(self._prefix_ids(key)) if key else set()
+
+        def rank(item_id):
+            name = normalized[item_id]
+            return (name != key, item_id not in prefix, len(name), name)
+
+        if len(candidates) > limit:
+            return heapq.nsmallest(limit, candidates, key=rank)
+        return sorted(candidates, key=rank)
+
+    def autocomplete(self, prefix, limit=10):
+        """前缀补全，只走有序列表的二分查找"""
+        key = normalize(prefix)
+        result = []
+        for item_id in self._prefix_ids(key):
+            result.append(item_id)
+            if len(result) >= limit:
+                break
+        return result
+
+    def resolve(self, query):
+        """
+        把用户输入解析为已知的饰品名称
+        :return: 完全匹配的名称，否则取最佳搜索结果；都没有时原样返回
+        """
+        if query in self._ids:
+            return query
+        ids = self.search(query, limit=1)
+        return self.names[ids[0]] if ids else query
+
+    def describe(self, item_id):
+        return {'name': self.names[item_id], **self.facets[item_id]}
+
+
+_index = ItemSearchIndex()
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+
+def get_search_index():
+    """获取进程内的搜索索引，首次调用时索引快照目录中的全部文件"""
+    global _bootstrapped
+    if not _bootstrapped:
+        with _bootstrap_lock:
+            if not _bootstrapped:
+                try:
+                    filenames = sorted(name for name in os.listdir(settings.CS_DATA_DIR) if name.endswith('.json'))
+                except FileNotFoundError:
+                    filenames = []
+                _index.add_files(filenames)
+                # 全部文件索引完成后才对其他线程可见，避免返回只建了一半的索引
+                _bootstrapped = True
+    return _index
+
+
+@receiver(snapshot_ingested)
+def index_new_items(sender, files=(), **kwargs):
+    """
+    新快照入库时把新出现的饰品名称加入索引
+    索引尚未建立时跳过（包括进程启动时的首次扫描），第一次搜索时再完整建立
+    """
+    if not _bootstrapped:
+        # 首次索引正在进行时等它完成，再补上它可能漏掉的新文件
+        with _bootstrap_lock:
+            if not _bootstrapped:
+                return
+    _index.add_files(files)
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# 新的快照数据落地时发送
+# files: 新增或修改的快照文件名列表（按文件名排序）
+# removed: 被删除的快照文件名列表
+# initial: 是否为进程启动后的首次扫描（此时 files 为目录中已有的全部文件）
+snapshot_ingested = Signal()
@@ -0,0 +1,101 @@
+"""
+快照文件的纯 Python 解析
+
+不依赖 pandas，供搜索、套利等轻量模块在入库时使用。支持两种爬虫的输出：
+- scraper/qaq.py：qaq_<类型>_<日期>_<时间>.json，值为包含 BUFF / 悠悠价格和涨跌的字典
+- scraper/buff_sleep.py：cs_<分类>_<日期>_<时间>.json，值为 BUFF 价格字符串，分类中可能带下划线
+"""
+import json
+import os
+import re
+
+from django.conf import settings
+
+CHANGE_PATTERN = re.compile(r'￥?\s*(-?[\d.]+)\s*[（(]\s*(-?[\d.]+)%')
+FILENAME_PATTERN = re.compile(r'^(?P<source>qaq|cs)_(?P<item_type>.+)_(?P<date>\d{8})_(?P<time>\d{6})\.json$')
+SOURCES = {'qaq': 'qaq', 'cs': 'buff'}
+
+
+def parse_price(text):
+    """
+    解析价格字符串，例如 "18959￥"、"￥ 18959"
+    :return: float，无法解析时返回 None
+    """
+    if text is None:
+        return None
+    try:
+        return float(str(text).replace('￥', '').replace('¥', '').replace(',', '').strip())
+    except ValueError:
+        return None
+
+
+def parse_change(text):
+    """
+    解析涨跌字符串，例如 "￥-731（-3.71%）￥-731（-3.71%）"（页面上的文本会重复一次）
+    :return: (涨跌金额, 涨跌百分比)，无法解析时返回 (None, None)
+    """
+    match = CHANGE_PATTERN.search(text or '')
+    if not match:
+        return None, None
+    return float(match.group(1)), float(match.group(2))
+
+
+def parse_snapshot_filename(filename):
+    """
+    解析快照文件名
+    :return: {'source': 'qaq' 或 'buff', 'item_type': 类型, 'timestamp': '<日期>_<时间>'}，不是快照文件时返回 None
+    """
+    match = FILENAME_PATTERN.match(filename)
+    if not match:
+        return None
+    return {
+        'source': SOURCES[match.group('source')],
+        'item_type': match.group('item_type'),
+        'timestamp': match.group('date') + '_' + match.group('time'),
+    }
+
+
+def snapshot_timestamp(filename):
+    """从文件名末尾的 <日期>_<时间>.json 提取时间戳"""
+    parts = filename[:-len('.json')].split('_')
+    return parts[-2] + '_' + parts[-1]
+
+
+def list_snapshot_files(folder=None):
+    """目录中所有快照文件，按时间戳排序"""
+    folder = folder or settings.CS_DATA_DIR
+    try:
+        names = [name for name in os.listdir(folder) if parse_snapshot_filename(name)]
+    except FileNotFoundError:
+        return []
+    return sorted(names, key=lambda name: (snapshot_timestamp(name), name))
+
+
+def parse_snapshot(content):
+    """
+    解析快照文件内容
+    :param content: 文件的 bytes 或 str
+    :return: [{'item', 'buff_price', 'uu_price', 'today_change', 'week_change'}]
+             BUFF 价格缺失的条目会被跳过；buff_sleep 的快照没有悠悠价格和涨跌，对应字段为 None
+    """
+    records = []
+    for name, data in json.loads(content).items():
+        if not isinstance(data, dict):
+            data = {'buff_price': data}
+        buff_price = parse_price(data.get('buff_price'))
+        if buff_price is None:
+            continue
+        records.append({
+            'item': name,
+            'buff_price': buff_price,
+            'uu_price': parse_price(data.get('uu_price')),
+            'today_change': data.get('today_change'),
+            'week_change': data.get('week_change'),
+        })
+    return records
+
+
+def read_snapshot(filename, folder=None):
+    folder = folder or settings.CS_DATA_DIR
+    with open(os.path.join(folder, filename), 'rb') as f:
+        return parse_snapshot(f.read())
@@ -0,0 +1,104 @@
+"""
+启动耗时基准
+
+在全新的解释器中测量 Django 启动、URL 配置导入和首个请求的耗时，
+并记录过程中加载了哪些重量级依赖。测试和 startup_benchmark 命令共用。
+
+测量在临时目录中进行：生成一批合成快照，建好临时数据库并导入，快照目录、数据库和
+共享文件都指向临时位置，不读取也不改写正式数据。
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+
+from .synthetic import generate_market
+
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib')
+
+DEFAULT_PATHS = ('/', '/api/items/search/?q=蝴蝶', '/api/arbitrage/')
+
+SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+import cs2monitor.urls
+urls_done = time.perf_counter()
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+client = Client()
+requests = {}
+for path in sys.argv[1:]:
+    begin = time.perf_counter()
+    status = client.get(path).status_code
+    requests[path] = {"status": status, "seconds": time.perf_counter() - begin}
+print(json.dumps({
+    "setup": setup_done - start,
+    "urls": urls_done - setup_done,
+    "import": urls_done - start,
+    "requests": requests,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+''' % (HEAVY_MODULES,)
+
+
+SETTINGS_TEMPLATE = '''from {base} import *
+
+CS_DATA_DIR = {data!r}
+DATABASES = {{"default": {{"ENGINE": "django.db.backends.sqlite3", "NAME": {database!r}}}}}
+MONITOR_STATE_PATH = {state!r}
+MARKET_MATRIX_PATH = {matrix!r}
+ALERT_STATE_PATH = {alerts!r}
+'''
+
+
+def prepare_environment(folder, items, timestamps):
+    """
+    在临时目录中生成快照积压、建库并导入
+    :return: 子进程使用的环境变量
+    """
+    data = os.path.join(folder, 'cs_data')
+    var = os.path.join(folder, 'var')
+    os.makedirs(data)
+    generate_market(data, items=items, timestamps=timestamps)
+    with open(os.path.join(folder, 'startup_settings.py'), 'w', encoding='utf-8') as f:
+        f.write(SETTINGS_TEMPLATE.format(
+            base=settings.SETTINGS_MODULE,
+            data=data,
+            database=os.path.join(folder, 'db.sqlite3'),
+            state=os.path.join(var, 'market_state.bin'),
+            matrix=os.path.join(var, 'price_matrix.json'),
+            alerts=os.path.join(var, 'alert_state.json'),
+        ))
+    python_path = [folder, str(settings.BASE_DIR)]
+    if os.environ.get('PYTHONPATH'):
+        python_path.append(os.environ['PYTHONPATH'])
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='startup_settings', PYTHONPATH=os.pathsep.join(python_path))
+    manage = os.path.join(settings.BASE_DIR, 'manage.py')
+    for command in (['migrate', '--verbosity', '0'], ['ingest_snapshots', '--workers', '1']):
+        subprocess.run([sys.executable, manage, *command], cwd=settings.BASE_DIR, env=env,
+                       capture_output=True, text=True, check=True)
+    return env
+
+
+def measure(paths=DEFAULT_PATHS, items=500, timestamps=48):
+    """
+    在子进程中测量启动耗时
+    :param paths: 依次请求的路径，每个路径只请求一次（即首次请求）
+    :param items: 快照积压中的饰品数量
+    :param timestamps: 快照积压中的时间点数量
+    :return: {'setup', 'urls', 'import', 'requests': {路径: {'status', 'seconds'}}, 'heavy_modules'}
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        env = prepare_environment(folder, items, timestamps)
+        output = subprocess.run(
+            [sys.executable, '-c', SCRIPT, *paths],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
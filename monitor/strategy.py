@@ -0,0 +1,166 @@
+"""
+量化交易策略：技术指标与交易信号
+
+依赖 pandas，只在策略视图中延迟导入。
+"""
+import pandas as pd
+
+from .analytics import build_price_history
+from .profiling import phase
+
+def calculate_technical_indicators(df, item_name):
+    """
+    计算技术指标
+    :param df: 包含价格数据的DataFrame
+    :param item_name: 饰品名称
+    :return: 包含所有指标的字典
+    """
+    # 确保数据按时间排序
+    df = df.sort_values('time')
+    
+    # 计算移动平均线
+    df['MA5'] = df['buff_price'].rolling(window=5).mean()
+    df['MA20'] = df['buff_price'].rolling(window=20).mean()
+    
+    # 计算价格波动率（7天标准差）
+    df['volatility'] = df['buff_price'].rolling(window=7).std()
+    
+    # 计算RSI
+    delta = df['buff_price'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    rs = gain / loss
+    df['RSI'] = 100 - (100 / (1 + rs))
+    
+    # 计算价格相对于7天均值的标准差
+    df['buff_price_mean'] = df['buff_price'].rolling(window=7).mean()
+    df['buff_price_std'] = df['buff_price'].rolling(window=7).std()
+    df['buff_price_zscore'] = (df['buff_price'] - df['buff_price_mean']) / df['buff_price_std']
+    
+    return df
+
+def generate_trading_signals(df):
+    """
+    生成交易信号
+    :param df: 包含技术指标的DataFrame
+    :return: 交易信号字典
+    """
+    signals = {
+        'buy_signals': [],
+        'sell_signals': [],
+        'current_status': 'hold'
+    }
+    
+    if len(df) < 20:  # 确保有足够的数据
+        return signals
+    
+    current = df.iloc[-1]
+    prev = df.iloc[-2]
+    
+    # 买入信号检查
+    buy_conditions = 0
+    
+    # 1. MA金叉
+    if prev['MA5'] <= prev['MA20'] and current['MA5'] > current['MA20']:
+        buy_conditions += 1
+        signals['buy_signals'].append('MA金叉')
+    
+    # 2. RSI < 40
+    if current['RSI'] < 40:
+        buy_conditions += 1
+        signals['buy_signals'].append('RSI超卖')
+    
+    # 3. 价格接近7天低点
+    if current['buff_price_zscore'] < -1:
+        buy_conditions += 1
+        signals['buy_signals'].append('价格接近低点')
+    
+    # 4. 检查市场库存变化（需要额外数据）
+    # 这里假设有库存数据，实际需要根据数据结构调整
+    if 'inventory_change' in df.columns and current['inventory_change'] < 0:
+        buy_conditions += 1
+        signals['buy_signals'].append('库存减少')
+    
+    # 卖出信号检查
+    sell_conditions = 0
+    
+    # 1. MA死叉
+    if prev['MA5'] >= prev['MA20'] and current['MA5'] < current['MA20']:
+        sell_conditions += 1
+        signals['sell_signals'].append('MA死叉')
+    
+    # 2. RSI > 60
+    if current['RSI'] > 60:
+        sell_conditions += 1
+        signals['sell_signals'].append('RSI超买')
+    
+    # 3. 价格接近7天高点
+    if current['buff_price_zscore'] > 1:
+        sell_conditions += 1
+        signals['sell_signals'].append('价格接近高点')
+    
+    # 4. 检查持有时间（需要额外数据）
+    if 'holding_days' in df.columns and current['holding_days'] >= 7:
+        sell_conditions += 1
+        signals['sell_signals'].append('持有时间达标')
+    
+    # 生成最终信号
+    if buy_conditions >= 3:
+        signals['current_status'] = 'buy'
+    elif sell_conditions >= 3:
+        signals['current_status'] = 'sell'
+    
+    return signals
+
+def current_holding_days(df):
+    if 'holding_days' not in df.columns or pd.isna(df['holding_days'].iloc[-1]):
+        return None
+    return int(df['holding_days'].iloc[-1])
+
+def build_strategy_data(all_data, item_name, purchased_at=None):
+    """
+    计算技术指标并生成交易信号
+    :param all_data: build_price_history() 的结果
+    :param item_name: 饰品名称
+    :param purchased_at: 该饰品最早一笔持仓的买入日期，没有持仓时为 None
+    :return: 策略展示数据
+    """
+    # 转换为DataFrame
+    df = pd.DataFrame(all_data)
+    df['time'] = pd.to_datetime(df['time'], format='%Y%m%d_%H%M%S')
+    df = df.sort_values('time')
+    
+    # 持有天数，买入之前的时间点为空
+    if purchased_at is not None:
+        holding_days = (df['time'] - pd.Timestamp(purchased_at)).dt.days
+        df['holding_days'] = holding_days.where(holding_days >= 0)
+    
+    # 计算技术指标
+    with phase('indicators'):
+        df = calculate_technical_indicators(df, item_name)
+    
+    # 生成交易信号
+    with phase('signals'):
+        signals = generate_trading_signals(df)
+    
+    # 准备展示数据
+    return {
+        "item": item_name,
+        "current_buff_price": df['buff_price'].iloc[-1],
+        "current_uu_price": df['uu_price'].iloc[-1],
+        "signals": signals,
+        "holding_days": current_holding_days(df),
+        "indicators": {
+            "MA5": df['MA5'].iloc[-1],
+            "MA20": df['MA20'].iloc[-1],
+            "RSI": df['RSI'].iloc[-1],
+            "volatility": df['volatility'].iloc[-1],
+            "buff_price_zscore": df['buff_price_zscore'].iloc[-1]
+        }
+    }
+
+def compute_strategy(files, item_name, purchased_at=None, folder=None, deadline=None):
+    all_data = build_price_history(files, item_name, folder, deadline)
+    if not all_data:
+        return None
+    return build_strategy_data(all_data, item_name, purchased_at)
@@ -0,0 +1,128 @@
+"""
+合成行情数据生成器
+
+按两种爬虫的真实格式生成快照文件，用于性能基准和测试：
+- qaq_<类型>_<日期>_<时间>.json：价格形如 "18959￥"，涨跌形如 "￥-731（-3.71%）￥-731（-3.71%）"（页面文本重复一次）
+- cs_<分类>_<日期>_<时间>.json：BUFF 价格字符串，形如 "¥ 18959"
+
+价格为对数随机游走，悠悠价格围绕 BUFF 价格小幅波动。逐个时间点流式写出，只保留计算周涨跌所需的历史。
+"""
+import json
+import math
+import os
+import random
+from collections import deque
+from datetime import datetime, timedelta
+
+# (类型, buff_sleep 分类, 是否为★饰品, 基础价格)
+WEAPONS = [
+    ('蝴蝶刀', 'weapon_knife_butterfly', True, 12000),
+    ('爪子刀', 'weapon_knife_karambit', True, 9000),
+    ('M9 刺刀', 'weapon_knife_m9_bayonet', True, 7000),
+    ('运动手套', 'weapon_sport_gloves', True, 8000),
+    ('专业手套', 'weapon_specialist_gloves', True, 5000),
+    ('AK-47', 'weapon_ak47', False, 300),
+    ('M4A1 消音型', 'weapon_m4a1_silencer', False, 250),
+    ('AWP', 'weapon_awp', False, 500),
+    ('沙漠之鹰', 'weapon_deagle', False, 80),
+    ('音乐盒', 'musickit', False, 30),
+]
+SKINS = [
+    '蓝钢', '多普勒', '渐变大理石', '深红之网', '屠夫', '虎牙', '伽玛多普勒', '传说', '火蛇', '二西莫夫',
+    '表面淬火', '森林 DDPAT', '夜色', '致命紫罗兰', '都市伪装', '狩猎网格', '自动化', '血腥运动', '潘多拉之盒',
+    '迈阿密风云', '双栖', '超导体', '翠绿之潮', '红木', '霓虹骑士', '皇后', '水栽竹', '野荷', '燃料喷射器', '血虎',
+]
+WEARS = ['崭新出厂', '略有磨损', '久经沙场', '破损不堪', '战痕累累']
+WEAR_DISCOUNT = [1.0, 0.8, 0.62, 0.5, 0.45]
+
+
+def make_items(count, rng):
+    """
+    生成饰品名称
+    :return: [(名称, 类型, buff_sleep 分类, 初始价格)]
+    """
+    items = []
+    variant = 0
+    while len(items) < count:
+        # 外层循环皮肤，使各类型的饰品数量大致均匀
+        for skin_index, skin in enumerate(SKINS):
+            for wear, discount in zip(WEARS, WEAR_DISCOUNT):
+                for weapon, category, star, base in WEAPONS:
+                    if len(items) >= count:
+                        return items
+                    suffix = f' {variant + 1}' if variant else ''
+                    head = f'{weapon}（★）' if star else weapon
+                    name = f'{head} | {skin}{suffix} ({wear})'
+                    price = base * discount * (1 + skin_index / len(SKINS)) * rng.lognormvariate(0, 0.3)
+                    items.append((name, weapon, category, round(price, 1)))
+        variant += 1
+    return items
+
+
+def format_price(value):
+    text = f'{value:.1f}'
+    return text[:-2] if text.endswith('.0') else text
+
+
+def format_change(amount, pct):
+    """与页面一致，文本重复一次"""
+    text = f'￥{format_price(amount)}（{pct:.2f}%）'
+    return text + text
+
+
+def generate_market(folder, items=1000, timestamps=100, formats=('qaq', 'buff'),
+                    interval_minutes=60, start=None, volatility=0.01, seed=0):
+    """
+    生成合成快照文件
+    :param folder: 输出目录
+    :param items: 饰品数量
+    :param timestamps: 时间点数量
+    :param formats: 输出格式，'qaq' 和 / 或 'buff'
+    :param interval_minutes: 相邻时间点的间隔（分钟）
+    :param volatility: 每个时间点对数价格的标准差
+    :return: 写出的文件名列表
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    catalog = make_items(items, rng)
+    prices = [price for _, _, _, price in catalog]
+    day_steps = max(1, 24 * 60 // interval_minutes)
+    week_steps = day_steps * 7
+    history = deque([list(prices)], maxlen=week_steps + 1)
+    moment = start or datetime(2025, 1, 1)
+    written = []
+
+    for _ in range(timestamps):
+        timestamp = moment.strftime('%Y%m%d_%H%M%S')
+        day_ago = history[-min(day_steps, len(history) - 1) - 1] if len(history) > 1 else prices
+        week_ago = history[0]
+        qaq_files, buff_files = {}, {}
+
+        for i, (name, weapon, category, _) in enumerate(catalog):
+            price = prices[i]
+            if 'qaq' in formats:
+                today = price - day_ago[i]
+                week = price - week_ago[i]
+                uu_price = round(price * rng.uniform(0.96, 1.02) * 2) / 2
+                qaq_files.setdefault(weapon, {})[name] = {
+                    'today_change': format_change(today, today / day_ago[i] * 100),
+                    'week_change': format_change(week, week / week_ago[i] * 100),
+                    'buff_price': f'{format_price(price)}￥',
+                    'uu_price': f'{format_price(uu_price)}￥',
+                }
+            if 'buff' in formats:
+                buff_files.setdefault(category, {})[name] = f'¥ {format_price(price)}'
+
+        for prefix, grouped in (('qaq', qaq_files), ('cs', buff_files)):
+            for group, data in grouped.items():
+                filename = f'{prefix}_{group}_{timestamp}.json'
+                with open(os.path.join(folder, filename), 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                written.append(filename)
+
+        # 对数随机游走，价格保留一位小数
+        prices = [max(0.1, round(price * math.exp(rng.gauss(0, volatility)), 1)) for price in prices]
+        history.append(prices)
+        moment += timedelta(minutes=interval_minutes)
+
+    return written
@@ -1,3 +1,953 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.dispatch import Signal
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import alerts, arbitrage, cache as snapshot_cache, search
+from .benchmarks import compare, run_benchmarks
+from .indices import get_price_matrix, query_correlations
+from .analytics import build_price_history
+from .cache import SnapshotWatcher, cache_per_snapshot
+from .executor import ComputeCancelled
+from .ingest import ingest_snapshots
+from .market_state import MarketState, get_market_state, publish_state
+from .models import AlertRule, Holding, MarketIndex, PriceRecord, Snapshot
+from .profiling import slow_requests
+from .portfolio import get_valuation, holdings_version
+from .returns import correlate, materialize
+from .signals import snapshot_ingested
+from .snapshots import parse_change, read_snapshot
+from .startup import measure
+from .synthetic import generate_market, make_items
+from .views import all_filenames, get_json_files
+
+
+class TempDataDirMixin:
+    """
+    每个测试使用独立的临时快照目录，行情表、价格矩阵和提醒状态都放在其中的 .state/ 下，不会写入 var/
+    子类通过 settings_overrides 追加其他设置
+    """
+
+    settings_overrides = {}
+
+    def setUp(self):
+        super().setUp()
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        state_dir = os.path.join(self.folder.name, '.state')
+        self.state_path = os.path.join(state_dir, 'market_state.bin')
+        self.matrix_path = os.path.join(state_dir, 'price_matrix.json')
+        settings_override = override_settings(
+            CS_DATA_DIR=self.folder.name,
+            MONITOR_STATE_PATH=self.state_path,
+            MARKET_MATRIX_PATH=self.matrix_path,
+            ALERT_STATE_PATH=os.path.join(state_dir, 'alert_state.json'),
+            **self.settings_overrides,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class StartupBudgetTests(SimpleTestCase):
+    """新启动的 worker 不加载 pandas 等重量级依赖，启动和首个请求耗时在预算内"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.result = measure()
+
+    def test_light_paths_do_not_import_heavy_modules(self):
+        self.assertEqual(self.result['heavy_modules'], [])
+
+    def test_import_time_within_budget(self):
+        self.assertLess(self.result['import'], settings.MONITOR_STARTUP_BUDGET['import'])
+
+    def test_first_request_within_budget(self):
+        for path, timing in self.result['requests'].items():
+            with self.subTest(path=path):
+                self.assertEqual(timing['status'], 200)
+                self.assertLess(timing['seconds'], settings.MONITOR_STARTUP_BUDGET['first_request'])
+
+
+class SyntheticMarketTests(SimpleTestCase):
+    """合成数据与两种爬虫的真实格式一致"""
+
+    def test_generates_both_scraper_formats(self):
+        with tempfile.TemporaryDirectory() as folder:
+            written = generate_market(folder, items=60, timestamps=3)
+            with override_settings(CS_DATA_DIR=folder):
+                files = get_json_files()
+            self.assertEqual(len(files), 3)
+            sources = {item['source'] for entry in files for item in entry['items']}
+            self.assertEqual(sources, {'qaq', 'buff'})
+
+            qaq_file = next(name for name in written if name.startswith('qaq_'))
+            with open(os.path.join(folder, qaq_file), encoding='utf-8') as f:
+                data = next(iter(json.load(f).values()))
+            self.assertTrue(data['buff_price'].endswith('￥'))
+            change = data['today_change']
+            self.assertEqual(change[:len(change) // 2], change[len(change) // 2:])
+
+            records = read_snapshot(qaq_file, folder)
+            self.assertTrue(records)
+            self.assertTrue(all(record['uu_price'] is not None for record in records))
+
+
+class BenchmarkSuiteTests(TestCase):
+    """基准套件在小规模数据上能跑通所有计时项"""
+
+    def test_run_benchmarks(self):
+        with tempfile.TemporaryDirectory() as folder:
+            generate_market(folder, items=40, timestamps=25)
+            results = run_benchmarks(folder, repeat=1)
+        for name in ('get_json_files', 'load_price_data', 'calculate_technical_indicators',
+                     'generate_trading_signals', 'view:trading_strategy:cold', 'portfolio_valuation',
+                     'portfolio_page'):
+            self.assertIn(name, results)
+
+    def test_compare_reports_regressions(self):
+        previous = {'a': {'median': 1.0}, 'b': {'median': 1.0}}
+        current = {'a': {'median': 1.5}, 'b': {'median': 1.1}}
+        self.assertEqual([name for name, *_ in compare(previous, current, 0.2)], ['a'])
+
+
+class PortfolioValuationTests(TempDataDirMixin, TransactionTestCase):
+    """
+    持仓按最新行情估值，持仓页分页渲染；耗时由基准套件中的 portfolio_valuation / portfolio_page 跟踪
+    视图在其他线程中读取持仓，需要已提交的数据，因此不能使用 TestCase 的事务
+    """
+
+    def setUp(self):
+        super().setUp()
+        generate_market(self.folder.name, items=200, timestamps=2)
+        self.names = [name for name, *_ in make_items(200, random.Random(0))]
+
+    def test_marks_positions_to_market(self):
+        today = date(2026, 6, 1)
+        Holding.objects.create(item=self.names[0], platform='buff', quantity=2, purchase_price=100,
+                               purchased_at=today - timedelta(days=10))
+        Holding.objects.create(item=self.names[1], platform='uu', quantity=1, purchase_price=50,
+                               purchased_at=today - timedelta(days=3))
+        Holding.objects.create(item='不存在的饰品', quantity=1, purchase_price=1, purchased_at=today)
+
+        state = get_market_state()
+        buff = state.row(state.lookup(self.names[0]))
+        uu = state.row(state.lookup(self.names[1]))
+        valuation = get_valuation(today)
+        rows = {row['item']: row for row in valuation.rows('item')}
+
+        self.assertAlmostEqual(rows[self.names[0]]['market_value'], buff['buff_price'] * 2, places=3)
+        self.assertAlmostEqual(rows[self.names[0]]['pnl'], buff['buff_price'] * 2 - 200, places=3)
+        self.assertAlmostEqual(rows[self.names[1]]['price'], uu['uu_price'], places=3)
+        self.assertEqual(rows[self.names[0]]['holding_days'], 10)
+        self.assertIsNone(rows['不存在的饰品']['market_value'])
+
+        summary = valuation.summary()
+        self.assertEqual(summary['unpriced'], 1)
+        self.assertAlmostEqual(sum(row['value'] for row in valuation.exposure()), summary['market_value'], places=3)
+        self.assertIs(get_valuation(today), valuation)
+
+    def test_reloads_holdings_changed_elsewhere(self):
+        # 不经过本进程 post_save 信号的修改（bulk_create、其他进程的 save）同样会让估值重新加载持仓
+        today = date(2026, 6, 1)
+        holding = Holding.objects.create(item=self.names[0], quantity=1, purchase_price=100, purchased_at=today)
+        self.assertEqual(get_valuation(today).summary()['positions'], 1)
+        with mock.patch('django.db.models.signals.post_save.send'):
+            Holding.objects.bulk_create([Holding(item=self.names[1], quantity=1, purchase_price=50, purchased_at=today)])
+            self.assertEqual(get_valuation(today).summary()['positions'], 2)
+            holding.quantity = 3
+            holding.save()
+        rows = {row['item']: row for row in get_valuation(today).rows('item')}
+        self.assertEqual(rows[self.names[0]]['quantity'], 3)
+
+        version = holdings_version()
+        Holding.objects.filter(pk=holding.pk)._raw_delete(Holding.objects.db)
+        self.assertNotEqual(holdings_version(), version)
+        self.assertEqual(get_valuation(today).summary()['positions'], 1)
+
+    def test_portfolio_page_paginates(self):
+        rng = random.Random(1)
+        Holding.objects.bulk_create([
+            Holding(item=rng.choice(self.names), platform=rng.choice(['buff', 'uu']), quantity=rng.randint(1, 3),
+                    purchase_price=rng.uniform(10, 5000), purchased_at=date(2026, 1, 1) + timedelta(days=i % 200))
+            for i in range(5000)
+        ])
+        self.assertEqual(self.client.get('/portfolio/').status_code, 200)
+
+        response = self.client.get('/portfolio/?sort=-pnl&page=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['holdings']), settings.PORTFOLIO_PAGE_SIZE)
+        self.assertEqual(response.context['pages'], 25)
+        expected = get_valuation().rows('-pnl', offset=settings.PORTFOLIO_PAGE_SIZE, limit=settings.PORTFOLIO_PAGE_SIZE)
+        self.assertEqual([row['id'] for row in response.context['holdings']], [row['id'] for row in expected])
+        for page in ('nan', 'inf', '-3', 'x', '1e9'):
+            with self.subTest(page=page):
+                response = self.client.get(f'/portfolio/?page={page}')
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(response.context['page'], (1, 25))
+
+
+class MarketIndexTests(TempDataDirMixin, TransactionTestCase):
+    """指数按入库增量物化，结果与整体重建一致；相关性和贝塔按有效期数计算"""
+
+    settings_overrides = {'MARKET_INDEX_BASE': 1000}
+
+    def write(self, category, timestamp, prices):
+        filename = f'cs_{category}_{timestamp}.json'
+        with open(os.path.join(self.folder.name, filename), 'w', encoding='utf-8') as f:
+            json.dump({item: f'¥ {price}' for item, price in prices.items()}, f, ensure_ascii=False)
+
+    def points(self):
+        return {
+            (point.category, point.timestamp.strftime('%Y%m%d_%H%M%S')): (
+                round(point.value_weighted, 6), round(point.equal_weighted, 6), point.constituents)
+            for point in MarketIndex.objects.all()
+        }
+
+    def test_value_and_equal_weighted_indices(self):
+        self.write('knife', '20250101_000000', {'A': 100, 'B': 10})
+        self.write('gloves', '20250101_000000', {'C': 50})
+        self.write('knife', '20250102_000000', {'A': 110, 'B': 5})
+        self.write('gloves', '20250102_000000', {'C': 50})
+        materialize()
+
+        points = self.points()
+        self.assertEqual(points[('knife', '20250101_000000')], (1000, 1000, 2))
+        # 市值加权 1000 × 115 / 110，等权 1000 × (1 + (10% - 50%) / 2)
+        self.assertEqual(points[('knife', '20250102_000000')], (round(1000 * 115 / 110, 6), 800, 2))
+        self.assertEqual(points[('gloves', '20250102_000000')], (1000, 1000, 1))
+        self.assertEqual(points[('', '20250102_000000')][:2],
+                         (round(1000 * 165 / 160, 6), round(1000 * (1 + (0.1 - 0.5 + 0) / 3), 6)))
+
+        self.write('knife', '20250103_000000', {'A': 121, 'B': 5})
+        matrix = materialize()
+        self.assertEqual(matrix.prices.shape, (3, 3))
+        incremental = self.points()
+        materialize(force=True)
+        self.assertEqual(self.points(), incremental)
+        self.assertEqual(incremental[('knife', '20250103_000000')][:2],
+                         (round(1000 * 115 / 110 * 126 / 115, 6), 800 * 1.05))
+
+    def test_appends_in_place_and_maps_read_only(self):
+        self.write('knife', '20250101_000000', {'A': 100, 'B': 10})
+        first = materialize()
+        reader = get_price_matrix()
+        self.assertIsInstance(reader.data, np.memmap)
+        self.assertEqual(reader.data.mode, 'r')
+
+        # 新时间点写入同一个数据文件的空余行，已加载的读者只看到清单中记录的列
+        self.write('knife', '20250102_000000', {'A': 110, 'C': 1})
+        appended = materialize()
+        self.assertEqual(appended.data_file, first.data_file)
+        self.assertEqual(reader.prices.shape, (2, 1))
+        self.assertEqual(get_price_matrix().prices.shape, (3, 2))
+        np.testing.assert_array_equal(get_price_matrix().prices[:, 1], [110, np.nan, 1])
+
+        # 修改已发布的时间点时写新的数据文件，只保留当前和上一代
+        for day in (2, 3, 4):
+            self.write('knife', f'2025010{day}_000000', {'A': 120 + day})
+            os.utime(os.path.join(self.folder.name, 'cs_knife_20250101_000000.json'), ns=(0, day * 10 ** 9))
+            rebuilt = materialize()
+            self.assertNotEqual(rebuilt.data_file, first.data_file)
+        data_files = [name for name in os.listdir(os.path.dirname(self.matrix_path)) if name.endswith('.npy')]
+        self.assertEqual(len(data_files), 2)
+        self.assertIn(rebuilt.data_file, data_files)
+        np.testing.assert_array_equal(reader.prices, [[100], [10]])
+
+    def test_correlate(self):
+        rng = np.random.default_rng(0)
+        target = rng.normal(size=40)
+        noisy = 2 * target
+        noisy[:5] = np.nan
+        returns = np.vstack([noisy, -target, np.full(40, np.nan)])
+        corr, beta, n = correlate(returns, target, min_periods=10)
+        self.assertAlmostEqual(corr[0], 1.0)
+        self.assertAlmostEqual(beta[0], 2.0)
+        self.assertAlmostEqual(corr[1], -1.0)
+        self.assertTrue(np.isnan(corr[2]))
+        self.assertEqual(n.tolist(), [35, 40, 0])
+
+    def test_correlations_endpoint(self):
+        generate_market(self.folder.name, items=60, timestamps=12, formats=('qaq',))
+        # 物化之前接口只返回空结果，不在请求中构建矩阵
+        self.assertIsNone(query_correlations(index='蝴蝶刀', window=10))
+        self.assertEqual(self.client.get('/api/indices/').json()['indices'], {})
+        self.assertFalse(os.path.exists(settings.MARKET_MATRIX_PATH))
+
+        materialize()
+        self.assertIn('蝴蝶刀', self.client.get('/api/indices/').json()['indices'])
+        result = query_correlations(index='蝴蝶刀', window=10, limit=5)
+        self.assertEqual(result['periods'], 10)
+        self.assertLessEqual(len(result['results']), 5)
+        correlations = [row['correlation'] for row in result['results']]
+        self.assertEqual(correlations, sorted(correlations, reverse=True))
+
+        response = self.client.get('/api/indices/correlations/', {'index': '蝴蝶刀', 'window': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/indices/correlations/', {'index': '不存在'}).status_code, 404)
+        self.assertIn('蝴蝶刀', self.client.get('/api/indices/?limit=nan').json()['indices'])
+        response = self.client.get('/api/indices/correlations/', {'window': 'inf', 'limit': 'nan'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_skips_half_written_snapshot(self):
+        self.write('knife', '20250101_000000', {'A': 100, 'B': 10})
+        with open(os.path.join(self.folder.name, 'cs_knife_20250102_000000.json'), 'w', encoding='utf-8') as f:
+            f.write('{"A": "¥ 1')
+        with self.assertLogs('monitor.returns', level='WARNING'):
+            matrix = materialize()
+        self.assertEqual(matrix.timestamps, ['20250101_000000'])
+
+        # 写完后签名变化，从该时间点起重算
+        self.write('knife', '20250102_000000', {'A': 110, 'B': 10})
+        self.assertEqual(materialize().timestamps, ['20250101_000000', '20250102_000000'])
+
+
+class SnapshotCacheTests(SimpleTestCase):
+    """视图缓存在两次爬取之间复用，文件新增或修改后失效；目录扫描按间隔节流"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        generate_market(self.folder.name, items=5, timestamps=1, formats=('qaq',))
+        # 只验证轮询和缓存，不让应用的接收器处理这个临时目录
+        self.signal = Signal()
+        patcher = mock.patch.object(snapshot_cache, 'snapshot_ingested', self.signal)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_view(self):
+        calls = []
+
+        @cache_per_snapshot
+        def cached_view(request):
+            calls.append(request.path)
+            return HttpResponse(str(len(calls)))
+
+        return cached_view, calls
+
+    def get(self, view):
+        return view(RequestFactory().get('/cached/', {'folder': self.folder.name})).content
+
+    def test_reused_until_snapshot_changes(self):
+        view, calls = self.make_view()
+        with mock.patch.object(snapshot_cache, 'watcher', SnapshotWatcher(self.folder.name)):
+            self.assertEqual(self.get(view), self.get(view))
+            self.assertEqual(len(calls), 1)
+
+            generate_market(self.folder.name, items=5, timestamps=1, formats=('qaq',), start=datetime(2025, 2, 1))
+            self.get(view)
+            self.assertEqual(len(calls), 2)
+
+            path = os.path.join(self.folder.name, sorted(os.listdir(self.folder.name))[0])
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            self.get(view)
+            self.get(view)
+            self.assertEqual(len(calls), 3)
+
+    def test_vary_on_adds_to_key(self):
+        calls, holdings = [], ['1-1-0']
+
+        @cache_per_snapshot(vary_on=lambda: holdings[0])
+        def cached_view(request):
+            calls.append(request.path)
+            return HttpResponse(str(len(calls)))
+
+        with mock.patch.object(snapshot_cache, 'watcher', SnapshotWatcher(self.folder.name)):
+            self.assertEqual(self.get(cached_view), self.get(cached_view))
+            holdings[0] = '2-2-0'
+            self.assertNotEqual(self.get(cached_view), b'1')
+        self.assertEqual(len(calls), 2)
+
+    def test_scans_at_most_once_per_interval(self):
+        watcher = SnapshotWatcher(self.folder.name, interval=60)
+        watcher.poll()
+        with mock.patch('monitor.cache.os.scandir') as scandir:
+            for _ in range(10):
+                watcher.poll()
+        scandir.assert_not_called()
+
+    def test_background_dispatch_publishes_version_when_done(self):
+        watcher = SnapshotWatcher(self.folder.name, background=True)
+        before = watcher.poll()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_receiver(sender, **kwargs):
+            started.set()
+            release.wait(5)
+
+        self.signal.connect(slow_receiver)
+        generate_market(self.folder.name, items=5, timestamps=1, formats=('qaq',), start=datetime(2025, 2, 1))
+        self.assertEqual(watcher.poll(), before)
+        self.assertTrue(started.wait(5))
+        # 接收器处理完之前一直返回旧指纹
+        self.assertEqual(watcher.poll(), before)
+        release.set()
+        for _ in range(100):
+            if watcher.poll() != before:
+                break
+            time.sleep(0.01)
+        self.assertNotEqual(watcher.poll(), before)
+
+
+class ArbitrageBookTests(TempDataDirMixin, TransactionTestCase):
+    """套利簿的惰性删除堆、过期条目清理和查询过滤"""
+
+    def make_book(self):
+        return arbitrage.ArbitrageBook(fees={'buff': 0, 'uu': 0})
+
+    def test_top_follows_latest_prices(self):
+        book = self.make_book()
+        rng = random.Random(0)
+        expected = {}
+        for step in range(20):
+            records = []
+            for i in range(30):
+                uu_price = 100 * rng.uniform(0.8, 1.2)
+                records.append(price_record(f'item{i}', 100, uu_price))
+                expected[f'item{i}'] = arbitrage.fee_adjusted_spread(100, uu_price, book.fees)[3]
+            book.update(records, f'20250101_{step:02d}0000')
+            top = book.top(k=10)
+            ranked = sorted(expected.items(), key=lambda pair: pair[1], reverse=True)[:10]
+            self.assertEqual([opp.item for opp in top], [item for item, _ in ranked])
+            self.assertEqual([opp.spread_pct for opp in top], [spread for _, spread in ranked])
+
+    def test_prunes_stale_entries(self):
+        book = self.make_book()
+        for step in range(200):
+            book.update([price_record(f'item{i}', 100, 90 + step % 7) for i in range(10)], f'2025{step:04d}_000000')
+        self.assertLessEqual(len(book._heap), 2 * len(book.latest) + 64)
+        self.assertEqual(len(book.top(k=100)), 10)
+
+    def test_filters(self):
+        book = self.make_book()
+        book.update([price_record('cheap', 10, 12), price_record('dear', 1000, 1300)], '20250101_000000')
+        book.update([price_record('dear', 1000, 1250)], '20250101_010000')
+        self.assertEqual([opp.item for opp in book.top(min_observations=2)], ['dear'])
+        self.assertEqual([opp.item for opp in book.top(max_price=100)], ['cheap'])
+        self.assertEqual([opp.item for opp in book.top(min_price=100)], ['dear'])
+        self.assertEqual([opp.item for opp in book.top(k=1)], ['dear'])
+
+    def test_expires_items_missing_from_newest_snapshot(self):
+        book = self.make_book()
+        book.update([price_record('a', 100, 130), price_record('b', 100, 110)], '20250101_000000', 'knife', 'f1')
+        book.update([price_record('g', 100, 120)], '20250101_000000', 'gloves', 'f2')
+        # b 在较新的快照中没有悠悠报价，它的旧价差不再是当前机会；其他类型不受影响
+        book.update([price_record('a', 100, 105), price_record('b', 100)], '20250101_010000', 'knife', 'f3')
+        self.assertEqual(book.prune(), 1)
+        self.assertEqual([opp.item for opp in book.top()], ['g', 'a'])
+        self.assertNotIn('b', book.stats)
+
+        self.assertEqual(book.remove(['f3']), 1)
+        self.assertEqual([opp.item for opp in book.top()], ['g'])
+        self.assertEqual(book.newest, {'gloves': '20250101_000000'})
+
+    def test_removed_files_leave_the_book(self):
+        with mock.patch.object(arbitrage, '_book', arbitrage.ArbitrageBook()), \
+                mock.patch.object(arbitrage, '_bootstrapped', True):
+            files = generate_market(self.folder.name, items=10, timestamps=1, formats=('qaq',))
+            arbitrage.scan_new_snapshots(sender=None, files=files)
+            self.assertEqual(len(arbitrage._book.latest), 10)
+            for filename in files:
+                os.remove(os.path.join(self.folder.name, filename))
+            arbitrage.scan_new_snapshots(sender=None, files=[], removed=files)
+            self.assertEqual(arbitrage._book.latest, {})
+            self.assertEqual(arbitrage._book.top(), [])
+
+    def test_default_query_cached_until_update(self):
+        book = self.make_book()
+        book.update([price_record('a', 100, 110)], '20250101_000000')
+        first = book.top()
+        self.assertIs(book.top(), first)
+        self.assertIsNot(book.top(min_price=1), book.top(min_price=1))
+        book.update([price_record('b', 100, 120)], '20250101_010000')
+        self.assertEqual([opp.item for opp in book.top()], ['b', 'a'])
+
+    def test_rejects_non_finite_query_parameters(self):
+        with mock.patch.object(arbitrage, '_book', arbitrage.ArbitrageBook()), \
+                mock.patch.object(arbitrage, '_bootstrapped', False):
+            generate_market(self.folder.name, items=10, timestamps=2, formats=('qaq',))
+            for query in ('limit=nan', 'limit=inf', 'min_observations=inf', 'min_observations=-5',
+                          'min_price=nan', 'limit=1e9'):
+                with self.subTest(query=query):
+                    response = self.client.get(f'/api/arbitrage/?{query}')
+                    self.assertEqual(response.status_code, 200)
+                    filters = response.json()['filters']
+                    self.assertTrue(1 <= filters['k'] <= 500)
+                    self.assertGreaterEqual(filters['min_observations'], 0)
+
+
+def load_coordinator():
+    """scraper/ 不是包，按文件路径加载协调器模块（模块级只依赖标准库）"""
+    path = os.path.join(settings.BASE_DIR, 'scraper', 'coordinator.py')
+    spec = importlib.util.spec_from_file_location('coordinator', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class JobQueueTests(SimpleTestCase):
+    """爬取任务队列的领取、租约、退避重试和所有权检查，不需要浏览器"""
+
+    def setUp(self):
+        self.coordinator = load_coordinator()
+        self.now = 1000.0
+        patcher = mock.patch.object(self.coordinator, 'time', mock.Mock(time=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.queue = self.coordinator.JobQueue(os.path.join(folder.name, 'queue.sqlite3'),
+                                               lease_seconds=60, max_attempts=2, retry_delay=10)
+        self.addCleanup(self.queue.close)
+        self.run_id = self.coordinator.seed_run(self.queue, 'qaq', ['蝴蝶刀', '爪子刀'], {'cards_per_job': 20})
+
+    def test_claims_each_job_once(self):
+        first = self.queue.claim(self.run_id, 'a')
+        second = self.queue.claim(self.run_id, 'b')
+        self.assertEqual((first.category, second.category), ('蝴蝶刀', '爪子刀'))
+        self.assertIsNone(self.queue.claim(self.run_id, 'c'))
+        self.assertEqual(self.queue.unfinished(self.run_id), 2)
+
+    def test_expired_lease_is_reclaimed(self):
+        job = self.queue.claim(self.run_id, 'a')
+        other = self.queue.claim(self.run_id, 'a')
+        self.now += 30
+        self.assertTrue(self.queue.renew(job))
+        self.assertTrue(self.queue.renew(other))
+        # 续租后超过最初的租约期限仍属于原来的进程
+        self.now += 40
+        self.assertIsNone(self.queue.claim(self.run_id, 'b'))
+
+        self.now += 30
+        taken = self.queue.claim(self.run_id, 'b')
+        self.assertEqual((taken.id, taken.attempts), (job.id, 2))
+        # 原来的进程已失去所有权，续租和提交都被拒绝
+        self.assertFalse(self.queue.renew(job))
+        self.assertFalse(self.queue.complete(job, {'A': {}}))
+        self.assertTrue(self.queue.complete(taken, {'B': {}}))
+        self.assertEqual(self.queue.results(self.run_id), {'蝴蝶刀': {'B': {}}})
+
+    def test_failed_job_backs_off_then_gives_up(self):
+        job = self.queue.claim(self.run_id, 'a')
+        self.queue.fail(job, 'boom')
+        self.queue.claim(self.run_id, 'a')
+        self.assertIsNone(self.queue.claim(self.run_id, 'a'))
+
+        self.now += 10
+        retry = self.queue.claim(self.run_id, 'a')
+        self.assertEqual((retry.id, retry.attempts), (job.id, 2))
+        self.queue.fail(job, 'stale')
+        self.assertEqual(self.queue.counts(self.run_id), {'running': 2})
+
+        self.queue.fail(retry, 'boom')
+        self.assertEqual(self.queue.failed(self.run_id), 1)
+        self.assertEqual(self.queue.retry_failed(self.run_id), 1)
+        self.assertEqual(self.queue.claim(self.run_id, 'a').attempts, 1)
+
+    def test_card_error_fails_whole_job(self):
+        async def scrape_card(context, card):
+            if card == 'bad':
+                raise TimeoutError('timeout')
+            return {'buff_price': card}
+
+        async def load_cards(page, count):
+            return ['a', 'bad', 'c']
+
+        qaq = mock.Mock(load_cards=load_cards, scrape_card=scrape_card,
+                        get_card_name=mock.AsyncMock(side_effect=lambda card: card))
+        job = self.queue.claim(self.run_id, 'a')
+        with mock.patch.dict('sys.modules', {'qaq': qaq}):
+            with self.assertRaisesMessage(RuntimeError, '第 1 张卡片'):
+                asyncio.run(self.coordinator.run_qaq_job(self.queue, job, None, {job.category: mock.Mock()}))
+
+
+class RecordingSink:
+    def __init__(self):
+        self.batches = []
+
+    def send(self, batch):
+        self.batches.append(batch)
+
+
+def price_record(item, buff_price, uu_price=None):
+    return {'item': item, 'buff_price': buff_price, 'uu_price': uu_price,
+            'today_change': None, 'week_change': None}
+
+
+class AlertEngineTests(SimpleTestCase):
+    """阈值有序索引、回差和冷却时间"""
+
+    def make_engine(self, *rules):
+        sink = RecordingSink()
+        return alerts.AlertEngine(rules, sinks=[sink], fees={'buff': 0, 'uu': 0}), sink
+
+    def test_sorted_thresholds(self):
+        engine, _ = self.make_engine(
+            alerts.Rule(1, 'AK', 'buff_price', 'below', 100),
+            alerts.Rule(2, 'AK', 'buff_price', 'below', 50),
+            alerts.Rule(3, 'AK', 'buff_price', 'above', 200),
+            alerts.Rule(4, 'AK', 'buff_price', 'above', 55),
+            alerts.Rule(5, '', 'buff_price', 'below', 10),
+        )
+        fired = engine.evaluate([price_record('AK', 60), price_record('M4', 5)], '20250101_000000')
+        self.assertEqual(sorted((alert.item, alert.rule.id) for alert in fired), [('AK', 1), ('AK', 4), ('M4', 5)])
+
+    def test_hysteresis(self):
+        engine, sink = self.make_engine(alerts.Rule(1, 'AK', 'buff_price', 'below', 100, hysteresis=10))
+        prices = [90, 95, 105, 90, 111, 90]
+        fired = [bool(engine.evaluate([price_record('AK', price)], f'20250101_0{i}0000'))
+                 for i, price in enumerate(prices)]
+        self.assertEqual(fired, [True, False, False, False, False, True])
+        self.assertEqual(len(sink.batches), 2)
+
+    def test_cooldown(self):
+        engine, _ = self.make_engine(alerts.Rule(1, 'AK', 'buff_price', 'below', 100, cooldown=3600))
+        times_prices = [('20250101_000000', 90), ('20250101_000100', 120), ('20250101_000200', 90),
+                        ('20250101_010000', 120), ('20250101_010100', 90)]
+        fired = [bool(engine.evaluate([price_record('AK', price)], timestamp)) for timestamp, price in times_prices]
+        self.assertEqual(fired, [True, False, False, False, True])
+
+    def test_state_round_trip(self):
+        rule = alerts.Rule(1, 'AK', 'buff_price', 'below', 100, cooldown=3600)
+        engine, _ = self.make_engine(rule)
+        engine.evaluate([price_record('AK', 90)], '20250101_000000')
+        restored, sink = self.make_engine(rule)
+        restored.restore_state(json.loads(json.dumps(engine.dump_state())))
+        self.assertEqual(restored.evaluate([price_record('AK', 80)], '20250101_000100'), [])
+        self.assertEqual(sink.batches, [])
+
+    def test_deliver_skips_empty_batches(self):
+        engine, sink = self.make_engine()
+        engine.deliver([])
+        self.assertEqual(sink.batches, [])
+
+
+class AlertIngestTests(TestCase):
+    """提醒只在导入时评估，第一次导入只建立触发状态"""
+
+    def test_evaluates_once_per_ingest(self):
+        sink = RecordingSink()
+        with tempfile.TemporaryDirectory() as folder, \
+                override_settings(ALERT_STATE_PATH=os.path.join(folder, '.state', 'alert_state.json')), \
+                mock.patch.object(alerts, '_engine', alerts.AlertEngine(sinks=[sink])), \
+                mock.patch.object(alerts, '_rules_dirty', True):
+            AlertRule.objects.create(field='buff_price', operator='above', threshold=0)
+            first = generate_market(folder, items=5, timestamps=1, formats=('qaq',))
+            self.assertEqual(len(alerts.evaluate_new_snapshots(first, folder)), 5)
+            self.assertEqual(sink.batches, [])
+
+            later = generate_market(folder, items=6, timestamps=1, formats=('qaq',), start=datetime(2025, 2, 1))
+            fired = alerts.evaluate_new_snapshots(later, folder)
+        # 前 5 个饰品仍在阈值上方，不会重复通知
+        self.assertEqual(len(fired), 1)
+        self.assertEqual(sink.batches, [fired])
+
+
+class IngestTests(TestCase):
+    """
+    批量导入跳过写到一半的文件，重复导入幂等，文件改写后替换旧记录；
+    同一时间点有两种来源时价格历史优先使用 qaq 记录
+    """
+
+    def test_second_ingest_skips_unchanged_files(self):
+        with tempfile.TemporaryDirectory() as folder:
+            files = generate_market(folder, items=10, timestamps=2)
+            first = ingest_snapshots(folder=folder, workers=1)
+            rows = PriceRecord.objects.count()
+            second = ingest_snapshots(folder=folder, workers=1)
+        self.assertEqual(first.rows, rows)
+        self.assertEqual((second.skipped, second.rows, second.ingested), (len(files), 0, []))
+        self.assertEqual(PriceRecord.objects.count(), rows)
+        self.assertEqual(Snapshot.objects.count(), len(files))
+
+    def test_rewritten_file_replaces_its_records(self):
+        with tempfile.TemporaryDirectory() as folder:
+            files = generate_market(folder, items=10, timestamps=1, formats=('qaq',))
+            ingest_snapshots(folder=folder, workers=1)
+            filename = files[0]
+            snapshot = Snapshot.objects.get(filename=filename)
+            other_rows = PriceRecord.objects.exclude(snapshot=snapshot).count()
+            with open(os.path.join(folder, filename), 'w', encoding='utf-8') as f:
+                json.dump({'★ 蝴蝶刀': {'buff_price': '¥ 123'}, '★ 爪子刀': {'buff_price': '¥ 45'}}, f,
+                          ensure_ascii=False)
+            stats = ingest_snapshots(folder=folder, workers=1)
+        self.assertEqual(stats.ingested, [filename])
+        self.assertEqual(Snapshot.objects.get(filename=filename).id, snapshot.id)
+        self.assertEqual(sorted(PriceRecord.objects.filter(snapshot=snapshot).values_list('item', 'buff_price')),
+                         [('★ 爪子刀', 45.0), ('★ 蝴蝶刀', 123.0)])
+        self.assertEqual(PriceRecord.objects.exclude(snapshot=snapshot).count(), other_rows)
+
+    def test_half_written_file_counts_as_failed(self):
+        with tempfile.TemporaryDirectory() as folder:
+            files = generate_market(folder, items=10, timestamps=2, formats=('qaq',))
+            with open(os.path.join(folder, 'qaq_蝴蝶刀_20990101_000000.json'), 'w', encoding='utf-8') as f:
+                f.write('{"★ 蝴蝶刀": {"buff_price": "12')
+            stats = ingest_snapshots(folder=folder, workers=1)
+        self.assertEqual([name for name, _ in stats.failed], ['qaq_蝴蝶刀_20990101_000000.json'])
+        self.assertEqual(sorted(stats.ingested), sorted(files))
+        self.assertEqual(Snapshot.objects.count(), len(files))
+
+    def test_price_history_prefers_qaq(self):
+        with tempfile.TemporaryDirectory() as folder, override_settings(CS_DATA_DIR=folder):
+            generate_market(folder, items=10, timestamps=3)
+            files = get_json_files()
+            item = read_snapshot(files[0]['items'][-1]['filename'], folder)[0]['item']
+            history = build_price_history(files, item, folder)
+        self.assertEqual(len(history), 3)
+        for point in history:
+            self.assertIsNotNone(point['uu_price'])
+            self.assertEqual(point['uu_price'], point['uu_price'])
+
+
+class ComputeTimeoutTests(TempDataDirMixin, TransactionTestCase):
+    """计算池超时返回 504，超时的响应不会被缓存"""
+
+    settings_overrides = {'MONITOR_COMPUTE_TIMEOUT': 0.05}
+
+    def setUp(self):
+        super().setUp()
+        generate_market(self.folder.name, items=10, timestamps=2, formats=('qaq',))
+
+    def test_slow_compute_returns_504(self):
+        from . import analytics
+
+        def slow_history(*args, **kwargs):
+            time.sleep(0.5)
+            return []
+
+        item = read_snapshot(get_json_files()[0]['items'][0]['filename'])[0]['item']
+        with mock.patch.object(analytics, 'build_price_history', slow_history):
+            response = self.client.get('/price-chart/', {'item': item})
+        self.assertEqual(response.status_code, 504)
+
+        with override_settings(MONITOR_COMPUTE_TIMEOUT=30):
+            response = self.client.get('/price-chart/', {'item': item})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['data']['item'], item)
+
+
+    def test_expired_deadline_stops_before_next_file(self):
+        from . import analytics
+
+        files = get_json_files()
+        with mock.patch.object(analytics, 'load_price_data', wraps=analytics.load_price_data) as load:
+            with self.assertRaises(ComputeCancelled):
+                build_price_history(files, 'x', self.folder.name, deadline=time.time() - 1)
+            load.assert_not_called()
+            build_price_history(files, 'x', self.folder.name, deadline=time.time() + 60)
+        self.assertEqual(load.call_count, len(all_filenames(files)))
+
+
+class ProfilingTests(TempDataDirMixin, TransactionTestCase):
+    """开启 MONITOR_PROFILING 后响应带 Server-Timing 头，慢请求只有管理员能查看"""
+
+    settings_overrides = {'MONITOR_PROFILING': True, 'MONITOR_SLOW_REQUEST_THRESHOLD': 0}
+
+    def setUp(self):
+        super().setUp()
+        generate_market(self.folder.name, items=10, timestamps=2, formats=('qaq',))
+        slow_requests.clear()
+        self.addCleanup(slow_requests.clear)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        metrics = [metric.strip().split(';')[0] for metric in response['Server-Timing'].split(',')]
+        self.assertEqual(metrics[0], 'total')
+        self.assertIn('snapshot_version', metrics)
+        self.assertIn('render', metrics)
+        self.assertIn('cache_hit', self.client.get('/')['Server-Timing'])
+
+    def test_no_header_when_disabled(self):
+        with override_settings(MONITOR_PROFILING=False):
+            self.client.handler.load_middleware()
+            response = self.client.get('/api/items/search/', {'q': '蝴蝶'})
+        self.assertNotIn('Server-Timing', response)
+
+    def test_slow_requests_staff_only(self):
+        self.client.get('/api/arbitrage/')
+        self.assertEqual(self.client.get('/profiling/slow/').status_code, 302)
+
+        from django.contrib.auth.models import User
+        user = User.objects.create_user('viewer', password='secret')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/profiling/slow/').status_code, 302)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get('/profiling/slow/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['enabled'])
+        self.assertIn('/api/arbitrage/', [entry['path'] for entry in data['requests']])
+        self.assertIn('total', response['Server-Timing'])
+
+
+class MarketStateTests(TempDataDirMixin, TransactionTestCase):
+    """共享行情表的编码与查找；爬虫写到一半的文件不会让行情表或请求失败"""
+
+    def setUp(self):
+        super().setUp()
+        generate_market(self.folder.name, items=30, timestamps=2, formats=('qaq',))
+
+    def test_encodes_latest_records(self):
+        # 再写一组同时带 cs_ 文件的较新时间点：同一时间点以 qaq 记录为准，较新的时间点覆盖旧的
+        generate_market(self.folder.name, items=30, timestamps=1, start=datetime(2025, 2, 1), seed=1)
+        self.assertTrue(publish_state())
+        self.assertFalse(publish_state())
+        state = MarketState(self.state_path)
+
+        expected = {}
+        for entry in get_json_files():
+            for snapshot in entry['items']:
+                if snapshot['source'] == 'qaq':
+                    for record in read_snapshot(snapshot['filename']):
+                        expected[record['item']] = (record, snapshot['item_type'])
+        self.assertEqual(len(state), len(expected))
+        self.assertEqual([state.name(i) for i in range(len(state))], sorted(expected))
+        for name, (record, item_type) in expected.items():
+            row = state.row(state.lookup(name))
+            self.assertEqual(row['item'], name)
+            self.assertEqual(row['item_type'], item_type)
+            self.assertAlmostEqual(row['buff_price'], record['buff_price'], delta=record['buff_price'] * 1e-6)
+            self.assertAlmostEqual(row['uu_price'], record['uu_price'], delta=record['uu_price'] * 1e-6)
+        self.assertEqual(set(state.timestamps.values()), {'20250201_000000'})
+        for missing in ('', '不存在的饰品', '\uffff'):
+            self.assertIsNone(state.lookup(missing))
+        self.assertEqual(get_market_state().generation, state.generation)
+
+    def test_newer_buff_only_file_keeps_qaq_fields(self):
+        generate_market(self.folder.name, items=30, timestamps=1, formats=('buff',), start=datetime(2025, 2, 1))
+        self.assertTrue(publish_state())
+        state = MarketState(self.state_path)
+
+        files = get_json_files()
+        newest = {}
+        for snapshot in files[-1]['items']:
+            for record in read_snapshot(snapshot['filename']):
+                newest[record['item']] = (record, snapshot['item_type'])
+        for snapshot in files[-2]['items']:
+            for record in read_snapshot(snapshot['filename']):
+                if record['item'] not in newest:
+                    continue
+                row = state.row(state.lookup(record['item']))
+                buff_record, buff_type = newest[record['item']]
+                self.assertAlmostEqual(row['buff_price'], buff_record['buff_price'], delta=row['buff_price'] * 1e-6)
+                self.assertAlmostEqual(row['uu_price'], record['uu_price'], delta=record['uu_price'] * 1e-6)
+                self.assertEqual(row['today_change_pct'] is None, parse_change(record['today_change'])[1] is None)
+                self.assertEqual(row['item_type'], snapshot['item_type'])
+                self.assertNotEqual(row['item_type'], buff_type)
+
+    def write_truncated(self):
+        with open(os.path.join(self.folder.name, 'qaq_蝴蝶刀_20990101_000000.json'), 'w', encoding='utf-8') as f:
+            f.write('{"★ 蝴蝶刀": {"buff_price": "12')
+
+    def test_skips_half_written_snapshot(self):
+        self.write_truncated()
+        self.assertTrue(publish_state())
+        state = MarketState(self.state_path)
+        self.assertEqual(len(state), 30)
+        self.assertIsNone(state.lookup('★ 蝴蝶刀'))
+
+    def test_receiver_errors_do_not_fail_poll(self):
+        def broken(sender, **kwargs):
+            raise RuntimeError('boom')
+
+        snapshot_ingested.connect(broken)
+        self.addCleanup(snapshot_ingested.disconnect, broken)
+        with self.assertLogs('monitor.cache', level='ERROR'):
+            self.assertTrue(SnapshotWatcher(self.folder.name).poll())
+
+    def test_home_with_half_written_snapshot(self):
+        self.write_truncated()
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+
+class SearchIndexTests(SimpleTestCase):
+    """前缀补全、n-gram 子串搜索、分面解析和过滤；启动时的首次扫描不建立索引，第一次搜索时再完整建立"""
+
+    NAMES = [
+        '蝴蝶刀（★）',
+        '蝴蝶刀（★） | 蓝钢 (战痕累累)',
+        '蝴蝶刀（★） | 多普勒 (崭新出厂)',
+        '爪子刀（★） | 多普勒 (崭新出厂)',
+        'AK-47 | 红线 (久经沙场)',
+        'AK-47 | 火蛇 (崭新出厂)',
+    ]
+
+    def make_index(self):
+        index = search.ItemSearchIndex()
+        self.assertEqual(index.add_names(self.NAMES), len(self.NAMES))
+        self.assertEqual(index.add_names(self.NAMES[:2]), 0)
+        return index
+
+    def names(self, index, ids):
+        return [index.names[item_id] for item_id in ids]
+
+    def test_prefix_autocomplete(self):
+        index = self.make_index()
+        self.assertEqual(self.names(index, index.autocomplete('ak')),
+                         ['AK-47 | 火蛇 (崭新出厂)', 'AK-47 | 红线 (久经沙场)'])
+        # 全角括号和空白在规范化后与半角一致
+        self.assertEqual(self.names(index, index.autocomplete('蝴蝶刀(★)|多')), ['蝴蝶刀（★） | 多普勒 (崭新出厂)'])
+        self.assertEqual(len(index.autocomplete('蝴蝶刀', limit=2)), 2)
+        self.assertEqual(index.autocomplete('多普勒'), [])
+
+    def test_substring_search(self):
+        index = self.make_index()
+        self.assertEqual(self.names(index, index.search('多普勒')),
+                         ['爪子刀（★） | 多普勒 (崭新出厂)', '蝴蝶刀（★） | 多普勒 (崭新出厂)'])
+        # 多个词需同时匹配，完全匹配和前缀匹配排在子串匹配之前
+        self.assertEqual(self.names(index, index.search('崭新 蝴蝶')), ['蝴蝶刀（★） | 多普勒 (崭新出厂)'])
+        self.assertEqual(self.names(index, index.search('蝴蝶刀（★）', limit=2)),
+                         ['蝴蝶刀（★）', '蝴蝶刀（★） | 蓝钢 (战痕累累)'])
+        self.assertEqual(index.search('不存在'), [])
+        self.assertEqual(self.names(index, index.search('蛇')), ['AK-47 | 火蛇 (崭新出厂)'])
+
+    def test_facets(self):
+        self.assertEqual(search.parse_item_name('蝴蝶刀（★） | 蓝钢 (战痕累累)'),
+                         {'weapon': '蝴蝶刀', 'skin': '蓝钢', 'wear': '战痕累累', 'star': True})
+        self.assertEqual(search.parse_item_name('AK-47 | 红线 (久经沙场)'),
+                         {'weapon': 'AK-47', 'skin': '红线', 'wear': '久经沙场', 'star': False})
+        self.assertEqual(search.parse_item_name('蝴蝶刀（★）'),
+                         {'weapon': '蝴蝶刀', 'skin': '', 'wear': '', 'star': True})
+
+        index = self.make_index()
+        self.assertEqual(self.names(index, index.search('', wear='崭新出厂', weapon='AK-47')),
+                         ['AK-47 | 火蛇 (崭新出厂)'])
+        self.assertEqual(self.names(index, index.search('多普勒', weapon='蝴蝶刀')), ['蝴蝶刀（★） | 多普勒 (崭新出厂)'])
+        self.assertEqual(index.search('红线', wear='崭新出厂'), [])
+        self.assertEqual(index.describe(index.search('蓝钢')[0])['skin'], '蓝钢')
+
+    def test_resolve(self):
+        index = self.make_index()
+        self.assertEqual(index.resolve('★ 蝴蝶刀'), '蝴蝶刀（★）')
+        self.assertEqual(index.resolve('AK-47 | 红线 (久经沙场)'), 'AK-47 | 红线 (久经沙场)')
+        self.assertEqual(index.resolve('火蛇'), 'AK-47 | 火蛇 (崭新出厂)')
+        self.assertEqual(index.resolve('不存在的饰品'), '不存在的饰品')
+
+    def test_bootstraps_lazily(self):
+        with tempfile.TemporaryDirectory() as folder, override_settings(CS_DATA_DIR=folder), \
+                mock.patch.object(search, '_index', search.ItemSearchIndex()), \
+                mock.patch.object(search, '_bootstrapped', False):
+            files = generate_market(folder, items=20, timestamps=2, formats=('qaq',))
+            search.index_new_items(sender=None, files=files, initial=True)
+            self.assertEqual(search._index.names, [])
+
+            index = search.get_search_index()
+            self.assertEqual(len(index.names), 20)
+            self.assertTrue(search._bootstrapped)
@@ -8,5 +8,12 @@ urlpatterns = [
     path('price-chart/', views.price_chart, name='price_chart'),
     path('price-overview/', views.price_overview, name='price_overview'),
     path('crawler/', views.crawler, name='crawler'),
-    path('strategy/', views.trading_strategy, name='trading_strategy')
+    path('strategy/', views.trading_strategy, name='trading_strategy'),
+    path('arbitrage/', views.arbitrage, name='arbitrage'),
+    path('portfolio/', views.portfolio, name='portfolio'),
+    path('api/items/search/', views.item_search, name='item_search'),
+    path('api/arbitrage/', views.arbitrage_api, name='arbitrage_api'),
+    path('api/indices/', views.market_indices, name='market_indices'),
+    path('api/indices/correlations/', views.index_correlations, name='index_correlations'),
+    path('profiling/slow/', views.profiling_slow_requests, name='profiling_slow_requests'),
 ]  
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""
+持仓估值引擎：一次向量化连接把全部持仓按最新行情估值
+
+持仓保存为按列排列的 numpy 数组，与 mmap 共享的最新行情表按饰品 ID 连接。饰品 ID 只在
+行情表重新发布后才会变化，连接结果按行情表代数缓存；估值本身只是几次数组运算。
+
+依赖 numpy，只在持仓视图和已加载持仓的进程入库后延迟导入。
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+
+PLATFORMS = ('buff', 'uu')
+SORT_FIELDS = {
+    'item': 'item',
+    'value': 'market_value',
+    'pnl': 'pnl',
+    'pnl_pct': 'pnl_pct',
+    'days': 'holding_days',
+}
+
+
+class Positions:
+    """按列存放的持仓，item_ids 是与行情表连接后的饰品 ID（行情表中不存在时为 -1）"""
+
+    def __init__(self, holdings):
+        """
+        :param holdings: (id, 饰品, 平台, 数量, 买入单价, 买入日期) 序列
+        """
+        holdings = list(holdings)
+        self.count = len(holdings)
+        self.ids = np.fromiter((h[0] for h in holdings), dtype=np.int64, count=self.count)
+        self.items = [h[1] for h in holdings]
+        self.platform = np.fromiter((PLATFORMS.index(h[2]) for h in holdings), dtype=np.int8, count=self.count)
+        self.quantity = np.fromiter((h[3] for h in holdings), dtype=np.float64, count=self.count)
+        self.cost = np.fromiter((h[4] for h in holdings), dtype=np.float64, count=self.count)
+        self.purchased_at = np.array([h[5] for h in holdings], dtype='datetime64[D]').reshape(self.count)
+        # 同一饰品的多笔持仓只查找一次
+        self._names = list(dict.fromkeys(self.items))
+        positions = {name: i for i, name in enumerate(self._names)}
+        self._inverse = np.fromiter((positions[item] for item in self.items), dtype=np.int64, count=self.count)
+        self._generation = None
+        self.item_ids = None
+
+    def join(self, state):
+        """把持仓连接到行情表，行情表代数未变时复用上次的结果"""
+        generation = state.generation if state is not None else None
+        if generation != self._generation or self.item_ids is None:
+            if state is None:
+                unique_ids = np.full(len(self._names), -1, dtype=np.int64)
+            else:
+                unique_ids = np.fromiter(
+                    (-1 if (item_id := state.lookup(name)) is None else item_id for name in self._names),
+                    dtype=np.int64, count=len(self._names),
+                )
+            self.item_ids = unique_ids[self._inverse]
+            self._generation = generation
+        return self.item_ids
+
+    def value(self, state, today):
+        """
+        按最新行情估值
+        持仓平台有价格时按该平台价格计价，否则回退到 BUFF 价格；行情表中没有的饰品市值记为 NaN
+        :param today: datetime.date，用于计算持有天数
+        """
+        item_ids = self.join(state)
+        known = item_ids >= 0
+        index = np.where(known, item_ids, 0)
+        nan = np.full(self.count, np.nan)
+        if state is not None and len(state):
+            buff = np.where(known, np.frombuffer(state.buff_price, dtype=np.float32)[index], np.nan)
+            uu = np.where(known, np.frombuffer(state.uu_price, dtype=np.float32)[index], np.nan)
+            codes = np.frombuffer(state.category_codes, dtype=np.uint16)[index].astype(np.int64)
+            categories = list(state.categories)
+        else:
+            buff, uu, codes, categories = nan, nan, np.zeros(self.count, dtype=np.int64), []
+
+        use_uu = (self.platform == PLATFORMS.index('uu')) & ~np.isnan(uu)
+        mark = np.where(use_uu, uu, buff)
+        market_value = mark * self.quantity
+        cost_value = self.cost * self.quantity
+        pnl = market_value - cost_value
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pnl_pct = np.where(cost_value > 0, pnl / cost_value * 100, np.nan)
+        holding_days = (np.datetime64(today, 'D') - self.purchased_at).astype(np.int64)
+
+        priced = ~np.isnan(market_value)
+        exposure = np.bincount(codes[priced], weights=market_value[priced], minlength=len(categories))
+        return Valuation(
+            positions=self,
+            generation=state.generation if state is not None else None,
+            today=today,
+            buff_price=buff,
+            uu_price=uu,
+            mark=mark,
+            market_value=market_value,
+            cost_value=cost_value,
+            pnl=pnl,
+            pnl_pct=pnl_pct,
+            holding_days=holding_days,
+            priced=priced,
+            categories=categories,
+            category_codes=codes,
+            exposure_values=exposure,
+        )
+
+
+@dataclass
+class Valuation:
+    """一次估值的结果，各数组与 positions 中的持仓一一对应"""
+    positions: Positions
+    generation: object
+    today: object
+    buff_price: np.ndarray
+    uu_price: np.ndarray
+    mark: np.ndarray
+    market_value: np.ndarray
+    cost_value: np.ndarray
+    pnl: np.ndarray
+    pnl_pct: np.ndarray
+    holding_days: np.ndarray
+    priced: np.ndarray
+    categories: list
+    category_codes: np.ndarray
+    exposure_values: np.ndarray
+    _summary: dict = field(default=None, repr=False)
+
+    def summary(self):
+        """总成本、总市值和浮动盈亏，只统计有行情的持仓"""
+        if self._summary is None:
+            cost = float(self.cost_value[self.priced].sum())
+            value = float(self.market_value[self.priced].sum())
+            self._summary = {
+                'positions': self.positions.count,
+                'unpriced': int(self.positions.count - self.priced.sum()),
+                'cost': cost,
+                'market_value': value,
+                'pnl': value - cost,
+                'pnl_pct': (value - cost) / cost * 100 if cost else None,
+            }
+        return self._summary
+
+    def exposure(self):
+        """按类型的市值敞口，按市值从高到低排列"""
+        total = float(self.exposure_values.sum())
+        rows = [
+            {'category': category, 'value': float(value), 'pct': float(value) / total * 100 if total else 0.0}
+            for category, value in zip(self.categories, self.exposure_values)
+            if value
+        ]
+        rows.sort(key=lambda row: row['value'], reverse=True)
+        return rows
+
+    def order(self, sort='-value'):
+        """按指定字段排序后的持仓下标，NaN 排在最后"""
+        descending = sort.startswith('-')
+        key = SORT_FIELDS.get(sort.lstrip('-'), 'market_value')
+        if key == 'item':
+            order = np.array(sorted(range(self.positions.count), key=self.positions.items.__getitem__), dtype=np.int64)
+            return order[::-1] if descending else order
+        values = getattr(self, key).astype(np.float64)
+        values = np.where(np.isnan(values), np.inf, -values if descending else values)
+        return np.argsort(values, kind='stable')
+
+    def rows(self, sort='-value', offset=0, limit=None):
+        """按排序取出一页持仓，数值一次性转换为 Python 对象以便模板渲染"""
+        order = self.order(sort)
+        order = order[offset:None if limit is None else offset + limit]
+        positions = self.positions
+        columns = zip(
+            positions.ids[order].tolist(),
+            [positions.items[i] for i in order.tolist()],
+            positions.platform[order].tolist(),
+            positions.quantity[order].tolist(),
+            positions.cost[order].tolist(),
+            self.mark[order].tolist(),
+            self.market_value[order].tolist(),
+            self.pnl[order].tolist(),
+            self.pnl_pct[order].tolist(),
+            self.holding_days[order].tolist(),
+            self.category_codes[order].tolist(),
+            self.priced[order].tolist(),
+        )
+        for (holding_id, item, platform, quantity, cost, mark, value, pnl, pnl_pct, days,
+             code, priced) in columns:
+            yield {
+                'id': holding_id,
+                'item': item,
+                'platform': PLATFORMS[platform],
+                'quantity': int(quantity),
+                'purchase_price': cost,
+                'price': mark if priced else None,
+                'market_value': value if priced else None,
+                'pnl': pnl if priced else None,
+                'pnl_pct': pnl_pct if priced and pnl_pct == pnl_pct else None,
+                'holding_days': days,
+                'category': self.categories[code] if priced else None,
+            }
@@ -1,125 +1,153 @@
-import json, os
+import asyncio, math, os
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Min
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
-from django.http import JsonResponse
-import pandas as pd
-import subprocess
+from django.http import HttpResponse, JsonResponse
 from datetime import datetime
 
-import matplotlib
-matplotlib.use('Agg')  # 使用无 GUI 的后端
-import matplotlib.pyplot as plt
+from .arbitrage import get_arbitrage_book
+from .cache import cache_per_snapshot, snapshot_version
+from .executor import read_files, run_compute, run_io
+from .indices import index_series, query_correlations
+from .market_state import get_market_state
+from .models import Holding
+from .portfolio import get_valuation, holdings_version
+from .profiling import phase, slow_requests
+from .search import get_search_index
+from .snapshots import parse_snapshot_filename
 
-from io import BytesIO
-import base64
+# 套利和相关性查询单次返回的最大条数
+ARBITRAGE_MAX_LIMIT = 500
+CORRELATION_MAX_LIMIT = 500
 
-def home(request):
-    return render(request, 'home.html')
+def render_page(request, template_name, context=None):
+    with phase('render'):
+        return render(request, template_name, context)
+
+def compute_timeout_response():
+    return HttpResponse('计算超时，请稍后重试', status=504)
+
+@cache_per_snapshot
+async def home(request):
+    return render_page(request, 'home.html')
 
 def get_json_files():
-    folder = './cs_data'
+    """
+    按时间戳分组列出快照文件，同时识别 qaq_<类型>_<日期>_<时间>.json 和 cs_<分类>_<日期>_<时间>.json
+    """
+    folder = settings.CS_DATA_DIR
     files = {}
     for file in sorted(os.listdir(folder)):
-        if file.endswith('.json') and 'qaq_' in file:
-            parts = file.split("_")
-            item_type = parts[1]  # 提取类型
-            timestamp = parts[-2] + "_" + parts[-1].replace(".json", "")
-            
-            if timestamp not in files:
-                files[timestamp] = []  # 初始化时间戳对应的列表
-            
-            files[timestamp].append({
-                'filename': file,
-                'item_type': item_type  # 添加类型信息
-            })
+        meta = parse_snapshot_filename(file)
+        if meta is None:
+            continue
+        timestamp = meta['timestamp']
+        
+        if timestamp not in files:
+            files[timestamp] = []  # 初始化时间戳对应的列表
+        
+        files[timestamp].append({
+            'filename': file,
+            'item_type': meta['item_type'],  # 添加类型信息
+            'source': meta['source']
+        })
     
     # 转换为列表格式
-    return [{'timestamp': ts, 'items': items} for ts, items in files.items()]
+    return [{'timestamp': ts, 'items': items} for ts, items in sorted(files.items())]
 
-def load_price_data(filename):
-    folder = './cs_data'
-    data_points = []
-    
-    with open(os.path.join(folder, filename), 'r', encoding='utf-8') as f:
-        raw_data = json.load(f)
-        for name, data in raw_data.items():
-            try:
-                # 提取buff价格
-                buff_price = float(data['buff_price'].replace('￥', '').strip())
-                # 提取uu价格
-                uu_price = float(data['uu_price'].replace('￥', '').strip())
-                # 提取今日变化
-                today_change = data['today_change']
-                # 提取周变化
-                week_change = data['week_change']
-                
-                data_points.append({
-                    "item": name,
-                    "buff_price": buff_price,
-                    "uu_price": uu_price,
-                    "today_change": today_change,
-                    "week_change": week_change
-                })
-            except:
-                continue
-    return pd.DataFrame(data_points)
+async def read_snapshot_files(filenames):
+    """异步读取快照文件，返回 {文件名: 文件内容}"""
+    folder = settings.CS_DATA_DIR
+    contents = await read_files([os.path.join(folder, name) for name in filenames])
+    return dict(zip(filenames, contents))
 
-def price_overview(request):
-    files = get_json_files()
+def all_filenames(files):
+    return [item['filename'] for entry in files for item in entry['items']]
+
+def format_number(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+def format_change(amount, pct):
+    if amount is None or pct is None:
+        return None
+    return f'￥{format_number(amount)}（{pct:.2f}%）'
+
+def build_state_overview(state):
+    """
+    从共享的最新行情表组织各类型的数据，不需要读取快照文件和 pandas
+    :param state: MarketState
+    """
+    all_items_data = {}
+    for row in state.rows():
+        all_items_data.setdefault(row['item_type'], []).append({
+            "name": row['item'],
+            "buff_price": format_number(row['buff_price']),
+            "uu_price": format_number(row['uu_price']) if row['uu_price'] is not None else None,
+            "today_change": format_change(row['today_change'], row['today_change_pct']),
+            "week_change": format_change(row['week_change'], row['week_change_pct'])
+        })
+    return all_items_data
+
+@cache_per_snapshot
+async def price_overview(request):
+    with phase('list_dir'):
+        files = await run_io(get_json_files)
+    
+    # 未指定时间点时直接使用各 worker 共享的最新行情表
+    if 'timestamp' not in request.GET:
+        state = await run_io(get_market_state)
+        if state is not None:
+            with phase('state_overview'):
+                all_items_data = build_state_overview(state)
+            return render_page(request, "overview.html", {
+                "data": all_items_data,
+                "files": files,
+                "selected_timestamp": max(state.timestamps.values(), default=None)
+            })
+    
     selected_timestamp = request.GET.get('timestamp', files[0]['timestamp'] if files else None)
     
     if not selected_timestamp:
-        return render(request, 'overview.html', {"data": None, "files": files})
-    
-    # 组织所有类型的数据
-    all_items_data = {}
-    for entry in files:
-        if entry['timestamp'] == selected_timestamp:  # 只处理选中的时间戳
-            for item in entry['items']:
-                df = load_price_data(item['filename'])
-                for _, row in df.iterrows():
-                    item_type = item['item_type']
-                    if item_type not in all_items_data:
-                        all_items_data[item_type] = []
-                    all_items_data[item_type].append({
-                        "name": row["item"],
-                        "buff_price": row["buff_price"],
-                        "uu_price": row["uu_price"],
-                        "today_change": row["today_change"],
-                        "week_change": row["week_change"]
-                    })
-    
-    return render(request, "overview.html", {
+        return render_page(request, 'overview.html', {"data": None, "files": files})
+    
+    # 只处理选中的时间戳
+    items = [item for entry in files if entry['timestamp'] == selected_timestamp for item in entry['items']]
+    contents = await read_snapshot_files([item['filename'] for item in items])
+    from .analytics import build_overview_data  # 延迟导入 pandas
+    try:
+        all_items_data = await run_compute(build_overview_data, items, contents)
+    except asyncio.TimeoutError:
+        return compute_timeout_response()
+    
+    return render_page(request, "overview.html", {
         "data": all_items_data,  # 返回所有类型的数据
         "files": files,
         "selected_timestamp": selected_timestamp
     })
 
-def price_chart(request):
-    files = get_json_files()
-    selected_file = request.GET.get('file', files[0]['filename'] if files else None)
-    item_name = request.GET.get("item", "★ 蝴蝶刀")
+@cache_per_snapshot
+async def price_chart(request):
+    with phase('list_dir'):
+        files = await run_io(get_json_files)
+    filenames = all_filenames(files)
+    selected_file = request.GET.get('file', filenames[0] if filenames else None)
+    index = await run_io(get_search_index)
+    item_name = index.resolve(request.GET.get("item", "★ 蝴蝶刀"))
     
     if not selected_file:
-        return render(request, 'chart.html', {"data": None, "files": files})
+        return render_page(request, 'chart.html', {"data": None, "files": files})
     
-    # 获取所有文件的数据
-    all_data = []
-    for file in files:
-        df = load_price_data(file['filename'])
-        if not df.empty:
-            df_item = df[df["item"].str.contains(item_name)]
-            if not df_item.empty:
-                all_data.append({
-                    "time": file['timestamp'],
-                    "buff_price": df_item["buff_price"].iloc[0],
-                    "uu_price": df_item["uu_price"].iloc[0]
-                })
+    # 快照文件在计算池中逐个读取，超时后在下一个文件之前结束
+    from .analytics import build_price_history  # 延迟导入 pandas
+    try:
+        all_data = await run_compute(build_price_history, files, item_name, settings.CS_DATA_DIR, cancellable=True)
+    except asyncio.TimeoutError:
+        return compute_timeout_response()
     
     if not all_data:
-        return render(request, 'chart.html', {"data": None, "files": files})
-    
-    # 按时间排序
-    all_data.sort(key=lambda x: x["time"])
+        return render_page(request, 'chart.html', {"data": None, "files": files})
     
     # 准备图表数据
     chart_data = {
@@ -131,13 +159,168 @@ def price_chart(request):
         "current_uu_price": all_data[-1]["uu_price"] if all_data else None
     }
     
-    return render(request, "chart.html", {
+    return render_page(request, "chart.html", {
         "data": chart_data,
         "files": files,
         "selected_file": selected_file
     })
 
-def crawler(request):
+async def item_search(request):
+    """
+    饰品名称搜索 / 自动补全接口
+    参数：q 查询词，limit 返回数量，mode=prefix 时只做前缀补全，weapon/skin/wear 分面过滤
+    """
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 50))
+    except ValueError:
+        limit = 10
+    
+    # 检查是否有新快照，新名称会通过入库信号增量加入索引
+    await run_io(snapshot_version)
+    index = await run_io(get_search_index)
+    
+    if request.GET.get('mode') == 'prefix':
+        ids = index.autocomplete(query, limit)
+    else:
+        facets = {facet: request.GET.get(facet, '') for facet in ('weapon', 'skin', 'wear')}
+        ids = index.search(query, limit, **facets)
+    
+    return JsonResponse({
+        "query": query,
+        "results": [index.describe(item_id) for item_id in ids]
+    }, json_dumps_params={'ensure_ascii': False})
+
+def parse_float(value, default=None):
+    """解析查询参数中的数值，无法解析或不是有限数（nan、inf）时返回默认值"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return value if math.isfinite(value) else default
+
+def parse_int(value, default, minimum=None, maximum=None):
+    """解析查询参数中的整数并限制在 [minimum, maximum] 内"""
+    value = int(parse_float(value, default))
+    if minimum is not None:
+        value = max(minimum, value)
+    if maximum is not None:
+        value = min(maximum, value)
+    return value
+
+async def load_arbitrage(request):
+    """检查新快照后按请求参数查询套利机会"""
+    await run_io(snapshot_version)
+    book = await run_io(get_arbitrage_book)
+    filters = {
+        "k": parse_int(request.GET.get('limit'), settings.ARBITRAGE_TOP_K, 1, ARBITRAGE_MAX_LIMIT),
+        "min_observations": parse_int(request.GET.get('min_observations'), 0, 0),
+        "min_price": parse_float(request.GET.get('min_price')),
+        "max_price": parse_float(request.GET.get('max_price')),
+    }
+    return book, filters, [book.describe(opp) for opp in book.top(**filters)]
+
+async def arbitrage(request):
+    """跨平台套利机会页面"""
+    _, filters, opportunities = await load_arbitrage(request)
+    return render_page(request, "arbitrage.html", {
+        "opportunities": opportunities,
+        "filters": filters,
+        "fees": settings.ARBITRAGE_FEES
+    })
+
+async def arbitrage_api(request):
+    """跨平台套利机会接口"""
+    _, filters, opportunities = await load_arbitrage(request)
+    return JsonResponse({
+        "filters": filters,
+        "opportunities": opportunities
+    }, json_dumps_params={'ensure_ascii': False})
+
+@cache_per_snapshot
+async def market_indices(request):
+    """类型指数和全市场指数序列接口，category 为空字符串时只返回全市场"""
+    limit = parse_int(request.GET.get('limit'), 0, 0) or None
+    # 只读取 ingest_snapshots 物化好的指数，不在请求中构建价格矩阵
+    series = await sync_to_async(index_series)(request.GET.get('category'), limit)
+    return JsonResponse({"indices": series}, json_dumps_params={'ensure_ascii': False})
+
+@cache_per_snapshot
+async def index_correlations(request):
+    """
+    与指数或饰品同涨同跌的饰品接口
+    参数：index（类型，默认全市场）或 item（饰品），window、min_periods、category（结果只含该类型）、
+    limit、order（correlation 或 beta）
+    """
+    item = request.GET.get('item')
+    if item:
+        search_index = await run_io(get_search_index)
+        item = search_index.resolve(item)
+    try:
+        result = await run_compute(
+            query_correlations,
+            request.GET.get('index'),
+            item,
+            parse_int(request.GET.get('window'), 0, 0) or None,
+            parse_int(request.GET.get('min_periods'), 0, 0) or None,
+            request.GET.get('category') or None,
+            parse_int(request.GET.get('limit'), 50, 1, CORRELATION_MAX_LIMIT),
+            request.GET.get('order', 'correlation'),
+        )
+    except asyncio.TimeoutError:
+        return compute_timeout_response()
+    if result is None:
+        return JsonResponse({"error": "未找到指数或饰品"}, status=404, json_dumps_params={'ensure_ascii': False})
+    return JsonResponse(result, json_dumps_params={'ensure_ascii': False})
+
+def format_money(value):
+    return None if value is None else f'{value:,.2f}'
+
+def format_holding(row):
+    """持仓行的数值预先格式化，避免模板中逐格调用 floatformat"""
+    row['purchase_price'] = format_money(row['purchase_price'])
+    row['price'] = format_money(row['price'])
+    row['market_value'] = format_money(row['market_value'])
+    row['pnl_class'] = 'up' if row['pnl'] and row['pnl'] > 0 else 'down' if row['pnl'] else ''
+    row['pnl'] = format_money(row['pnl'])
+    row['pnl_pct'] = None if row['pnl_pct'] is None else f"{row['pnl_pct']:.2f}%"
+    return row
+
+async def portfolio(request):
+    """持仓估值页面：浮动盈亏、持有天数和类型敞口"""
+    # 读取持仓要用数据库连接，交给 Django 的线程敏感执行器，连接随请求结束关闭
+    valuation = await sync_to_async(get_valuation)()
+    sort = request.GET.get('sort', '-value')
+    summary = dict(valuation.summary())
+    for key in ('cost', 'market_value', 'pnl'):
+        summary[key] = format_money(summary[key])
+
+    # 估值和排序覆盖全部持仓，明细只格式化和渲染当前页
+    page_size = settings.PORTFOLIO_PAGE_SIZE
+    pages = max(1, -(-summary['positions'] // page_size))
+    page = parse_int(request.GET.get('page'), 1, 1, pages)
+    holdings = valuation.rows(sort, offset=(page - 1) * page_size, limit=page_size)
+    return render_page(request, "portfolio.html", {
+        "summary": summary,
+        "exposure": valuation.exposure(),
+        "holdings": [format_holding(row) for row in holdings],
+        "sort": sort,
+        "page": page,
+        "pages": pages
+    })
+
+@staff_member_required
+def profiling_slow_requests(request):
+    """最近的慢请求及其分阶段耗时（仅管理员可见）"""
+    return JsonResponse({
+        "enabled": settings.MONITOR_PROFILING,
+        "threshold_ms": settings.MONITOR_SLOW_REQUEST_THRESHOLD * 1000,
+        "requests": list(reversed(slow_requests))
+    }, json_dumps_params={'ensure_ascii': False})
+
+async def crawler(request):
+    import subprocess
+    
     crawler_status = "stopped"
     last_run = None
     
@@ -154,7 +337,7 @@ def crawler(request):
             
             # 启动爬虫
             try:
-                subprocess.Popen(cmd, shell=True)
+                await run_io(subprocess.Popen, cmd, shell=True)
                 crawler_status = "running"
                 last_run = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             except Exception as e:
@@ -163,174 +346,45 @@ def crawler(request):
         elif action == 'stop':
             # 停止爬虫
             try:
-                subprocess.run("pkill -f crawler.py", shell=True)
+                await run_io(subprocess.run, "pkill -f crawler.py", shell=True)
                 crawler_status = "stopped"
             except Exception as e:
                 print(f"Error stopping crawler: {e}")
     
-    return render(request, "crawler.html", {
+    return render_page(request, "crawler.html", {
         "crawler_status": crawler_status,
         "last_run": last_run
     })
 
-def calculate_technical_indicators(df, item_name):
-    """
-    计算技术指标
-    :param df: 包含价格数据的DataFrame
-    :param item_name: 饰品名称
-    :return: 包含所有指标的字典
-    """
-    # 确保数据按时间排序
-    df = df.sort_values('time')
-    
-    # 计算移动平均线
-    df['MA5'] = df['buff_price'].rolling(window=5).mean()
-    df['MA20'] = df['buff_price'].rolling(window=20).mean()
-    
-    # 计算价格波动率（7天标准差）
-    df['volatility'] = df['buff_price'].rolling(window=7).std()
-    
-    # 计算RSI
-    delta = df['buff_price'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df['RSI'] = 100 - (100 / (1 + rs))
-    
-    # 计算价格相对于7天均值的标准差
-    df['buff_price_mean'] = df['buff_price'].rolling(window=7).mean()
-    df['buff_price_std'] = df['buff_price'].rolling(window=7).std()
-    df['buff_price_zscore'] = (df['buff_price'] - df['buff_price_mean']) / df['buff_price_std']
-    
-    return df
-
-def generate_trading_signals(df):
-    """
-    生成交易信号
-    :param df: 包含技术指标的DataFrame
-    :return: 交易信号字典
-    """
-    signals = {
-        'buy_signals': [],
-        'sell_signals': [],
-        'current_status': 'hold'
-    }
-    
-    if len(df) < 20:  # 确保有足够的数据
-        return signals
-    
-    current = df.iloc[-1]
-    prev = df.iloc[-2]
-    
-    # 买入信号检查
-    buy_conditions = 0
-    
-    # 1. MA金叉
-    if prev['MA5'] <= prev['MA20'] and current['MA5'] > current['MA20']:
-        buy_conditions += 1
-        signals['buy_signals'].append('MA金叉')
-    
-    # 2. RSI < 40
-    if current['RSI'] < 40:
-        buy_conditions += 1
-        signals['buy_signals'].append('RSI超卖')
-    
-    # 3. 价格接近7天低点
-    if current['buff_price_zscore'] < -1:
-        buy_conditions += 1
-        signals['buy_signals'].append('价格接近低点')
-    
-    # 4. 检查市场库存变化（需要额外数据）
-    # 这里假设有库存数据，实际需要根据数据结构调整
-    if 'inventory_change' in df.columns and current['inventory_change'] < 0:
-        buy_conditions += 1
-        signals['buy_signals'].append('库存减少')
-    
-    # 卖出信号检查
-    sell_conditions = 0
-    
-    # 1. MA死叉
-    if prev['MA5'] >= prev['MA20'] and current['MA5'] < current['MA20']:
-        sell_conditions += 1
-        signals['sell_signals'].append('MA死叉')
-    
-    # 2. RSI > 60
-    if current['RSI'] > 60:
-        sell_conditions += 1
-        signals['sell_signals'].append('RSI超买')
-    
-    # 3. 价格接近7天高点
-    if current['buff_price_zscore'] > 1:
-        sell_conditions += 1
-        signals['sell_signals'].append('价格接近高点')
-    
-    # 4. 检查持有时间（需要额外数据）
-    if 'holding_days' in df.columns and current['holding_days'] >= 7:
-        sell_conditions += 1
-        signals['sell_signals'].append('持有时间达标')
-    
-    # 生成最终信号
-    if buy_conditions >= 3:
-        signals['current_status'] = 'buy'
-    elif sell_conditions >= 3:
-        signals['current_status'] = 'sell'
-    
-    return signals
-
-def trading_strategy(request):
+@cache_per_snapshot(vary_on=holdings_version)
+async def trading_strategy(request):
     """
     量化交易策略视图函数
     """
-    files = get_json_files()
-    selected_file = request.GET.get('file', files[0]['filename'] if files else None)
-    item_name = request.GET.get("item", "★ 蝴蝶刀")
+    with phase('list_dir'):
+        files = await run_io(get_json_files)
+    filenames = all_filenames(files)
+    selected_file = request.GET.get('file', filenames[0] if filenames else None)
+    index = await run_io(get_search_index)
+    item_name = index.resolve(request.GET.get("item", "★ 蝴蝶刀"))
     
     if not selected_file:
-        return render(request, 'strategy.html', {"data": None, "files": files})
-    
-    # 获取所有文件的数据
-    all_data = []
-    for file in files:
-        df = load_price_data(file['filename'])
-        if not df.empty:
-            df_item = df[df["item"].str.contains(item_name)]
-            if not df_item.empty:
-                all_data.append({
-                    "time": file['timestamp'],
-                    "buff_price": df_item["buff_price"].iloc[0],
-                    "uu_price": df_item["uu_price"].iloc[0]
-                })
-    
-    if not all_data:
-        return render(request, 'strategy.html', {"data": None, "files": files})
-    
-    # 转换为DataFrame
-    df = pd.DataFrame(all_data)
-    df['time'] = pd.to_datetime(df['time'])
-    df = df.sort_values('time')
-    
-    # 计算技术指标
-    df = calculate_technical_indicators(df, item_name)
-    
-    # 生成交易信号
-    signals = generate_trading_signals(df)
-    
-    # 准备展示数据
-    strategy_data = {
-        "item": item_name,
-        "current_buff_price": df['buff_price'].iloc[-1],
-        "current_uu_price": df['uu_price'].iloc[-1],
-        "signals": signals,
-        "indicators": {
-            "MA5": df['MA5'].iloc[-1],
-            "MA20": df['MA20'].iloc[-1],
-            "RSI": df['RSI'].iloc[-1],
-            "volatility": df['volatility'].iloc[-1],
-            "buff_price_zscore": df['buff_price_zscore'].iloc[-1]
-        }
-    }
-    
-    return render(request, "strategy.html", {
+        return render_page(request, 'strategy.html', {"data": None, "files": files})
+    
+    # 读取快照和指标计算都放到计算池中执行
+    # 持有天数取该饰品最早一笔持仓，供卖出信号使用
+    holding = await Holding.objects.filter(item=item_name).aaggregate(purchased_at=Min('purchased_at'))
+    from .strategy import compute_strategy  # 延迟导入 pandas
+    try:
+        strategy_data = await run_compute(compute_strategy, files, item_name, holding['purchased_at'],
+                                          settings.CS_DATA_DIR, cancellable=True)
+    except asyncio.TimeoutError:
+        return compute_timeout_response()
+    
+    if not strategy_data:
+        return render_page(request, 'strategy.html', {"data": None, "files": files})
+    
+    return render_page(request, "strategy.html", {
         "data": strategy_data,
         "files": files,
         "selected_file": selected_file
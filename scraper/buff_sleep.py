@@ -103,7 +103,11 @@ async def scrape_page(page_num, context, category_group=None, max_retries=3):
             await asyncio.sleep(random.uniform(1, 5))  # 在重试前等待1-5秒
 
 # 获取总页数的函数
-async def get_total_pages(context, category_group=None):
+async def get_total_pages(context, category_group=None, strict=False):
+    """
+    获取总页数
+    :param strict: 为 True 时页面加载失败直接抛出异常（由任务队列重试），否则按 1 页处理
+    """
     try:
         page = await context.new_page()
         url = f"{BASE_URL}&page_num=1&tab=selling"
@@ -138,6 +142,8 @@ async def get_total_pages(context, category_group=None):
         return total_pages
     
     except Exception as e:
+        if strict:
+            raise
         logger.error(f"获取总页数出错：{str(e)}，使用默认页数 1")
         return 1
 
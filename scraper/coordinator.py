@@ -0,0 +1,481 @@
+"""
+多进程分片爬取协调器
+
+把爬取任务切分成分片写入本地 SQLite 任务队列：
+- BUFF：先由一个规划任务调用 get_total_pages 获取总页数，再按页码区间生成分片
+- csqaq：按 (类型, 卡片区间) 分片，处理到列表末尾的分片会自动追加下一个区间
+
+每个工作进程各自启动一个浏览器，通过租约领取任务，执行中每抓完一页或一张卡片续租一次，
+失败的任务按退避时间重试，租约过期的任务（例如工作进程崩溃）会被其他进程重新领取。
+抓取结果写入同一个 SQLite 库，全部任务成功后再按原有格式导出到 cs_data 目录；
+有任务最终失败时不导出，避免写出缺页的快照，可用 --resume 重试失败的任务。
+
+用法：
+    python coordinator.py buff weapon_knife_butterfly --workers 4 --pages-per-job 5
+    python coordinator.py qaq 蝴蝶刀 --workers 4 --cards-per-job 20
+    python coordinator.py --resume 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_QUEUE = os.path.join(BASE_DIR, "var", "crawl_queue.sqlite3")
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, "cs_data")
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    options TEXT NOT NULL,
+    exported_at REAL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    kind TEXT NOT NULL,
+    category TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    "end" INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    error TEXT,
+    UNIQUE (run_id, kind, category, start)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (run_id, status, available_at);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    category TEXT NOT NULL,
+    item TEXT NOT NULL,
+    data TEXT NOT NULL,
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    PRIMARY KEY (run_id, category, item)
+);
+"""
+
+# 任务类型
+BUFF_PLAN = "buff_plan"
+BUFF_PAGES = "buff_pages"
+QAQ_CARDS = "qaq_cards"
+
+
+class LeaseLost(Exception):
+    """任务的租约已过期并被其他进程接管"""
+
+
+@dataclass
+class Job:
+    """一个已领取的分片任务，attempts 同时作为租约令牌"""
+    id: int
+    run_id: int
+    kind: str
+    category: str
+    start: int
+    end: int
+    attempts: int
+
+
+class JobQueue:
+    """SQLite 持久化任务队列，可被多个进程同时访问"""
+
+    def __init__(self, path=DEFAULT_QUEUE, lease_seconds=300, max_attempts=3, retry_delay=5):
+        self.path = str(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE 事务：领取和提交都需要先拿到写锁，避免两个进程领到同一任务"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def create_run(self, source, options):
+        cursor = self.conn.execute(
+            "INSERT INTO runs (source, timestamp, options) VALUES (?, ?, ?)",
+            (source, datetime.now().strftime("%Y%m%d_%H%M%S"), json.dumps(options, ensure_ascii=False)),
+        )
+        return cursor.lastrowid
+
+    def get_run(self, run_id):
+        row = self.conn.execute(
+            "SELECT source, timestamp, options FROM runs WHERE id = ?", (run_id,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"未找到爬取批次 {run_id}")
+        return {"id": run_id, "source": row[0], "timestamp": row[1], "options": json.loads(row[2])}
+
+    def enqueue(self, run_id, kind, category, start, end):
+        """添加分片，同一批次内重复的分片会被忽略；返回是否新增"""
+        cursor = self.conn.execute(
+            'INSERT OR IGNORE INTO jobs (run_id, kind, category, start, "end") VALUES (?, ?, ?, ?, ?)',
+            (run_id, kind, category, start, end),
+        )
+        return cursor.rowcount > 0
+
+    def claim(self, run_id, worker):
+        """领取一个可执行的任务（待执行且到达重试时间，或租约已过期），没有则返回 None"""
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    'SELECT id, kind, category, start, "end", attempts FROM jobs '
+                    "WHERE run_id = ? AND ((status = 'pending' AND available_at <= ?) "
+                    "OR (status = 'running' AND lease_until < ?)) ORDER BY id LIMIT 1",
+                    (run_id, now, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, kind, category, start, end, attempts = row
+                if attempts >= self.max_attempts:
+                    # 最后一次尝试的租约过期，不再重试
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ? WHERE id = ?",
+                        ("租约过期", job_id),
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = ?, lease_until = ?, worker = ? WHERE id = ?",
+                    (attempts + 1, now + self.lease_seconds, worker, job_id),
+                )
+                return Job(job_id, run_id, kind, category, start, end, attempts + 1)
+
+    def _owns(self, conn, job):
+        row = conn.execute(
+            "SELECT status, attempts FROM jobs WHERE id = ?", (job.id,)
+        ).fetchone()
+        return row == ("running", job.attempts)
+
+    def renew(self, job):
+        """
+        续租正在执行的任务
+        :return: False 表示租约已被其他进程接管
+        """
+        with self._transaction() as conn:
+            if not self._owns(conn, job):
+                return False
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() + self.lease_seconds, job.id)
+            )
+        return True
+
+    def complete(self, job, results):
+        """
+        写入结果并标记任务完成
+        :param results: {饰品名称: 数据}
+        :return: False 表示租约已被其他进程接管，结果被丢弃
+        """
+        with self._transaction() as conn:
+            if not self._owns(conn, job):
+                return False
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (run_id, category, item, data, job_id) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (job.run_id, job.category, item, json.dumps(data, ensure_ascii=False), job.id)
+                    for item, data in results.items()
+                ],
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'done', lease_until = NULL, error = NULL WHERE id = ?",
+                (job.id,),
+            )
+        return True
+
+    def fail(self, job, error):
+        """记录失败，未超过最大尝试次数时按指数退避重新排队"""
+        with self._transaction() as conn:
+            if not self._owns(conn, job):
+                return
+            if job.attempts >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', lease_until = NULL, error = ? WHERE id = ?",
+                    (error, job.id),
+                )
+            else:
+                delay = self.retry_delay * 2 ** (job.attempts - 1)
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', lease_until = NULL, available_at = ?, error = ? WHERE id = ?",
+                    (time.time() + delay, error, job.id),
+                )
+
+    def counts(self, run_id):
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE run_id = ? GROUP BY status", (run_id,)
+        ).fetchall()
+        return dict(rows)
+
+    def unfinished(self, run_id):
+        counts = self.counts(run_id)
+        return counts.get("pending", 0) + counts.get("running", 0)
+
+    def failed(self, run_id):
+        return self.counts(run_id).get("failed", 0)
+
+    def retry_failed(self, run_id):
+        """把最终失败的任务重新排队，重新计算尝试次数；返回重新排队的任务数"""
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, available_at = 0, lease_until = NULL "
+            "WHERE run_id = ? AND status = 'failed'",
+            (run_id,),
+        )
+        return cursor.rowcount
+
+    def results(self, run_id):
+        """按类型返回 {类型: {饰品名称: 数据}}"""
+        grouped = {}
+        rows = self.conn.execute(
+            "SELECT category, item, data FROM results WHERE run_id = ? ORDER BY rowid", (run_id,)
+        )
+        for category, item, data in rows:
+            grouped.setdefault(category, {})[item] = json.loads(data)
+        return grouped
+
+    def mark_exported(self, run_id):
+        self.conn.execute("UPDATE runs SET exported_at = ? WHERE id = ?", (time.time(), run_id))
+
+
+def seed_run(queue, source, categories, options):
+    """创建批次并写入初始分片"""
+    run_id = queue.create_run(source, dict(options, categories=categories))
+    for category in categories:
+        if source == "buff":
+            queue.enqueue(run_id, BUFF_PLAN, category, 0, 0)
+        else:
+            queue.enqueue(run_id, QAQ_CARDS, category, 0, options["cards_per_job"])
+    return run_id
+
+
+def export_run(queue, run_id, folder=DEFAULT_OUTPUT):
+    """
+    把批次结果按原爬虫的文件格式写入数据目录
+    先写临时文件再原子替换，避免快照监视器读到写了一半的文件
+    """
+    run = queue.get_run(run_id)
+    prefix = "cs" if run["source"] == "buff" else "qaq"
+    indent = 4 if run["source"] == "buff" else 2
+    os.makedirs(folder, exist_ok=True)
+    written = []
+    for category, data in queue.results(run_id).items():
+        filename = os.path.join(folder, f"{prefix}_{category}_{run['timestamp']}.json")
+        temp = f"{filename}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(temp, filename)
+        written.append(filename)
+        logger.info(f"已导出 {len(data)} 条数据到 {filename}")
+    queue.mark_exported(run_id)
+    return written
+
+
+async def run_buff_job(queue, job, context, options):
+    from buff_sleep import get_total_pages, scrape_page
+
+    if job.kind == BUFF_PLAN:
+        # 获取失败时抛出异常由队列重试，不能按 1 页规划
+        total_pages = await get_total_pages(context, job.category, strict=True)
+        size = options["pages_per_job"]
+        for start in range(1, total_pages + 1, size):
+            queue.enqueue(job.run_id, BUFF_PAGES, job.category, start, min(start + size - 1, total_pages))
+        logger.info(f"{job.category} 共 {total_pages} 页，已按每片 {size} 页分片")
+        return {}
+
+    results = {}
+    for page_num in range(job.start, job.end + 1):
+        # 重试交给任务队列，单页失败时整个分片重新排队
+        page_result = await scrape_page(page_num, context, job.category, max_retries=1)
+        if not page_result:
+            raise RuntimeError(f"第 {page_num} 页没有抓到数据")
+        results.update(page_result)
+        if not queue.renew(job):
+            raise LeaseLost()
+    return results
+
+
+async def run_qaq_job(queue, job, context, listings):
+    from qaq import get_card_name, load_cards, open_listing, scrape_card
+
+    # 同一类型的列表页在进程内复用，滚动加载的卡片只增不减
+    page = listings.get(job.category)
+    if page is None:
+        page = listings[job.category] = await open_listing(context, job.category)
+    try:
+        cards = await load_cards(page, job.end + 1)
+    except Exception:
+        listings.pop(job.category, None)
+        await page.close()
+        raise
+
+    if len(cards) > job.end:
+        # 列表还没到底，追加下一个卡片区间
+        queue.enqueue(job.run_id, QAQ_CARDS, job.category, job.end, 2 * job.end - job.start)
+
+    results = {}
+    for index, card in enumerate(cards[job.start:job.end], start=job.start):
+        # 重试交给任务队列，单张卡片失败时整个分片重新排队，不会漏掉这张卡片
+        try:
+            item_name = await get_card_name(card)
+            if not item_name:
+                continue
+            item_data = await scrape_card(context, card)
+        except Exception as e:
+            raise RuntimeError(f"第 {index} 张卡片处理失败：{str(e)}") from e
+        if item_data:
+            results[item_name] = item_data
+        if not queue.renew(job):
+            raise LeaseLost()
+    return results
+
+
+async def worker_loop(queue_path, run_id, worker, options):
+    from playwright.async_api import async_playwright
+
+    queue = JobQueue(queue_path, options["lease"], options["max_attempts"])
+    run = queue.get_run(run_id)
+    processed = 0
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context()
+        if run["source"] == "buff":
+            from buff_sleep import INITIAL_COOKIES
+            await context.add_cookies(INITIAL_COOKIES)
+        else:
+            await context.route("**/*.{png,jpg,jpeg,gif,svg,webp}", lambda route: route.abort())
+        listings = {}
+
+        while True:
+            job = queue.claim(run_id, worker)
+            if job is None:
+                if not queue.unfinished(run_id):
+                    break
+                # 其他进程的任务还在执行，可能追加新分片或租约过期
+                await asyncio.sleep(options["poll_interval"])
+                continue
+
+            logger.info(f"[{worker}] 领取任务 {job.id}：{job.kind} {job.category} {job.start}-{job.end}（第 {job.attempts} 次）")
+            try:
+                if run["source"] == "buff":
+                    results = await run_buff_job(queue, job, context, options)
+                else:
+                    results = await run_qaq_job(queue, job, context, listings)
+            except LeaseLost:
+                logger.warning(f"[{worker}] 任务 {job.id} 的租约已被接管，停止执行")
+                continue
+            except Exception as e:
+                logger.error(f"[{worker}] 任务 {job.id} 失败：{str(e)}")
+                queue.fail(job, str(e))
+                continue
+            if queue.complete(job, results):
+                processed += 1
+            else:
+                logger.warning(f"[{worker}] 任务 {job.id} 的租约已被接管，结果已丢弃")
+
+        await context.close()
+        await browser.close()
+    queue.close()
+    logger.info(f"[{worker}] 没有剩余任务，共完成 {processed} 个")
+
+
+def worker_main(queue_path, run_id, index, options):
+    """工作进程入口：每个进程独立的事件循环和浏览器"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    worker = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    asyncio.run(worker_loop(queue_path, run_id, worker, options))
+
+
+def run_workers(queue_path, run_id, workers, options):
+    # spawn 启动，避免子进程继承父进程的事件循环和浏览器句柄
+    mp = multiprocessing.get_context("spawn")
+    processes = [
+        mp.Process(target=worker_main, args=(queue_path, run_id, i, options), name=f"crawler-{i}")
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            logger.error(f"工作进程 {process.name} 异常退出：{process.exitcode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程分片爬取 BUFF / csqaq")
+    parser.add_argument("source", nargs="?", choices=["buff", "qaq"], help="数据来源")
+    parser.add_argument("categories", nargs="*", help="BUFF 的 category 或 csqaq 的类型名称")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数，每个进程一个浏览器")
+    parser.add_argument("--pages-per-job", type=int, default=5, help="BUFF 每个分片的页数")
+    parser.add_argument("--cards-per-job", type=int, default=20, help="csqaq 每个分片的卡片数")
+    parser.add_argument("--lease", type=int, default=300, help="任务租约秒数")
+    parser.add_argument("--max-attempts", type=int, default=3, help="每个任务的最大尝试次数")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="空闲时轮询队列的间隔秒数")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE, help="任务队列数据库路径")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="数据导出目录")
+    parser.add_argument("--resume", type=int, help="继续执行未完成的批次，失败的任务会重新排队")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    options = {
+        "pages_per_job": args.pages_per_job,
+        "cards_per_job": args.cards_per_job,
+        "lease": args.lease,
+        "max_attempts": args.max_attempts,
+        "poll_interval": args.poll_interval,
+    }
+
+    queue = JobQueue(args.queue, args.lease, args.max_attempts)
+    if args.resume:
+        run_id = args.resume
+        stored = queue.get_run(run_id)["options"]
+        options.update(pages_per_job=stored["pages_per_job"], cards_per_job=stored["cards_per_job"])
+        retried = queue.retry_failed(run_id)
+        if retried:
+            logger.info(f"批次 {run_id}：重试 {retried} 个失败的任务")
+    else:
+        if not args.source or not args.categories:
+            parser.error("需要指定数据来源和至少一个类型，或使用 --resume")
+        run_id = seed_run(queue, args.source, args.categories, options)
+    logger.info(f"批次 {run_id}：启动 {args.workers} 个工作进程")
+
+    started = time.time()
+    run_workers(args.queue, run_id, args.workers, options)
+
+    counts = queue.counts(run_id)
+    logger.info(f"批次 {run_id} 用时 {time.time() - started:.1f} 秒，任务状态：{counts}")
+    if queue.unfinished(run_id):
+        logger.warning(f"仍有未完成的任务，可使用 --resume {run_id} 继续")
+    elif queue.failed(run_id):
+        logger.warning(f"{queue.failed(run_id)} 个任务失败，未导出不完整的数据，可使用 --resume {run_id} 重试")
+    else:
+        export_run(queue, run_id, args.output)
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -76,11 +76,86 @@ async def scroll_to_bottom(page):
             break
         last_height = new_height
 
-async def main():
+async def open_listing(context, category):
+    """打开饰品列表页并按类型筛选，返回列表页"""
+    # 设置页面加载策略，不加载图片
+    page = await context.new_page()
+    await page.set_viewport_size({"width": 1366, "height": 768})
+    
+    # 设置请求拦截，阻止图片加载
+    await page.route("**/*", lambda route: route.continue_() if not route.request.resource_type in ["image", "media"] else route.abort())
+    
+    logger.info(f"正在访问页面：{BASE_URL}")
+    await page.goto(BASE_URL, wait_until="networkidle", timeout=60000)
+    
+    # 等待页面加载完成
+    await page.wait_for_load_state("networkidle")
+    await page.wait_for_load_state("domcontentloaded")
+    
+    # 点击筛选按钮
+    logger.info("点击筛选按钮...")
+    await page.click("button:has-text('筛选')")
+    await asyncio.sleep(1)
+    
+    # 使用XPath定位并点击类型选项
+    logger.info(f"选择{category}...")
+    category_option = await page.wait_for_selector(f"//div[contains(text(),'{category}')]", timeout=5000)
+    if not category_option:
+        raise RuntimeError(f"未找到{category}选项")
+    await category_option.click()
+    await asyncio.sleep(1)
+    
+    logger.info("点击完成...")
+    done_button = await page.wait_for_selector("//span[contains(text(),'完 成')]", timeout=5000)
+    if not done_button:
+        raise RuntimeError("点击不到完成")
+    await done_button.click()
+    await asyncio.sleep(1)
+    
+    # 等待￥符号出现
+    await page.wait_for_selector("div.ant-card:has-text('￥')", timeout=10000)
+    return page
+
+async def load_cards(page, min_count=None):
+    """
+    滚动列表直到至少加载 min_count 张卡片或没有更多内容
+    :return: 当前已加载的卡片列表
+    """
+    cards = await page.query_selector_all("div.ant-card:has-text('￥')")
+    while min_count is None or len(cards) < min_count:
+        await scroll_to_bottom(page)
+        new_cards = await page.query_selector_all("div.ant-card:has-text('￥')")
+        if len(new_cards) == len(cards):
+            break
+        cards = new_cards
+    return cards
+
+async def get_card_name(card):
+    """获取卡片上的饰品名称"""
+    return await card.evaluate("""(card) => {
+        const span = card.querySelector('span');
+        return span ? span.textContent.trim() : null;
+    }""")
+
+async def scrape_card(context, card):
+    """点击卡片打开详情页并获取饰品数据"""
+    async with context.expect_page() as new_page_info:
+        await card.click()
+    new_page = await new_page_info.value
+    try:
+        # 等待详情页加载完成
+        await new_page.wait_for_load_state("networkidle")
+        await new_page.wait_for_load_state("domcontentloaded")
+        return await get_item_data(new_page)
+    finally:
+        # 关闭详情页
+        await new_page.close()
+
+async def main(category="蝴蝶刀"):
 
     # 设置数据文件名
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"../cs_data/qaq_butterfly_{timestamp}.json"
+    filename = f"../cs_data/qaq_{category}_{timestamp}.json"
     
     # 加载已存在的数据
     all_items_data = load_existing_data(filename)
@@ -92,48 +167,12 @@ async def main():
         # 设置路由规则，阻止所有图片加载
         await context.route("**/*.{png,jpg,jpeg,gif,svg,webp}", lambda route: route.abort())
         
-        # 设置页面加载策略，不加载图片
-        page = await context.new_page()
-        await page.set_viewport_size({"width": 1366, "height": 768})
-        
-        # 设置请求拦截，阻止图片加载
-        await page.route("**/*", lambda route: route.continue_() if not route.request.resource_type in ["image", "media"] else route.abort())
-        
-        logger.info(f"正在访问页面：{BASE_URL}")
-        await page.goto(BASE_URL, wait_until="networkidle", timeout=60000)
-        
-        # 等待页面加载完成
-        await page.wait_for_load_state("networkidle")
-        await page.wait_for_load_state("domcontentloaded")
-        
-        # 点击筛选按钮
-        logger.info("点击筛选按钮...")
-        await page.click("button:has-text('筛选')")
-        await asyncio.sleep(1)
-        
-        # 使用XPath定位并点击蝴蝶刀选项
-        logger.info("选择蝴蝶刀...")
-        butterfly_option = await page.wait_for_selector("//div[contains(text(),'蝴蝶刀')]", timeout=5000)
-        if butterfly_option:
-            await butterfly_option.click()
-            await asyncio.sleep(1)
-        else:
-            logger.error("未找到蝴蝶刀选项")
+        try:
+            page = await open_listing(context, category)
+        except Exception as e:
+            logger.error(str(e))
             return
         
-        # 使用XPath定位并点击蝴蝶刀选项
-        logger.info("点击完成...")
-        butterfly_option = await page.wait_for_selector("//span[contains(text(),'完 成')]", timeout=5000)
-        if butterfly_option:
-            await butterfly_option.click()
-            await asyncio.sleep(1)
-        else:
-            logger.error("点击不到完成")
-            return
-        
-        # 等待￥符号出现
-        await page.wait_for_selector("div.ant-card:has-text('￥')", timeout=10000)
-        
         # 记录已处理的饰品名称
         processed_items = set(all_items_data.keys())
         
@@ -148,27 +187,15 @@ async def main():
             for i, card in enumerate(cards):
                 try:
                     # 获取饰品名称
-                    item_name = await card.evaluate("""(card) => {
-                        const span = card.querySelector('span');
-                        return span ? span.textContent.trim() : null;
-                    }""")
+                    item_name = await get_card_name(card)
                     
                     if not item_name or item_name in processed_items:
                         continue
                     
                     logger.info(f"正在处理饰品：{item_name}")
                     
-                    # 点击卡片
-                    async with context.expect_page() as new_page_info:
-                        await card.click()
-                    new_page = await new_page_info.value
-                    
-                    # 等待详情页加载完成
-                    await new_page.wait_for_load_state("networkidle")
-                    await new_page.wait_for_load_state("domcontentloaded")
-                    
                     # 获取饰品数据
-                    item_data = await get_item_data(new_page)
+                    item_data = await scrape_card(context, card)
                     if item_data:
                         all_items_data[item_name] = item_data
                         processed_items.add(item_name)
@@ -177,8 +204,6 @@ async def main():
                         # 增量保存数据
                         save_data(filename, all_items_data)
                         logger.info(f"已保存数据到：{filename}")
-                    # 关闭详情页
-                    await new_page.close()
                     
                 except Exception as e:
                     logger.error(f"处理第 {i+1} 个卡片时出错：{str(e)}")